@@ -0,0 +1,115 @@
+import streamlit as st
+from datetime import datetime, timedelta
+
+from src import config, rollups
+
+TOP_N = 20
+
+
+def refresh_if_stale(state: dict) -> None:
+    """
+    Apply the ads changed since the last refresh, at most every ROLLUP_REFRESH_INTERVAL seconds.
+    In a background thread: the page shows the last rollups meanwhile.
+    """
+    refreshed_at = state.get("refreshed_at")
+    if refreshed_at and datetime.now() - refreshed_at < timedelta(seconds=config.ROLLUP_REFRESH_INTERVAL):
+        return None
+    rollups.refresh_in_background()
+    return None
+
+
+def refresh_now() -> None:
+    """on_click callback of Refresh now"""
+    try:
+        stats = rollups.refresh_rollups()
+        st.session_state["analytics_summary"] = ("success", f"Analytics updated: {stats}")
+    except Exception as e:
+        st.session_state["analytics_summary"] = ("error", f"Error updating the analytics: {str(e)}")
+    return None
+
+
+def rebuild() -> None:
+    """on_click callback of Full rebuild"""
+    try:
+        counts = rollups.rebuild_rollups()
+        st.session_state["analytics_summary"] = ("success", f"Analytics rebuilt: {counts}")
+    except Exception as e:
+        st.session_state["analytics_summary"] = ("error", f"Error rebuilding the analytics: {str(e)}")
+    return None
+
+
+def main():
+    # ---------------------------- APP INTERFACE ----------------------------
+    st.title("FB Ads Meta - Analytics")
+
+    state = rollups.get_state()
+    refresh_if_stale(state)
+    data = rollups.get_rollups()
+
+    # ---------------------------- SIDEBAR ----------------------------
+    st.sidebar.header("📊 Analytics")
+    if rollups.is_refreshing():
+        st.sidebar.caption("Refresh in progress, reload the page for the latest numbers")
+    elif state.get("refreshed_at"):
+        st.sidebar.caption(f"Updated {state['refreshed_at'].strftime('%Y-%m-%d %H:%M:%S')}, ads changed since then are added on the next refresh")
+    st.sidebar.button("Refresh now", on_click=refresh_now, key="analytics_refresh")
+    if config.IS_DEBUG:
+        st.sidebar.button("Full rebuild", on_click=rebuild, help="Recompute all the rollups with a full scan", key="analytics_rebuild")
+    if summary := st.session_state.pop("analytics_summary", None):
+        (st.sidebar.success if summary[0] == "success" else st.sidebar.error)(summary[1])
+
+    if not data["total"]:
+        if rollups.is_refreshing():
+            st.info("The analytics are being computed, reload the page in a moment.")
+        else:
+            st.warning("No analytics available yet. Please refresh or check your database connection.")
+        st.stop()
+
+    # ---------------------------- TOTALS ----------------------------
+    total = data["total"][0]
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Saved ads", f"{total['count']:,}")
+    col2.metric("Videos", f"{total['video']:,}")
+    col3.metric("Images", f"{total['image']:,}")
+    col4.metric("Competitors", f"{len([row for row in data['competitor'] if row['key'] != rollups.UNKNOWN]):,}")
+    col5.metric("Tags", f"{len(data['tag']):,}")
+
+    # ---------------------------- SAVED PER DAY ----------------------------
+    st.subheader("Ads saved per day")
+    period = st.radio("Period:", ["30 days", "90 days", "1 year", "All"], index=1, horizontal=True, key="analytics_period")
+    days = [row for row in data["day"] if row["key"] != rollups.UNKNOWN]
+    if period != "All":
+        since = (datetime.now() - timedelta(days={"30 days": 30, "90 days": 90, "1 year": 365}[period])).strftime("%Y-%m-%d")
+        days = [row for row in days if row["key"] >= since]
+    if days:
+        st.bar_chart(
+            [{"day": row["key"], "videos": row["video"], "images": row["image"]} for row in days],
+            x="day", y=["videos", "images"]
+        )
+    else:
+        st.info("No ads saved in this period.")
+
+    # ---------------------------- PER COMPETITOR ----------------------------
+    st.subheader(f"Top {TOP_N} competitors")
+    st.bar_chart(
+        [{"competitor": row["name"], "ads": row["count"]} for row in data["competitor"][:TOP_N]],
+        x="competitor", y="ads", horizontal=True, sort="-ads"
+    )
+    with st.expander(f"All the competitors ({len(data['competitor'])})"):
+        st.dataframe(
+            [{"competitor": row["name"], "page id": row["key"], "ads": row["count"], "videos": row["video"], "images": row["image"]}
+             for row in data["competitor"]],
+            hide_index=True
+        )
+
+    # ---------------------------- PER TAG ----------------------------
+    st.subheader(f"Top {TOP_N} tags")
+    st.bar_chart(
+        [{"tag": row["key"], "ads": row["count"]} for row in data["tag"][:TOP_N]],
+        x="tag", y="ads", horizontal=True, sort="-ads"
+    )
+    with st.expander(f"All the tags ({len(data['tag'])})"):
+        st.dataframe(
+            [{"tag": row["key"], "ads": row["count"], "videos": row["video"], "images": row["image"]} for row in data["tag"]],
+            hide_index=True
+        )
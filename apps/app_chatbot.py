@@ -1,156 +1,191 @@
-import streamlit as st
-from bson.objectid import ObjectId
-
-from src import config, chatbot_utils, mongo, chat_stream
-
-def main():
-    # ---------------------------- Initialize chat session ----------------------------
-    if "chatbot_messages" not in st.session_state:
-        st.session_state["chatbot_messages"] = []
-
-    if "chatbot_sessionId" not in st.session_state:
-        st.session_state["chatbot_sessionId"] = str(ObjectId())
-
-    # Initialize image state
-    if "chatbot_uploaded_image" not in st.session_state:
-        st.session_state["chatbot_uploaded_image"] = None
-
-    if "chatbot_history" not in st.session_state:
-        st.session_state["chatbot_history"] = mongo.get_history_chats(limit=20, skip=0)
-
-    if "chatbot_tool_calls" not in st.session_state:
-        st.session_state["chatbot_tool_calls"] = []
-
-    if "chatbot_image_uploader_id" not in st.session_state:
-        st.session_state["chatbot_image_uploader_id"] = 0
-
-    if "chatbot_stream" not in st.session_state:
-        st.session_state["chatbot_stream"] = False
-
-    if "chatbot_model" not in st.session_state:
-        st.session_state["chatbot_model"] = st.secrets.get('chatbot_model', 'gpt-4.1-mini' if config.IS_DEBUG else 'gpt-4.1')
-
-    # ---------------------------- CHATBOT INTERFACE ----------------------------
-    st.title("Yakkyo Meta ChatBot 🤖")
-
-    # select the model from the sidebar
-    selected_model = st.sidebar.selectbox(
-        "Select Model",
-        options=config.CHATBOT_MODELS.keys(),
-        index=0 if not config.IS_DEBUG else 1,
-        key="chatbot_model_selectbox"
-    )
-    st.session_state["chatbot_model"] = config.CHATBOT_MODELS[selected_model]
-    st.sidebar.markdown("---")
-
-    ## checkbox to toggle streaming mode
-    st.session_state["chatbot_stream"] = st.sidebar.toggle(
-        "Streaming Mode",
-        value=st.session_state["chatbot_stream"],
-        key="toggle_streaming_mode"
-    )
-
-    ## button to reset the chat
-    if st.sidebar.button("New Chat", key="new_chat_button"):
-        chatbot_utils.reset_chat()
-
-    ## display the download chat button
-    chatbot_utils.display_download_chat_button()
-
-    ## display chat history in the sidebar
-    chatbot_utils.display_old_chats_history()
-
-    ## display tool calls of this chat in the sidebar
-    chatbot_utils.display_chat_tools()
-
-    # Create a container for the chat messages
-    chatbot_container = st.container()
-
-    # slider to score the current chat from 0 to 5 (only if there are messages)
-    if len(st.session_state["chatbot_messages"]) > 0:
-        chatbot_utils.insert_slider_score_chat(chatbot_container)
-
-    # Add image uploader above the chat area
-    uploaded_image = st.file_uploader(
-        "Upload an image (optional)",
-        type=["png", "jpg", "jpeg"],
-        key=f"image_uploader_chatbot_{st.session_state['chatbot_image_uploader_id']}",
-    )
-
-    # Display the uploaded image if available
-    if uploaded_image is not None:
-        with chatbot_container:
-            st.image(uploaded_image, caption="Uploaded Image")
-        st.session_state["chatbot_uploaded_image"] = chatbot_utils.get_image_base64(uploaded_image)
-
-
-    # Display chat messages from history on app rerun
-    with chatbot_container:
-        for message in st.session_state["chatbot_messages"]:
-            if message['role'] in ["user", "assistant"] and message.get("content") and not message.get("tool_calls"):
-                st.chat_message(message["role"]).markdown(message["content"])
-
-
-    # Place the chat input at the bottom of the page
-    if user_input := st.chat_input("What is up?", key="chatbot_input"):
-
-        # Display user message in chat message container
-        with chatbot_container:
-            st.chat_message("user").markdown(user_input)
-
-        # Add user message to session state
-        st.session_state["chatbot_messages"].append({"role": "user", "content": user_input})
-
-        # Prepare request params and body
-        body = {
-            "user_query": user_input,
-            "sessionId": st.session_state["chatbot_sessionId"],
-            "is_test_chat": config.IS_DEBUG,
-            "model": st.session_state["chatbot_model"],
-        }
-
-        # Add image to body if available
-        if st.session_state["chatbot_uploaded_image"] is not None:
-            body["image"] = st.session_state.pop("chatbot_uploaded_image")
-            st.session_state["chatbot_uploaded_image"] = None
-            st.session_state["chatbot_image_uploader_id"] += 1
-            uploaded_image.close()
-
-        # Call chatbot
-        if st.session_state.get("chatbot_stream", True):
-            response, data = chat_stream.call_chatbot_stream(
-                st.secrets['chatbot_webhook_url'] + "/stream",
-                body=body,
-                chatbot_container=chatbot_container
-            )
-        else:
-            response = chatbot_utils.call_chatbot(
-                st.secrets['chatbot_webhook_url'],
-                body=body
-            )
-
-        if response:
-            if st.session_state.get("chatbot_stream", True):
-                messages_tool_calls = chatbot_utils.parse_tool_calls(data.get("messages", []))
-                if response.get("messages"):
-                    st.session_state["chatbot_messages"].extend(data["messages"])
-            else:
-                messages_tool_calls = chatbot_utils.parse_tool_calls(response.get("messages", []))
-                with chatbot_container:
-                    st.chat_message("assistant").markdown(response["messages"][-1]["content"])
-                st.session_state["chatbot_messages"].extend(response["messages"])
-
-            if messages_tool_calls:
-                st.session_state["chatbot_tool_calls"].extend(messages_tool_calls)
-                print(f"Tool calls added to session {len(messages_tool_calls)}:\n{messages_tool_calls}\n")
-
-        else:
-            st.session_state["chatbot_messages"].append({
-                "role": "assistant",
-                "content": "Sorry, an error occurred. Please try again refreshing the app."
-            })
-
-            with chatbot_container:
-                st.chat_message("assistant").markdown("Sorry, an error occurred. Please try again refreshing the app.")
-
-        st.rerun()
+import streamlit as st
+from bson.objectid import ObjectId
+
+from src import config, chatbot_utils, mongo, chat_stream, chat_compare, metrics
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+
+def main():
+    # ---------------------------- Initialize chat session ----------------------------
+    if "chatbot_messages" not in st.session_state:
+        st.session_state["chatbot_messages"] = []
+
+    if "chatbot_sessionId" not in st.session_state:
+        st.session_state["chatbot_sessionId"] = str(ObjectId())
+
+    # Initialize image state
+    if "chatbot_uploaded_image" not in st.session_state:
+        st.session_state["chatbot_uploaded_image"] = None
+
+    if "chatbot_history" not in st.session_state:
+        chatbot_utils.load_history_chats(limit=20)
+
+    if "chatbot_tool_calls" not in st.session_state:
+        st.session_state["chatbot_tool_calls"] = []
+        st.session_state["chatbot_tool_call_index"] = None
+
+    if "chatbot_image_uploader_id" not in st.session_state:
+        st.session_state["chatbot_image_uploader_id"] = 0
+
+    if "chatbot_stream" not in st.session_state:
+        st.session_state["chatbot_stream"] = False
+
+    if "chatbot_compare_turns" not in st.session_state:
+        chat_compare.reset_compare()
+
+    if "chatbot_model" not in st.session_state:
+        st.session_state["chatbot_model"] = st.secrets.get('chatbot_model', 'gpt-4.1-mini' if config.IS_DEBUG else 'gpt-4.1')
+
+    # ---------------------------- CHATBOT INTERFACE ----------------------------
+    st.title("Yakkyo Meta ChatBot 🤖")
+
+    # select the model from the sidebar
+    selected_model = st.sidebar.selectbox(
+        "Select Model",
+        options=config.CHATBOT_MODELS.keys(),
+        index=0 if not config.IS_DEBUG else 1,
+        key="chatbot_model_selectbox"
+    )
+    st.session_state["chatbot_model"] = config.CHATBOT_MODELS[selected_model]
+    st.sidebar.markdown("---")
+
+    ## toggle for the streaming mode
+    chatbot_utils.display_streaming_toggle()
+
+    ## toggle to send the same query to several models concurrently
+    compare_mode = st.sidebar.toggle("Compare Models", value=False, key="toggle_compare_mode")
+    if compare_mode:
+        compare_model_names = st.sidebar.multiselect(
+            "Models to compare",
+            options=list(config.CHATBOT_MODELS.keys()),
+            default=list(config.CHATBOT_MODELS.keys())[:2],
+            key="chatbot_compare_models"
+        )
+
+    ## button to reset the chat
+    if st.sidebar.button("New Chat", key="new_chat_button"):
+        chatbot_utils.reset_chat()
+        chat_compare.reset_compare()
+
+    # ---------------------------- COMPARE MODE ----------------------------
+    if compare_mode:
+        chat_compare.display_compare_turns()
+
+        if user_input := st.chat_input("Ask all the selected models...", key="chatbot_compare_input"):
+            if not compare_model_names:
+                st.warning("Select at least one model to compare.")
+            else:
+                st.chat_message("user").markdown(user_input)
+                turn = chat_compare.compare_models(
+                    st.secrets['chatbot_webhook_url'] + "/stream",
+                    user_input,
+                    compare_model_names
+                )
+                st.session_state["chatbot_compare_turns"].append(turn)
+                st.caption(f"Wall clock: {turn['wall_s']:.2f}s for {len(compare_model_names)} models")
+        display_chat_sidebar()
+        return None
+
+    # Create a container for the chat messages, the rating slider goes on top once there are messages
+    chatbot_container = st.container()
+    rating_container = chatbot_container.container()
+
+    # Display chat messages from history on app rerun (markdown cached per message)
+    with chatbot_container:
+        chatbot_utils.display_transcript()
+
+
+    # Place the chat input at the bottom of the page
+    if user_input := st.chat_input("What is up?", key="chatbot_input"):
+
+        # Display user message in chat message container
+        with chatbot_container:
+            st.chat_message("user").markdown(user_input)
+
+        # Add user message to session state
+        st.session_state["chatbot_messages"].append({"role": "user", "content": user_input})
+
+        # Prepare request params and body
+        body = {
+            "user_query": user_input,
+            "sessionId": st.session_state["chatbot_sessionId"],
+            "is_test_chat": config.IS_DEBUG,
+            "model": st.session_state["chatbot_model"],
+        }
+
+        # Add image to body if available
+        if st.session_state["chatbot_uploaded_image"] is not None:
+            body["image"] = st.session_state.pop("chatbot_uploaded_image")
+            st.session_state["chatbot_uploaded_image"] = None
+            st.session_state["chatbot_image_uploader_id"] += 1
+
+        # Call chatbot
+        if st.session_state.get("chatbot_stream", True):
+            response, data = chat_stream.call_chatbot_stream(
+                st.secrets['chatbot_webhook_url'] + "/stream",
+                body=body,
+                chatbot_container=chatbot_container
+            )
+        else:
+            response = chatbot_utils.call_chatbot(
+                st.secrets['chatbot_webhook_url'],
+                body=body
+            )
+
+        if response:
+            num_messages_before = len(st.session_state["chatbot_messages"])
+            if st.session_state.get("chatbot_stream", True):
+                data = data or {}  # None if the stream ended before the complete event
+                if response.get("messages"):
+                    st.session_state["chatbot_messages"].extend(data.get("messages", response["messages"]))
+            else:
+                with chatbot_container:
+                    st.chat_message("assistant").markdown(response["messages"][-1]["content"])
+                st.session_state["chatbot_messages"].extend(response["messages"])
+
+            # only the new messages are indexed, the index is saved on the session
+            messages_tool_calls = chatbot_utils.index_chat_messages(num_messages_before)
+            if messages_tool_calls:
+                log.debug("Tool calls added to session", extra={"count": len(messages_tool_calls), "tool_calls": messages_tool_calls})
+
+            chatbot_utils.touch_history_chat(st.session_state["chatbot_sessionId"], len(st.session_state["chatbot_messages"]))
+
+        else:
+            st.session_state["chatbot_messages"].append({
+                "role": "assistant",
+                "content": "Sorry, an error occurred. Please try again refreshing the app."
+            })
+
+            with chatbot_container:
+                st.chat_message("assistant").markdown("Sorry, an error occurred. Please try again refreshing the app.")
+
+    # rendered after the new turn, so that no second rerun is needed to show the state it changed
+    if len(st.session_state["chatbot_messages"]) > 0:
+        chatbot_utils.insert_slider_score_chat(rating_container)
+
+    # Add image uploader below the chat area (a new, empty uploader after an image was sent)
+    chatbot_utils.display_image_uploader()
+
+    display_chat_sidebar()
+    return None
+
+
+def display_chat_sidebar() -> None:
+    """Sidebar sections showing the state of the chat, rendered at the end of the run"""
+    ## display the download chat button
+    chatbot_utils.display_download_chat_button()
+
+    ## display chat history in the sidebar
+    chatbot_utils.display_old_chats_history()
+
+    ## display tool calls of this chat in the sidebar
+    chatbot_utils.display_chat_tools()
+
+    if config.IS_DEBUG:
+        with st.sidebar.expander("Webhook latency", expanded=False):
+            st.dataframe(metrics.get_stats("http_request_seconds"), hide_index=True)
+        with st.sidebar.expander("MongoDB commands", expanded=False):
+            st.dataframe(mongo.get_command_stats(), hide_index=True)
+    return None
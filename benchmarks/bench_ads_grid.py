@@ -0,0 +1,107 @@
+"""
+Rerun time and session-state size of the FB Saved Ads page while loading 1,000 ads with LOAD MORE ADS,
+run headless with streamlit's AppTest on an in-memory stand-in of the saved ads collection (no MongoDB needed).
+
+    python -m benchmarks.bench_ads_grid [--ads 1000]
+"""
+import argparse
+import pickle
+import random
+import time
+
+from bson.objectid import ObjectId
+
+
+def fake_ads(num_ads: int, seed: int = 0) -> list:
+    """Card documents like the get_ads projection, newest first"""
+    rng = random.Random(seed)
+    tags = [f"tag_{i}" for i in range(40)]
+    ads = []
+    for i in range(num_ads):
+        ad = {
+            "_id": ObjectId(),
+            "ad_archive_id": str(1_000_000_000_000_000 + i),
+            "tags": rng.sample(tags, rng.randint(0, 3)),
+            "has_ai_image_analysis": rng.random() < 0.3,
+            "has_ai_video_analysis": False,
+        }
+        if rng.random() < 0.4:
+            ad["video_url"] = f"https://video.fcia3-1.fna.fbcdn.net/o1/v/t2/f2/m69/{i}.mp4?oe=6872FC81"
+            ad["poster_url"] = f"https://scontent.fcia3-1.fna.fbcdn.net/v/t39.35426-6/{i}_n.jpg?oe=6872FC81"
+        else:
+            ad["img_url"] = f"https://scontent.fcia3-1.fna.fbcdn.net/v/t39.35426-6/{i}_n.jpg?oe=6872FC81"
+        ads.append(ad)
+    return sorted(ads, key=lambda ad: ad["_id"], reverse=True)
+
+
+_fake_ads = {}
+
+
+def install_fake_store(num_ads: int) -> None:
+    """Point the reads of src/mongo.py used by the page to an in-memory list of ads (same list at every rerun)"""
+    from src import mongo, media_cache
+
+    ads = _fake_ads.setdefault(num_ads, fake_ads(num_ads + 100))
+
+    def get_ads(last_fetched_ad_id=None, tags=[], limit=20, type_ad="all", search="", sort="newest", collapse=False):
+        start = 0
+        if last_fetched_ad_id is not None:
+            start = next(i for i, ad in enumerate(ads) if ad["_id"] == last_fetched_ad_id) + 1
+        return [dict(ad) for ad in ads[start:start + limit]]
+
+    mongo.get_ads = get_ads
+    mongo.get_tag_counts = lambda: {f"tag_{i}": 10 for i in range(40)}
+    mongo.get_competitors = lambda: []
+    media_cache.thumbnail_urls = lambda ads: {}
+    return None
+
+
+def _app(num_ads: int):
+    from benchmarks.bench_ads_grid import install_fake_store
+    install_fake_store(num_ads)
+    from apps import app_ads_visualization
+    app_ads_visualization.main()
+
+
+def session_state_bytes(at) -> int:
+    state = {}
+    for key, value in at.session_state.items():
+        try:
+            pickle.dumps(value)
+            state[key] = value
+        except Exception:
+            continue
+    return len(pickle.dumps(state))
+
+
+def run(num_ads: int = 1000) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_function(_app, default_timeout=60, args=(num_ads,))
+    at.run()
+    loaded, samples = 0, []
+    while loaded < num_ads:
+        start = time.perf_counter()
+        at.button(key="load_more_button").click().run()
+        elapsed = time.perf_counter() - start
+        assert not at.exception, at.exception
+        loaded += 9
+        if loaded % 90 < 9 or loaded >= num_ads:
+            samples.append({"loaded": loaded, "rerun_s": elapsed, "session_bytes": session_state_bytes(at)})
+
+    start = time.perf_counter()
+    at.run()
+    idle_rerun_s = time.perf_counter() - start
+    return {"samples": samples, "idle_rerun_s": idle_rerun_s, "cards": len(at.get("code"))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ads", type=int, default=1000)
+    args = parser.parse_args()
+
+    results = run(args.ads)
+    for sample in results["samples"]:
+        print(f"{sample['loaded']:5d} ads loaded: LOAD MORE rerun {sample['rerun_s'] * 1000:.0f} ms, "
+              f"session state {sample['session_bytes'] / 1024:.0f} KiB")
+    print(f"rerun with {args.ads} ads loaded: {results['idle_rerun_s'] * 1000:.0f} ms, {results['cards']} cards rendered")
@@ -0,0 +1,105 @@
+"""
+Benchmark of the chatbot image upload: the old get_image_base64 (full decode, RGBA, forced 512x512 PNG)
+against src/chat_image.py, on synthetic 4000px phone screenshots (PNG) and photos (JPEG).
+
+    python -m benchmarks.bench_image [--repeat 5]
+"""
+import argparse
+import base64
+import io
+import random
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from src import chat_image
+
+
+def phone_screenshot(width: int = 1840, height: int = 4000, seed: int = 0) -> bytes:
+    """A PNG like a phone screenshot of a feed: flat UI, lines of text, a picture in the middle"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width, 180], fill=(24, 119, 242))
+    y = 260
+    while y < height - 100:
+        if rng.random() < 0.15:
+            # a creative: gradient + noise
+            block = Image.effect_noise((width - 120, 900), 40).convert("RGB")
+            block = Image.blend(block, Image.linear_gradient("L").resize(block.size).convert("RGB"), 0.6)
+            image.paste(block, (60, y))
+            y += 960
+            continue
+        for _ in range(rng.randint(2, 5)):
+            x = 60
+            while x < width - 200:
+                word = rng.randint(40, 220)
+                draw.rectangle([x, y, x + word, y + 38], fill=(rng.randint(20, 60),) * 3)
+                x += word + 24
+            y += 62
+        y += 60
+    with io.BytesIO() as output:
+        image.save(output, format="PNG")
+        return output.getvalue()
+
+
+def phone_photo(width: int = 4032, height: int = 3024) -> bytes:
+    """A JPEG like a phone camera photo (smooth gradients + sensor noise)"""
+    base = Image.merge("RGB", [
+        Image.linear_gradient("L").resize((width, height)),
+        Image.radial_gradient("L").resize((width, height)),
+        Image.linear_gradient("L").rotate(90).resize((width, height)),
+    ])
+    noise = Image.effect_noise((width, height), 25).convert("RGB")
+    image = Image.blend(base, noise, 0.2).filter(ImageFilter.GaussianBlur(1))
+    with io.BytesIO() as output:
+        image.save(output, format="JPEG", quality=92)
+        return output.getvalue()
+
+
+def old_path(data: bytes) -> str:
+    """chatbot_utils.get_image_base64 before src/chat_image.py"""
+    image = Image.open(io.BytesIO(data)).convert("RGBA").resize((512, 512))
+    with io.BytesIO() as output:
+        image.save(output, format="PNG")
+        data = output.getvalue()
+    return base64.b64encode(data).decode('utf-8')
+
+
+def new_path(data: bytes) -> str:
+    return chat_image.process_chat_image(data).base64
+
+
+def bench(func, data: bytes, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(data)
+        timings.append(time.perf_counter() - start)
+    return {"best_s": min(timings), "mean_s": sum(timings) / len(timings), "payload_bytes": len(result)}
+
+
+def run(repeat: int = 5) -> dict:
+    results = {}
+    for name, data in [("screenshot_png", phone_screenshot()), ("photo_jpeg", phone_photo())]:
+        results[name] = {
+            "upload_bytes": len(data),
+            "old": bench(old_path, data, repeat),
+            "new": bench(new_path, data, repeat),
+        }
+        # a rerun with the same upload: hash + cache lookup
+        chat_image.get_chat_image(data)
+        results[name]["cached"] = bench(lambda d: chat_image.get_chat_image(d).base64, data, repeat)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, r in run(args.repeat).items():
+        print(f"{name}: upload {r['upload_bytes'] / 1024:.0f} KiB")
+        for path in ["old", "new", "cached"]:
+            print(f"  {path}: best {r[path]['best_s'] * 1000:.1f} ms, mean {r[path]['mean_s'] * 1000:.1f} ms, "
+                  f"base64 payload {r[path]['payload_bytes'] / 1024:.0f} KiB")
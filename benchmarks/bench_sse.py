@@ -0,0 +1,130 @@
+"""
+Micro-benchmark of the chatbot stream parsing: replays a recorded 10k-chunk stream through the old
+call_chatbot_stream loop (requests iter_lines + json.dumps(indent=2) print per chunk) and through src/sse.py.
+
+    python -m benchmarks.bench_sse [--chunks 10000] [--repeat 5]
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import time
+
+import requests
+
+from src import sse
+from benchmarks.stub_webhook import sse_events
+
+
+def record_stream(num_chunks: int, seed: int = 0) -> list:
+    """The byte chunks of a stream with num_chunks content events, split like they arrive from the network"""
+    data = b"".join(f"data: {json.dumps(event)}\n\n".encode("utf-8") for event in sse_events("Show me the hooks of my saved ads", num_chunks))
+    rng = random.Random(seed)
+    chunks, i = [], 0
+    while i < len(data):
+        size = rng.randint(16, 1024)
+        chunks.append(data[i:i + size])
+        i += size
+    return chunks
+
+
+class _ReplayResponse(requests.Response):
+    """A requests.Response whose body is the recorded chunks, so that iter_lines runs the real requests code"""
+
+    def __init__(self, chunks: list):
+        super().__init__()
+        self._chunks = chunks
+        self.status_code = 200
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        return iter(self._chunks)
+
+
+def old_path(chunks: list) -> str:
+    """The stream loop of call_chatbot_stream before src/sse.py"""
+    response = _ReplayResponse(chunks)
+    content_buffer = ""
+    for line in response.iter_lines():
+        if line:
+            decoded_line = line.decode('utf-8')
+            if not decoded_line.startswith('data: '):
+                continue
+            try:
+                data_str = decoded_line[6:]
+                if data_str.strip():
+                    data = json.loads(data_str)
+                    print(f"\n[STREAM DATA] {json.dumps(data, indent=2)}")
+                    if data.get('type') == 'content':
+                        content_buffer += data.get('chunk', '')
+                    elif data.get('type') == 'complete':
+                        return content_buffer
+            except json.JSONDecodeError as e:
+                print(f"\n[JSON ERROR] {e}: {decoded_line}")
+                continue
+    return content_buffer
+
+
+def new_path(chunks: list, log_sample: int = 100) -> str:
+    """The stream loop of call_chatbot_stream with src/sse.py and sampled debug logging"""
+    content_buffer = ""
+    for i, event in enumerate(sse.iter_chat_events(chunks)):
+        if event.type != 'content' or i % log_sample == 0:
+            print(f"[STREAM {event.type.upper()}] #{i} {json.dumps(event.payload)[:200]}")
+        if event.type == 'content':
+            content_buffer += event.payload.get('chunk', '')
+        sse.format_chat_event(event)
+        if event.type in ['complete', 'error']:
+            return content_buffer
+    return content_buffer
+
+
+class _LogSink(io.TextIOBase):
+    """Discards the log lines like /dev/null, counting the characters written"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text: str) -> int:
+        self.size += len(text)
+        return len(text)
+
+
+def bench(func, chunks: list, repeat: int) -> dict:
+    """Best and mean wall time of func over the chunks, with stdout sent to a discarding log sink"""
+    timings, log_bytes = [], 0
+    for _ in range(repeat):
+        sink = _LogSink()
+        with contextlib.redirect_stdout(sink):
+            start = time.perf_counter()
+            result = func(chunks)
+            timings.append(time.perf_counter() - start)
+        log_bytes = sink.size
+    return {"best_s": min(timings), "mean_s": sum(timings) / len(timings), "result_len": len(result), "log_bytes": log_bytes}
+
+
+def run(num_chunks: int = 10000, repeat: int = 5) -> dict:
+    chunks = record_stream(num_chunks)
+    results = {
+        "stream_bytes": sum(len(c) for c in chunks),
+        "network_chunks": len(chunks),
+        "old": bench(old_path, chunks, repeat),
+        "new": bench(new_path, chunks, repeat),
+    }
+    assert results["old"]["result_len"] == results["new"]["result_len"], "the two paths must return the same content"
+    results["speedup"] = results["old"]["best_s"] / results["new"]["best_s"]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=10000, help="number of content events in the stream")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run(args.chunks, args.repeat)
+    print(f"stream: {args.chunks} content events, {results['stream_bytes']} bytes in {results['network_chunks']} network chunks")
+    for name in ["old", "new"]:
+        r = results[name]
+        print(f"{name}: best {r['best_s'] * 1000:.1f} ms, mean {r['mean_s'] * 1000:.1f} ms, log output {r['log_bytes'] / 1024:.0f} KiB")
+    print(f"speedup: {results['speedup']:.1f}x")
@@ -0,0 +1,341 @@
+"""
+In-memory stand-in of the pymongo Database used by src/mongo.py, for the benchmark suite when no mongod is at hand.
+Covers the query shapes of src/mongo.py: find with equality / $lt $lte $gt $gte $ne $in $nin $exists / $or $and,
+inclusion projections (also the $and/$eq/$ne/$type expressions of CARD_FIELDS), sort on one or more keys
+with a range scan on the first sort key (like an index), limit, find_one, insert_many, update_one ($set $inc $push), delete_many.
+aggregate is not supported ($text search, rollups): those cases need a real MongoDB server.
+"""
+import datetime
+from types import SimpleNamespace
+
+from bson.objectid import ObjectId
+
+_MISSING = object()
+
+
+def get_path(doc, path: str):
+    """Value at the dotted path ("snapshot.body.text", "tags.0"), _MISSING if absent"""
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.isdigit():
+            value = value[int(part)] if int(part) < len(value) else _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _sort_key(value) -> tuple:
+    # missing and null first, like MongoDB, then the values of the same type compare natively
+    return (0, 0) if value is _MISSING or value is None else (1, value)
+
+
+def _compare(value, op: str, operand) -> bool:
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == "$lt":
+            return value < operand
+        if op == "$lte":
+            return value <= operand
+        if op == "$gt":
+            return value > operand
+        return value >= operand
+    except TypeError:
+        return False  # different BSON types never match a range
+
+
+def _match_value(value, condition) -> bool:
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        return all(_match_operator(value, op, operand) for op, operand in condition.items())
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    if value is _MISSING:
+        return condition is None
+    return value == condition
+
+
+def _match_operator(value, op: str, operand) -> bool:
+    values = value if isinstance(value, list) else [value]
+    if op == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if op == "$in":
+        return any(v in operand for v in values) or (value is _MISSING and None in operand)
+    if op == "$nin":
+        return not _match_operator(value, "$in", operand)
+    if op == "$ne":
+        return not _match_value(value, operand)
+    if op == "$eq":
+        return _match_value(value, operand)
+    if op in ("$lt", "$lte", "$gt", "$gte"):
+        return any(_compare(v, op, operand) for v in values)
+    if op == "$type":
+        types = operand if isinstance(operand, list) else [operand]
+        return value is not _MISSING and any(_bson_type(v) in types for v in values)
+    raise NotImplementedError(f"query operator {op} is not supported by the in-memory stand-in")
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif key.startswith("$"):
+            raise NotImplementedError(f"query operator {key} is not supported by the in-memory stand-in")
+        elif not _match_value(get_path(doc, key), condition):
+            return False
+    return True
+
+
+def _bson_type(value) -> str:
+    if value is _MISSING:
+        return "missing"
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int" if -2**31 <= value < 2**31 else "long"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    if isinstance(value, datetime.datetime):
+        return "date"
+    return type(value).__name__
+
+
+def evaluate(expression, doc: dict):
+    """Aggregation expressions used in the projections of src/mongo.py"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return get_path(doc, expression[1:])
+    if isinstance(expression, list):
+        return [evaluate(item, doc) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    (op, args), = expression.items()
+    if op == "$type":
+        return _bson_type(evaluate(args, doc))
+    values = [evaluate(arg, doc) for arg in args]
+    if op == "$and":
+        return all(v not in (_MISSING, None, False, 0) for v in values)
+    if op == "$or":
+        return any(v not in (_MISSING, None, False, 0) for v in values)
+    if op == "$eq":
+        return values[0] == values[1]
+    if op == "$ne":
+        return values[0] != values[1]
+    raise NotImplementedError(f"expression operator {op} is not supported by the in-memory stand-in")
+
+
+def _set_path(target: dict, path: str, value) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        target = target.setdefault(part, {})
+    target[parts[-1]] = value
+    return None
+
+
+def project(doc: dict, projection) -> dict:
+    if not projection:
+        return dict(doc)
+    if isinstance(projection, list):
+        projection = {field: 1 for field in projection}
+    included = {field: spec for field, spec in projection.items() if field != "_id" and spec not in (0, False)}
+    if not included:
+        # exclusion projection
+        return {key: value for key, value in doc.items() if projection.get(key, 1) not in (0, False)}
+
+    result = {} if projection.get("_id", 1) in (0, False) else {"_id": doc["_id"]}
+    for field, spec in included.items():
+        if isinstance(spec, dict) or (isinstance(spec, str) and spec.startswith("$")):
+            result[field] = evaluate(spec, doc)
+        else:
+            value = get_path(doc, field)
+            if value is not _MISSING:
+                _set_path(result, field, value)
+    return result
+
+
+def _first_index(items: list, predicate) -> int:
+    """First index where the predicate holds, for a predicate that is False then True along the list"""
+    low, high = 0, len(items)
+    while low < high:
+        middle = (low + high) // 2
+        if predicate(items[middle]):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+class MemoryCursor:
+
+    def __init__(self, collection, query: dict, projection):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = None
+        self._limit = 0
+
+    def sort(self, key_or_list, direction: int = None):
+        self._sort = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def limit(self, limit: int):
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int):
+        return self
+
+    def _start(self, ordered: list) -> int:
+        """Skip the documents outside the range of the first sort key (the index bounds of a real server)"""
+        field, direction = self._sort[0]
+        condition = self._query.get(field)
+        if not isinstance(condition, dict):
+            return 0
+        start = 0
+        for op in (("$lt", "$lte") if direction == -1 else ("$gt", "$gte")):
+            if op not in condition:
+                continue
+            bound = (1, condition[op])
+            in_range = {
+                "$lt": lambda key: key < bound, "$lte": lambda key: key <= bound,
+                "$gt": lambda key: key > bound, "$gte": lambda key: key >= bound,
+            }[op]
+            try:
+                start = max(start, _first_index(ordered, lambda doc: in_range(_sort_key(get_path(doc, field)))))
+            except TypeError:
+                pass  # mixed types: scan from the start
+        return start
+
+    def __iter__(self):
+        if self._sort:
+            ordered = self._collection._ordered(tuple(self._sort))
+            docs = (ordered[i] for i in range(self._start(ordered), len(ordered)))
+        else:
+            docs = iter(list(self._collection._docs.values()))
+        returned = 0
+        for doc in docs:
+            if matches(doc, self._query):
+                yield project(doc, self._projection)
+                returned += 1
+                if self._limit and returned >= self._limit:
+                    return
+
+
+class MemoryCollection:
+
+    def __init__(self, name: str):
+        self.name = name
+        self._docs = {}
+        self._orders = {}  # sort spec -> documents in that order, rebuilt after writes
+
+    def _ordered(self, sort: tuple) -> list:
+        if sort not in self._orders:
+            docs = list(self._docs.values())
+            for field, direction in reversed(sort):
+                docs.sort(key=lambda doc: _sort_key(get_path(doc, field)), reverse=direction == -1)
+            self._orders[sort] = docs
+        return self._orders[sort]
+
+    def insert_many(self, documents, ordered: bool = True):
+        ids = []
+        for doc in documents:
+            doc.setdefault("_id", ObjectId())
+            self._docs[doc["_id"]] = doc
+            ids.append(doc["_id"])
+        self._orders.clear()
+        return SimpleNamespace(inserted_ids=ids, acknowledged=True)
+
+    def insert_one(self, document):
+        return SimpleNamespace(inserted_id=self.insert_many([document]).inserted_ids[0], acknowledged=True)
+
+    def update_one(self, filter: dict, update: dict, upsert: bool = False):
+        """$set, $inc and $push on top-level fields"""
+        doc = self.find_one(filter)
+        doc = self._docs[doc["_id"]] if doc is not None else None
+        if doc is None and not upsert:
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None, acknowledged=True)
+        upserted_id = None
+        if doc is None:
+            doc = {key: value for key, value in filter.items() if not key.startswith("$") and not isinstance(value, dict)}
+            upserted_id = self.insert_one(doc).inserted_id
+        for op, fields in update.items():
+            for field, value in fields.items():
+                if op == "$set":
+                    doc[field] = value
+                elif op == "$inc":
+                    doc[field] = doc.get(field, 0) + value
+                elif op == "$push":
+                    doc.setdefault(field, []).append(value)
+                else:
+                    raise NotImplementedError(f"update operator {op} is not supported by the in-memory stand-in")
+        self._orders.clear()
+        return SimpleNamespace(matched_count=int(upserted_id is None), modified_count=int(upserted_id is None),
+                               upserted_id=upserted_id, acknowledged=True)
+
+    def find(self, filter: dict = None, projection=None) -> MemoryCursor:
+        return MemoryCursor(self, filter, projection)
+
+    def find_one(self, filter: dict = None, projection=None):
+        if filter and set(filter) == {"_id"} and not isinstance(filter["_id"], dict):
+            doc = self._docs.get(filter["_id"])
+            return project(doc, projection) if doc is not None else None
+        return next(iter(self.find(filter, projection).limit(1)), None)
+
+    def count_documents(self, filter: dict) -> int:
+        return sum(1 for doc in self._docs.values() if matches(doc, filter))
+
+    def estimated_document_count(self) -> int:
+        return len(self._docs)
+
+    def delete_many(self, filter: dict):
+        ids = [doc_id for doc_id, doc in self._docs.items() if matches(doc, filter)]
+        for doc_id in ids:
+            del self._docs[doc_id]
+        self._orders.clear()
+        return SimpleNamespace(deleted_count=len(ids), acknowledged=True)
+
+    def drop(self) -> None:
+        self._docs.clear()
+        self._orders.clear()
+        return None
+
+    def create_indexes(self, indexes: list) -> list:
+        return [index.document["name"] for index in indexes]  # the stand-in always scans
+
+    def aggregate(self, pipeline: list, **kwargs):
+        raise NotImplementedError("aggregate is not supported by the in-memory stand-in, use a MongoDB server")
+
+
+class MemoryDatabase:
+
+    def __init__(self, name: str = "meta_ads_bench"):
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name)
+        return self._collections[name]
+
+    def list_collection_names(self) -> list:
+        return [name for name, collection in self._collections.items() if collection._docs]
+
+    def drop_collection(self, name: str) -> None:
+        self._collections.pop(name, None)
+        return None
@@ -0,0 +1,94 @@
+"""
+Local stand-in of the fbcdn image CDN, to exercise src/media_cache.py without Facebook.
+
+    python -m benchmarks.stub_cdn --port 8766
+
+GET /v/<name>.jpg?oe=<hex unix time>  a generated 1080x1350 JPEG creative (same name, same bytes);
+                                       403 "URL signature expired" once the oe= time has passed, like fbcdn
+GET /stats                             number of image requests and bytes sent
+"""
+import argparse
+import io
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from PIL import Image
+
+STATS = {"requests": 0, "bytes": 0, "expired": 0}
+_stats_lock = threading.Lock()
+_images = {}
+
+
+def creative(name: str, width: int = 1080, height: int = 1350) -> bytes:
+    if name not in _images:
+        seed = zlib.crc32(name.encode("utf-8"))
+        color = (seed & 0xFF, (seed >> 8) & 0xFF, (seed >> 16) & 0xFF)
+        image = Image.blend(Image.new("RGB", (width, height), color), Image.effect_noise((width, height), 30).convert("RGB"), 0.3)
+        with io.BytesIO() as output:
+            image.save(output, format="JPEG", quality=90)
+            _images[name] = output.getvalue()
+    return _images[name]
+
+
+def cdn_url(base_url: str, name: str, expires_in: int = 3600) -> str:
+    return f"{base_url}/v/{name}.jpg?stp=dst-jpg&oe={int(time.time()) + expires_in:X}"
+
+
+class StubCDNHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        return None
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/").endswith("/stats"):
+            with _stats_lock:
+                return self._send(200, json.dumps(STATS).encode("utf-8"), "application/json")
+        if not url.path.startswith("/v/"):
+            return self._send(404, b"not found", "text/plain")
+
+        expires = parse_qs(url.query).get("oe", ["0"])[0]
+        if int(expires, 16) < time.time():
+            with _stats_lock:
+                STATS["expired"] += 1
+            return self._send(403, b"URL signature expired", "text/plain")
+
+        body = creative(url.path.rsplit("/", 1)[-1])
+        with _stats_lock:
+            STATS["requests"] += 1
+            STATS["bytes"] += len(body)
+        return self._send(200, body, "image/jpeg")
+
+
+def start_stub_cdn(port: int = 0) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread, returns the server (server.server_address has the actual port)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubCDNHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in of the fbcdn image CDN")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    server = start_stub_cdn(args.port)
+    print(f"Stub CDN listening, e.g. {cdn_url(f'http://127.0.0.1:{server.server_address[1]}', 'creative_1')}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
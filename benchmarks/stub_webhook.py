@@ -0,0 +1,125 @@
+"""
+Local stand-in of the chatbot webhook, to exercise the HTTP client, the stream parser and the
+compare mode without the real backend.
+
+    python -m benchmarks.stub_webhook --port 8765
+
+Endpoints (any path prefix, e.g. http://127.0.0.1:8765/webhook):
+- POST <prefix>         JSON response like the webhook: {"success": true, "messages": [...]}
+- POST <prefix>/stream  server-sent events: init, content chunks, tool_start/tool_end, complete
+- POST <prefix>/hang    never answers (to check the read timeout)
+- GET  /stats           number of accepted TCP connections and of handled requests
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATS = {"connections": 0, "requests": 0}
+_stats_lock = threading.Lock()
+
+
+def sse_events(user_query: str, num_chunks: int = 50, model: str = "stub") -> list:
+    """The events of one streamed answer, as they are sent by the webhook /stream endpoint"""
+    words = (f"[{model}] " + (user_query or "hello") + " ").split() or ["hello"]
+    events = [{"type": "init", "message": "Processing your request..."}]
+    events.append({"type": "tool_start", "tool_name": "get_saved_ads"})
+    events.append({"type": "tool_end", "tool_name": "get_saved_ads"})
+    content = ""
+    for i in range(num_chunks):
+        chunk = words[i % len(words)] + " "
+        content += chunk
+        events.append({"type": "content", "chunk": chunk})
+    events.append({
+        "type": "complete",
+        "success": True,
+        "token_usage": [{"model": model, "prompt_tokens": 1200, "completion_tokens": num_chunks}],
+        "messages": [
+            {"role": "assistant", "content": "", "tool_calls": [
+                {"id": "call_1", "type": "function", "function": {"name": "get_saved_ads", "arguments": "{\"tags\": [\"hook\"]}"}}
+            ]},
+            {"role": "tool", "tool_call_id": "call_1", "content": "[{\"ad_archive_id\": \"1132754415366171\"}]"},
+            {"role": "assistant", "content": content}
+        ]
+    })
+    return events
+
+
+class StubWebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    chunk_delay = 0.0
+
+    def setup(self):
+        super().setup()
+        with _stats_lock:
+            STATS["connections"] += 1
+
+    def log_message(self, format, *args):
+        return None
+
+    def _send_json(self, payload: dict, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with _stats_lock:
+                return self._send_json(dict(STATS))
+        return self._send_json({"success": False, "error": "not found"}, status=404)
+
+    def do_POST(self):
+        with _stats_lock:
+            STATS["requests"] += 1
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?")[0].rstrip("/")
+
+        if path.endswith("/hang"):
+            time.sleep(3600)
+            return None
+
+        if path.endswith("/stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for event in sse_events(body.get("user_query", ""), model=body.get("model", "stub")):
+                data = f"data: {json.dumps(event)}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+                if self.chunk_delay:
+                    time.sleep(self.chunk_delay)
+            self.wfile.write(b"0\r\n\r\n")
+            return None
+
+        events = sse_events(body.get("user_query", ""), model=body.get("model", "stub"))
+        return self._send_json({"success": True, "messages": events[-1]["messages"]})
+
+
+def start_stub_webhook(port: int = 0, chunk_delay: float = 0.0) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread, returns the server (server.server_address has the actual port)"""
+    handler = type("StubWebhookHandler", (StubWebhookHandler,), {"chunk_delay": chunk_delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in of the chatbot webhook")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="seconds between two streamed events")
+    args = parser.parse_args()
+
+    server = start_stub_webhook(args.port, args.chunk_delay)
+    print(f"Stub webhook listening on http://127.0.0.1:{server.server_address[1]}/webhook")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
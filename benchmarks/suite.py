@@ -0,0 +1,330 @@
+"""
+Benchmark suite of the data access, rendering and parsing paths on synthetic data (src/synthetic.py)
+at 10k / 100k / 1M saved ads: get_ads paging with each filter combination, get_tags, get_history_chats
+deep paging, parse_tool_calls, generate_chat_pdf of 10/100/1000-message chats and the SSE stream parsing.
+
+Runs offline against a local mongod (--mongo-url, database --db, seeded once per scale and reused) or,
+by default, against the in-memory stand-in of benchmarks/memory_store.py (the $text search case needs mongod).
+Each run is saved as JSON in .cache/benchmarks and compared with the previous run of the same scale and
+backend (or --baseline): cases whose median got slower than --threshold are flagged as regressions.
+Needs .streamlit/secrets.toml like manage.py, the database of the app is never touched.
+
+    python -m benchmarks.suite [--scale 10k|100k|1m] [--mongo-url mongodb://127.0.0.1:27017] [--cases get_ads,sse]
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from src import mongo, chatbot_utils, metrics, indexes, sse, synthetic
+from src.mongo_stats import command_stats
+from benchmarks.bench_sse import record_stream
+from benchmarks.memory_store import MemoryDatabase
+
+SCALES = {"10k": (10_000, 1_000), "100k": (100_000, 10_000), "1m": (1_000_000, 100_000)}  # ads, chat sessions
+SEED_VERSION = 4  # bump when src/synthetic.py changes the generated data
+CHAT_SIZES = (10, 100, 1000)
+COLLECTIONS = [
+    "gigi_ads_saved", "gigi_ads_tags", "gigi_chatbot_sessions", "facebook_competitors", synthetic.META_COLLECTION, "bench_meta"
+]
+RESULTS_DIR = os.path.join(".cache", "benchmarks")
+
+PAGE_SIZE = 20  # get_ads pages walked per filter
+ADS_PAGES = 10
+HISTORY_PAGE_SIZE = 12
+HISTORY_PAGES = 100
+
+
+def connect(mongo_url: str, db_name: str):
+    if not mongo_url:
+        return MemoryDatabase(db_name), "memory"
+    from pymongo import MongoClient
+    client = MongoClient(mongo_url, serverSelectionTimeoutMS=5000, event_listeners=[command_stats], appname="benchmarks")
+    return client[db_name], "mongod"
+
+
+def prepare(db, backend: str, scale: str, seed: int, reseed: bool) -> dict:
+    """Seed the database for the scale unless it already holds the same data. Returns the seed metadata"""
+    num_ads, num_sessions = SCALES[scale]
+    expected = {"scale": scale, "seed": seed, "version": SEED_VERSION}
+    meta = db["bench_meta"].find_one({"_id": "seed"})
+    if meta and not reseed and all(meta.get(key) == value for key, value in expected.items()):
+        print(f"Reusing the {scale} data seeded in {meta['seed_s']:.0f}s")
+        return meta
+    if not meta and db["gigi_ads_saved"].find_one({}, {"_id": 1}):
+        sys.exit(f"{db.name} holds ads not seeded by the suite, pick another --db")
+
+    for name in COLLECTIONS:
+        db.drop_collection(name)
+    print(f"Seeding {num_ads} ads and {num_sessions} chat sessions ({backend})...")
+    start = time.perf_counter()
+    config = synthetic.SyntheticConfig(
+        num_ads=num_ads, num_sessions=num_sessions, num_competitors=1000, num_tags=200, seed=seed
+    )
+    # the in-memory stand-in is not thread-safe
+    synthetic.insert_synthetic(db, config, workers=1 if backend == "memory" else 4, force=True)
+    chat_sessions = {}
+    for size in CHAT_SIZES:
+        session = synthetic.sized_session(config, size)
+        session["is_test_chat"] = True  # kept out of the history pages
+        db["gigi_chatbot_sessions"].insert_many([session])
+        chat_sessions[str(size)] = str(session["_id"])
+    meta = {"_id": "seed", **expected, "seed_s": time.perf_counter() - start, "chat_sessions": chat_sessions}
+    db["bench_meta"].insert_many([meta])
+    if backend == "mongod":
+        mongo.client = db
+        indexes.ensure_indexes()
+    print(f"Seeded in {meta['seed_s']:.0f}s")
+    return meta
+
+
+def summarize(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "median_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)] * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def timed_calls(func, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_get_ads(backend: str, repeat: int) -> dict:
+    """Cold pages (the process-wide ads cache is cleared before every call), walked with page_cursor"""
+    tags = list(mongo.get_tag_counts().keys())
+    mongo.get_ads(limit=PAGE_SIZE)  # warm-up, not timed
+    filters = {"none": [], "top_tag": tags[:1], "rare_tag": tags[-1:], "two_tags": tags[:2]}
+    results = {}
+    for label, filter_tags in filters.items():
+        for type_ad in ["all", "image", "video"]:
+            samples = []
+            for _ in range(repeat):
+                cursor = None
+                for _ in range(ADS_PAGES):
+                    mongo.ads_cache.clear()
+                    start = time.perf_counter()
+                    ads = mongo.get_ads(last_fetched_ad_id=cursor, tags=filter_tags, limit=PAGE_SIZE, type_ad=type_ad)
+                    samples.append(time.perf_counter() - start)
+                    cursor = mongo.page_cursor(ads)
+                    if cursor is None:
+                        break
+            results[f"get_ads[tags={label},type={type_ad}]"] = summarize(samples)
+
+    mongo.get_ads(limit=PAGE_SIZE)
+    results["get_ads[cached page]"] = summarize(timed_calls(lambda: mongo.get_ads(limit=PAGE_SIZE), repeat * 20))
+
+    if backend != "mongod":
+        results["get_ads[search]"] = {"skipped": "$text search needs a MongoDB server"}
+        return results
+
+    def search_pages():
+        cursor = None
+        for _ in range(3):
+            mongo.ads_cache.clear()
+            ads = mongo.get_ads(last_fetched_ad_id=cursor, limit=PAGE_SIZE, search="glow serum offer")
+            cursor = mongo.page_cursor(ads)
+            if cursor is None:
+                break
+    results["get_ads[search, 3 pages]"] = summarize(timed_calls(search_pages, repeat))
+    return results
+
+
+def bench_get_tags(backend: str, repeat: int) -> dict:
+    return {"get_tags": summarize(timed_calls(mongo.get_tags, repeat * 10))}
+
+
+def bench_get_history_chats(backend: str, repeat: int) -> dict:
+    """Keyset paging down to page HISTORY_PAGES: the deepest page should cost like the first one"""
+    first, deepest, depth = [], [], 0
+    mongo.get_history_chats(limit=HISTORY_PAGE_SIZE)  # warm-up, not timed
+    for _ in range(repeat):
+        cursor = None
+        for page in range(1, HISTORY_PAGES + 1):
+            start = time.perf_counter()
+            sessions, cursor = mongo.get_history_chats(limit=HISTORY_PAGE_SIZE, cursor=cursor)
+            elapsed = time.perf_counter() - start
+            if page == 1:
+                first.append(elapsed)
+            depth = page
+            if cursor is None:
+                break
+        deepest.append(elapsed)
+    return {
+        "get_history_chats[page 1]": summarize(first),
+        f"get_history_chats[page {depth}]": summarize(deepest),
+    }
+
+
+def _chat(meta: dict, size: int) -> tuple:
+    session_id = meta["chat_sessions"][str(size)]
+    return session_id, mongo.get_chatbot_session(session_id)["messages"]
+
+
+def bench_parse_tool_calls(backend: str, repeat: int, meta: dict) -> dict:
+    results = {}
+    for size in CHAT_SIZES:
+        _, messages = _chat(meta, size)
+        results[f"parse_tool_calls[{size} messages]"] = summarize(
+            timed_calls(lambda: chatbot_utils.parse_tool_calls(messages), repeat * 10)
+        )
+    return results
+
+
+def bench_generate_chat_pdf(backend: str, repeat: int, meta: dict) -> dict:
+    results = {}
+    for size in CHAT_SIZES:
+        session_id, messages = _chat(meta, size)
+        runs = repeat if size < 1000 else max(1, min(repeat, 3))
+        results[f"generate_chat_pdf[{size} messages]"] = summarize(
+            timed_calls(lambda: chatbot_utils.generate_chat_pdf(session_id, messages), runs)
+        )
+    return results
+
+
+def bench_sse(backend: str, repeat: int) -> dict:
+    chunks = record_stream(10_000)
+
+    def parse():
+        for event in sse.iter_chat_events(chunks):
+            sse.format_chat_event(event)
+    return {"sse_parse[10k content events]": summarize(timed_calls(parse, repeat))}
+
+
+CASES = {
+    "get_ads": bench_get_ads,
+    "get_tags": bench_get_tags,
+    "get_history_chats": bench_get_history_chats,
+    "parse_tool_calls": bench_parse_tool_calls,
+    "generate_chat_pdf": bench_generate_chat_pdf,
+    "sse": bench_sse,
+}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(scale: str = "10k", mongo_url: str = "", db_name: str = "meta_ads_bench", cases: list = None,
+        repeat: int = 5, seed: int = 0, reseed: bool = False) -> dict:
+    db, backend = connect(mongo_url, db_name)
+    meta = prepare(db, backend, scale, seed, reseed)
+    mongo.client = db  # every query of src/mongo.py and chatbot_utils now hits the benchmark database
+    mongo.ads_cache.clear()
+    mongo.ad_details_cache.clear()
+
+    results = {}
+    for name in cases or list(CASES):
+        print(f"Running {name}...")
+        bench = CASES[name]
+        if name in ("parse_tool_calls", "generate_chat_pdf"):
+            results.update(bench(backend, repeat, meta))
+        else:
+            results.update(bench(backend, repeat))
+
+    return {
+        "meta": {
+            "scale": scale, "backend": backend, "ads": SCALES[scale][0], "chat_sessions": SCALES[scale][1],
+            "seed": seed, "seed_version": SEED_VERSION, "repeat": repeat, "commit": _git_commit(),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "cases": results,
+        "metrics": metrics.get_stats(),
+        "mongo_commands": mongo.get_command_stats() if backend == "mongod" else [],
+    }
+
+
+def save(results: dict, results_dir: str = RESULTS_DIR) -> str:
+    os.makedirs(results_dir, exist_ok=True)
+    meta = results["meta"]
+    path = os.path.join(results_dir, f"{meta['started_at'].replace(':', '')}_{meta['scale']}_{meta['backend']}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    return path
+
+
+def previous_result(results_dir: str, scale: str, backend: str, exclude: str = None) -> str:
+    """Path of the latest saved run with the same scale and backend, None if there is none"""
+    for path in sorted(glob.glob(os.path.join(results_dir, f"*_{scale}_{backend}.json")), reverse=True):
+        if path != exclude:
+            return path
+    return None
+
+
+def compare(results: dict, baseline: dict, threshold: float, noise_ms: float = 0.5) -> list:
+    """Median of every case against the baseline: a regression is slower by more than threshold and noise_ms"""
+    rows = []
+    for case, current in results["cases"].items():
+        previous = baseline["cases"].get(case, {})
+        if "median_ms" not in current or "median_ms" not in previous:
+            continue
+        change = current["median_ms"] / previous["median_ms"] - 1 if previous["median_ms"] else 0.0
+        rows.append({
+            "case": case, "baseline_ms": previous["median_ms"], "current_ms": current["median_ms"], "change": change,
+            "regression": change > threshold and current["median_ms"] - previous["median_ms"] > noise_ms,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(SCALES), default="10k")
+    parser.add_argument("--mongo-url", default="", help="local mongod, e.g. mongodb://127.0.0.1:27017 (default: in-memory stand-in)")
+    parser.add_argument("--db", default="meta_ads_bench", help="benchmark database, seeded by the suite")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma separated subset of {','.join(CASES)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reseed", action="store_true", help="drop and seed the benchmark database again")
+    parser.add_argument("--baseline", help="results JSON to compare with (default: previous run of the same scale and backend)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="slowdown of the median flagged as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 if a regression is flagged")
+    args = parser.parse_args()
+
+    cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    results = run(args.scale, args.mongo_url, args.db, cases, args.repeat, args.seed, args.reseed)
+    path = save(results)
+    baseline_path = args.baseline or previous_result(RESULTS_DIR, args.scale, results["meta"]["backend"], exclude=path)
+
+    print(f"\n{args.scale} ads, {results['meta']['backend']} backend, saved to {path}")
+    rows = {}
+    if baseline_path:
+        with open(baseline_path) as f:
+            rows = {row["case"]: row for row in compare(results, json.load(f), args.threshold)}
+        print(f"compared with {baseline_path}")
+    for case, summary in results["cases"].items():
+        if "skipped" in summary:
+            print(f"{case:48s} skipped: {summary['skipped']}")
+            continue
+        line = f"{case:48s} median {summary['median_ms']:9.2f} ms   p95 {summary['p95_ms']:9.2f} ms"
+        if case in rows:
+            line += f"   {rows[case]['change']:+7.1%} vs {rows[case]['baseline_ms']:.2f} ms"
+            line += "   REGRESSION" if rows[case]["regression"] else ""
+        print(line)
+
+    regressions = [row for row in rows.values() if row["regression"]]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        if args.fail_on_regression:
+            sys.exit(1)
@@ -1,28 +1,71 @@
-import streamlit as st
-
-from src import auth, config
-from apps import app_ads_visualization, app_chatbot
-
-
-# ---------------------------- AUTH CHECKS ----------------------------
-if config.IS_DEBUG:
-    # skip password check in debug mode
-    print("Running in debug mode, skipping password check.")
-    st.session_state["password_correct"] = True
-
-elif not auth.check_password():
-    print("Password incorrect, stopping the script.")
-    st.stop()  # Do not continue if check_password is not True.
-
-
-# ---------------------------- APP INTERFACE ----------------------------
-## add a multiselect to choose betwheen ads visualization app and chatbot app
-app_options = {
-    "FB Saved Ads": app_ads_visualization.main,
-    "MCP Chatbot": app_chatbot.main
-}
-
-st.selectbox("App:", list(app_options.keys()), index=0, key="app_selector")
-
-## run the selected app
-app_options[st.session_state["app_selector"]]()
+import streamlit as st
+
+from src import auth, config, indexes, metrics
+from src.logs import get_logger
+from apps import app_ads_visualization, app_chatbot, app_analytics
+
+log = get_logger("main")
+
+
+# ---------------------------- DATABASE INDEXES ----------------------------
+@st.cache_resource(show_spinner=False)
+def init_indexes() -> bool:
+    # once per process: create the indexes required by the queries (no-op if they already exist)
+    try:
+        # the failed indexes are logged one by one, the others are created anyway
+        return not indexes.ensure_indexes()["failed"]
+    except Exception as e:
+        log.error("Error ensuring MongoDB indexes", extra={"error": str(e)})
+        return False
+
+init_indexes()
+
+
+# ---------------------------- METRICS ENDPOINT ----------------------------
+@st.cache_resource(show_spinner=False)
+def init_metrics_server() -> bool:
+    # once per process: Prometheus text endpoint for the scrapers, on its own port (METRICS_PORT)
+    if not config.METRICS_PORT:
+        return False
+    try:
+        metrics.start_metrics_server(config.METRICS_PORT, config.METRICS_HOST)
+        log.info("Serving metrics", extra={"url": f"http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics"})
+        return True
+    except OSError as e:
+        log.error("Error starting the metrics server", extra={"port": config.METRICS_PORT, "error": str(e)})
+        return False
+
+init_metrics_server()
+
+
+# ---------------------------- AUTH CHECKS ----------------------------
+if config.IS_DEBUG:
+    # skip password check in debug mode
+    log.debug("Running in debug mode, skipping password check.")
+    st.session_state["password_correct"] = True
+
+elif not auth.check_password():
+    log.debug("Password incorrect, stopping the script.")
+    st.stop()  # Do not continue if check_password is not True.
+
+
+# ---------------------------- APP INTERFACE ----------------------------
+## add a multiselect to choose betwheen ads visualization app and chatbot app
+app_options = {
+    "FB Saved Ads": app_ads_visualization.main,
+    "MCP Chatbot": app_chatbot.main,
+    "Analytics": app_analytics.main
+}
+
+st.selectbox("App:", list(app_options.keys()), index=0, key="app_selector")
+
+## run the selected app, timed (fragment reruns don't go through here)
+with metrics.timer("rerun_seconds", app=st.session_state["app_selector"]):
+    app_options[st.session_state["app_selector"]]()
+
+
+# ---------------------------- PERFORMANCE PANEL ----------------------------
+if config.IS_DEBUG:
+    with st.sidebar.expander("Performance (this process)", expanded=False):
+        st.dataframe(metrics.get_stats(), hide_index=True)
+        st.json(metrics.get_counters())
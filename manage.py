@@ -0,0 +1,205 @@
+"""
+Maintenance commands for the meta ads explorer database.
+Run from the repository root so that .streamlit/secrets.toml is found, e.g.:
+
+    python manage.py rebuild-tags
+"""
+import argparse
+import os
+import sys
+
+from src import mongo, indexes, analysis_pdf, media_cache, synthetic, export, rollups, backfill, dedup
+
+
+def rebuild_tags(args: argparse.Namespace) -> None:
+    tag_counts = mongo.rebuild_tag_catalog()
+    for tag, count in tag_counts.items():
+        print(f"{tag}: {count}")
+    return None
+
+
+def ensure_indexes(args: argparse.Namespace) -> None:
+    result = indexes.ensure_indexes()
+    print(f"Created indexes: {result['created']}" if result["created"] else "All the indexes already exist.")
+    for collection, errors in result["failed"].items():
+        for name, error in errors.items():
+            print(f"ERROR: index {name} of {collection} not created: {error}")
+    if result["failed"]:
+        sys.exit(1)
+
+    if args.verify:
+        reports = indexes.explain_query_shapes()
+        for report in reports:
+            print(f"{'FAIL' if report['problems'] else 'OK  '} {report['name']}: {' <- '.join(report['stages'])}")
+        try:
+            indexes.verify_query_plans(reports)
+        except indexes.QueryPlanError as e:
+            print(f"ERROR: {str(e)}")
+            sys.exit(1)
+    return None
+
+
+def prerender_analysis_pdfs(args: argparse.Namespace) -> None:
+    stats = analysis_pdf.prerender_analysis_pdfs(full=args.full)
+    print(f"{stats['ads']} ads: {stats['rendered']} PDFs rendered, {stats['cached']} already cached, {stats['errors']} errors")
+    return None
+
+
+def cache_media(args: argparse.Namespace) -> None:
+    stats = media_cache.warm_media_cache(limit=args.limit)
+    print(f"{stats['ads']} ads without a cached thumbnail: {stats['cached']} cached, {stats['errors']} errors")
+    return None
+
+
+def refresh_rollups(args: argparse.Namespace) -> None:
+    if args.full:
+        counts = rollups.rebuild_rollups()
+        print(f"Rebuilt the rollups: {counts}")
+    else:
+        stats = rollups.refresh_rollups(remove_deleted=True)
+        print("Another refresh is running, skipped." if stats.get("skipped") else f"Refreshed the rollups: {stats}")
+    return None
+
+
+def extract_fields(args: argparse.Namespace) -> None:
+    stats = backfill.backfill_ad_fields(
+        full=args.full, batch_size=args.batch_size, workers=args.workers, limit=args.limit,
+        progress=lambda ads: print(f"{ads} ads", flush=True)
+    )
+    resumed = f" (resumed after {stats['resumed_from']})" if stats["resumed_from"] else ""
+    print(f"Parsed {stats['ads']} ads in {stats['batches']} batches in {stats['seconds']}s{resumed}")
+    return None
+
+
+def cluster_ads(args: argparse.Namespace) -> None:
+    stats = dedup.cluster_ads(
+        full=args.full, batch_size=args.batch_size, progress=lambda ads: print(f"{ads} ads", flush=True)
+    )
+    print(
+        f"Clustered {stats['ads']} ads in {stats['seconds']}s: {stats['variants']} variants, "
+        f"{stats['merged']} clusters merged, {stats['removed']} deleted ads removed"
+    )
+    return None
+
+
+def export_ads(args: argparse.Namespace) -> None:
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    if fmt not in export.WRITERS:
+        print(f"ERROR: can't infer the format of {args.output}, use --format {'|'.join(export.WRITERS)}")
+        sys.exit(1)
+    tags = [tag.strip() for tag in args.tags.split(",") if tag.strip()]
+
+    stats = export.export_ads(
+        args.output, fmt, tags=tags, type_ad=args.type, search=args.search, batch_size=args.batch_size,
+        progress=lambda rows: print(f"{rows} ads", flush=True)
+    )
+    print(f"Exported {stats['rows']} ads to {args.output} ({stats['bytes'] / 1e6:.1f} MB) in {stats['seconds']}s")
+    return None
+
+
+def generate_synthetic(args: argparse.Namespace) -> None:
+    config = synthetic.SyntheticConfig(
+        num_ads=args.ads, num_sessions=args.sessions, num_competitors=args.competitors, num_tags=args.tags,
+        tag_skew=args.tag_skew, body_words=(args.body_words, 0.6), start_index=args.start_index, seed=args.seed,
+    )
+
+    def progress(collection: str, count: int) -> None:
+        print(f"{collection}: {count}", flush=True)
+        return None
+
+    if args.jsonl:
+        counts = synthetic.write_jsonl(args.jsonl, config, progress=progress)
+        print(f"Written to {args.jsonl}: {counts}")
+        return None
+
+    if not args.db or args.db == mongo.client.name:
+        print(f"ERROR: pick a separate database with --db (not the app database {mongo.client.name})")
+        sys.exit(1)
+    if args.mongo_url:
+        from pymongo import MongoClient
+        db = MongoClient(args.mongo_url, appname="generate-synthetic")[args.db]
+    else:
+        db = mongo.get_mongo_client()[args.db]
+    try:
+        stats = synthetic.insert_synthetic(db, config, batch_size=args.batch_size, workers=args.workers,
+                                           progress=progress, force=args.force)
+    except ValueError as e:
+        print(f"ERROR: {str(e)}")
+        sys.exit(1)
+    print(f"Inserted into {args.db} in {stats['seconds']}s: {stats['counts']}")
+    if args.indexes:
+        mongo.client = db
+        result = indexes.ensure_indexes()
+        print(f"Created indexes: {result['created']}" + (f", failed: {result['failed']}" if result["failed"] else ""))
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Meta ads explorer maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_rebuild_tags = subparsers.add_parser("rebuild-tags", help="rebuild/reconcile the tag catalog from the saved ads")
+    parser_rebuild_tags.set_defaults(func=rebuild_tags)
+
+    parser_indexes = subparsers.add_parser("indexes", help="create the required indexes")
+    parser_indexes.add_argument("--verify", action="store_true", help="explain() every query shape, fail on COLLSCAN or in-memory SORT")
+    parser_indexes.set_defaults(func=ensure_indexes)
+
+    parser_prerender = subparsers.add_parser("prerender-analysis-pdfs", help="render the AI analysis PDFs of the ads updated since the last run")
+    parser_prerender.add_argument("--full", action="store_true", help="ignore the watermark and check all the ads")
+    parser_prerender.set_defaults(func=prerender_analysis_pdfs)
+
+    parser_cache_media = subparsers.add_parser("cache-media", help="download the creatives of the ads without a cached thumbnail")
+    parser_cache_media.add_argument("--limit", type=int, default=0, help="newest N ads only (0 = all)")
+    parser_cache_media.set_defaults(func=cache_media)
+
+    parser_rollups = subparsers.add_parser("refresh-rollups", help="apply the ads changed since the last run to the analytics rollups")
+    parser_rollups.add_argument("--full", action="store_true", help="recompute the rollups from scratch ($facet over all the ads)")
+    parser_rollups.set_defaults(func=refresh_rollups)
+
+    parser_extract = subparsers.add_parser("extract-fields", help="parse full_html_text into the extracted fields of the ads saved since the last run")
+    parser_extract.add_argument("--full", action="store_true", help="ignore the checkpoint and parse all the ads again")
+    parser_extract.add_argument("--workers", type=int, default=None, help="parser processes (default: one per CPU)")
+    parser_extract.add_argument("--batch-size", type=int, default=backfill.BATCH_SIZE, help="ads per process task and bulk_write")
+    parser_extract.add_argument("--limit", type=int, default=0, help="at most N ads in this run (0 = all)")
+    parser_extract.set_defaults(func=extract_fields)
+
+    parser_cluster = subparsers.add_parser("cluster-ads", help="add the ads saved since the last run to the clusters of near-duplicate copies")
+    parser_cluster.add_argument("--full", action="store_true", help="drop the clusters and cluster all the ads again")
+    parser_cluster.add_argument("--batch-size", type=int, default=dedup.BATCH_SIZE, help="ads per MinHash batch")
+    parser_cluster.set_defaults(func=cluster_ads)
+
+    parser_export = subparsers.add_parser("export-ads", help="export the ads matching a tag/type/search filter to CSV, JSONL or Parquet")
+    parser_export.add_argument("output", help="output file, e.g. ads.parquet")
+    parser_export.add_argument("--format", choices=list(export.WRITERS), help="default: from the output extension")
+    parser_export.add_argument("--tags", default="", help="comma separated, ads with any of the tags")
+    parser_export.add_argument("--type", choices=["all", "image", "video"], default="all")
+    parser_export.add_argument("--search", default="", help="full-text search of the ad copy")
+    parser_export.add_argument("--batch-size", type=int, default=export.EXPORT_BATCH_SIZE, help="ads per cursor batch")
+    parser_export.set_defaults(func=export_ads)
+
+    parser_synthetic = subparsers.add_parser("generate-synthetic", help="fill a separate database (or JSONL files) with synthetic ads and chat sessions")
+    parser_synthetic.add_argument("--db", help="target database, on the server of MONGO_DB_URL unless --mongo-url (never the app database)")
+    parser_synthetic.add_argument("--mongo-url", help="e.g. mongodb://127.0.0.1:27017")
+    parser_synthetic.add_argument("--jsonl", metavar="DIR", help="write one mongoimport-ready JSONL file per collection instead")
+    parser_synthetic.add_argument("--ads", type=int, default=100_000)
+    parser_synthetic.add_argument("--sessions", type=int, default=10_000)
+    parser_synthetic.add_argument("--competitors", type=int, default=500)
+    parser_synthetic.add_argument("--tags", type=int, default=100, help="size of the tag vocabulary")
+    parser_synthetic.add_argument("--tag-skew", type=float, default=1.1, help="Zipf exponent of the tag popularity (0 = uniform)")
+    parser_synthetic.add_argument("--body-words", type=int, default=40, help="median length of the ad copy in words")
+    parser_synthetic.add_argument("--seed", type=int, default=0)
+    parser_synthetic.add_argument("--start-index", type=int, default=0, help="first ad/session index, to append to a synthetic database")
+    parser_synthetic.add_argument("--batch-size", type=int, default=10_000, help="documents per insert_many")
+    parser_synthetic.add_argument("--workers", type=int, default=4, help="parallel insert_many")
+    parser_synthetic.add_argument("--indexes", action="store_true", help="create the indexes of the app afterwards")
+    parser_synthetic.add_argument("--force", action="store_true", help="write even if the database holds non-synthetic ads")
+    parser_synthetic.set_defaults(func=generate_synthetic)
+
+    args = parser.parse_args()
+    args.func(args)
+    return None
+
+
+if __name__ == "__main__":
+    main()
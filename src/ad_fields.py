@@ -0,0 +1,154 @@
+"""
+Typed fields parsed from full_html_text, the text content of the ad card saved by the chrome extension:
+
+    ​ActiveLibrary ID: 1947996416031676Started running on 7 Jul 2025 · Total active time 11 hrsPlatforms​​
+    This ad has multiple versions​Open Drop-down​See ad detailsGlowvaniSponsored"I used to feel..."GLOWVANI.COM
+    Naturally Lighten Dark Inner Thighs in 2–3 Weeks ✨...Shop NowClick to select tags...Add TagSave ad
+
+-> {"status": "active", "library_id": "1947996416031676", "started_on": datetime(2025, 7, 7), "ended_on": None,
+    "active_hours": 11.0, "advertiser": "Glowvani", "domain": "glowvani.com", "cta": "Shop Now",
+    "multiple_versions": True, "versions": None, "version": 1}
+
+Stored in the "extracted" field of the ads (see src/backfill.py). English and Italian Ads Library labels,
+like the extension. Pure functions, no database access: the backfill runs them in worker processes.
+"""
+import re
+from datetime import datetime
+from typing import Union
+
+# bump when the parsing changes: the backfill re-parses the ads with an older version
+PARSER_VERSION = 1
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6, "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+    "gen": 1, "mag": 5, "giu": 6, "lug": 7, "ago": 8, "set": 9, "ott": 10, "dic": 12,
+}
+
+# call to action buttons of the ads, longest first so that "Send WhatsApp Message" wins over "Send Message"
+CTAS = sorted([
+    "Shop Now", "Learn More", "Sign Up", "Order Now", "Buy Now", "Get Offer", "Book Now", "Download", "Install Now",
+    "Contact Us", "Apply Now", "Subscribe", "Watch More", "Send Message", "Send WhatsApp Message", "Get Quote",
+    "Get Started", "Play Game", "Use App", "Listen Now", "Donate Now", "Call Now", "See Menu", "Get Directions",
+    "Request Time", "See More", "Get Showtimes", "Acquista ora", "Scopri di più", "Iscriviti", "Ordina ora",
+    "Prenota ora", "Scarica", "Installa ora", "Contattaci", "Invia messaggio", "Ottieni offerta", "Richiedi preventivo",
+], key=len, reverse=True)
+
+HOURS_PER_UNIT = {
+    "min": 1 / 60, "mins": 1 / 60, "minute": 1 / 60, "minutes": 1 / 60, "minuti": 1 / 60,
+    "h": 1, "hr": 1, "hrs": 1, "hour": 1, "hours": 1, "ora": 1, "ore": 1,
+    "day": 24, "days": 24, "d": 24, "g": 24, "giorno": 24, "giorni": 24,
+    "wk": 168, "wks": 168, "week": 168, "weeks": 168, "settimana": 168, "settimane": 168,
+    "mo": 730, "mos": 730, "month": 730, "months": 730, "mese": 730, "mesi": 730,
+}
+
+_DATE = r"(\d{1,2} [A-Za-z]{3,9}\.? \d{4}|[A-Za-z]{3,9}\.? \d{1,2}, \d{4})"
+_STATUS_RE = re.compile(r"^\W*(Inactive|Active|Non attiva|Attiva)")
+_LIBRARY_ID_RE = re.compile(r"(?:Library ID|ID libreria):\s*(\d+)")
+_STARTED_RE = re.compile(r"(?:Started running on|Data di inizio della pubblicazione:)\s*" + _DATE)
+_RANGE_RE = re.compile(_DATE + r"\s*[-–]\s*" + _DATE)
+_VERSIONS_RE = re.compile(r"(\d+) (?:ads use this creative and text|inserzioni usano questa creatività e questo testo)")
+_MULTIPLE_RE = re.compile(r"This ad has multiple versions|Questa inserzione ha più versioni")
+_ADVERTISER_RE = re.compile(
+    r"(?:See ad details|See summary details|Vedi dettagli dell'inserzione|Vedi i dettagli del riepilogo)"
+    r"[\s​]*(.+?)[\s​]*(?:Sponsored|Sponsorizzato)"
+)
+_SPONSORED_RE = re.compile(r"Sponsored|Sponsorizzato")
+# link caption of the card, upper case and glued to the headline: "GLOWVANI.COMNaturally Lighten..."
+_DOMAIN_RE = re.compile(r"((?:[A-Z0-9][A-Z0-9-]*\.)+[A-Z]{2,}?)(?=[A-Z][a-z]|[^A-Za-z]|$)")
+_CTA_RE = re.compile("|".join(re.escape(cta) for cta in CTAS))
+# the units are glued to the next label: "Total active time 11 hrsPlatforms"
+_UNIT = "(" + "|".join(sorted(HOURS_PER_UNIT, key=len, reverse=True)) + ")(?![a-z])"
+_ACTIVE_TIME_RE = re.compile(r"(?:Total active time|Tempo di attività totale:?)\s*((?:\d+\s*" + _UNIT + r"\s*)+)")
+_DURATION_PART_RE = re.compile(r"(\d+)\s*" + _UNIT)
+# buttons added to the card by the extension
+_EXTENSION_SUFFIX_RE = re.compile(r"Click to select tags.*$", re.DOTALL)
+
+
+def parse_date(text: str) -> Union[datetime, None]:
+    """'7 Jul 2025', 'Jul 7, 2025', '1 lug 2025' -> datetime(2025, 7, 7)"""
+    parts = text.replace(",", "").replace(".", "").split()
+    if len(parts) != 3:
+        return None
+    if parts[0].isdigit():
+        day, month, year = parts
+    else:
+        month, day, year = parts
+    month = MONTHS.get(month[:3].lower())
+    try:
+        return datetime(int(year), month, int(day)) if month else None
+    except ValueError:
+        return None
+
+
+def parse_duration_hours(text: str) -> Union[float, None]:
+    """'11 hrs' -> 11.0, '2 days 4 hrs' -> 52.0"""
+    hours, found = 0.0, False
+    for amount, unit in _DURATION_PART_RE.findall(text):
+        factor = HOURS_PER_UNIT.get(unit.lower())
+        if factor is None:
+            break
+        hours += int(amount) * factor
+        found = True
+    return round(hours, 2) if found else None
+
+
+def _last_match(pattern: re.Pattern, text: str) -> Union[str, None]:
+    matches = pattern.findall(text)
+    return matches[-1] if matches else None
+
+
+def creative_text(text: str) -> str:
+    """The creative part of the card text: what follows "Sponsored", without the buttons added by the extension"""
+    sponsored = _SPONSORED_RE.search(text)
+    return _EXTENSION_SUFFIX_RE.sub("", text[sponsored.end():] if sponsored else text)
+
+
+def parse_full_html_text(text: str, saved_at: datetime = None) -> dict:
+    """
+    Fields of the card text (None when absent). active_hours is the "Total active time" of the card,
+    or the time between the start date and the end date (inactive ads) or saved_at (the ad's created_at).
+    """
+    text = text or ""
+    fields = {
+        "status": None, "library_id": None, "started_on": None, "ended_on": None, "active_hours": None,
+        "advertiser": None, "domain": None, "cta": None, "multiple_versions": False, "versions": None,
+        "version": PARSER_VERSION,
+    }
+
+    if match := _STATUS_RE.search(text):
+        fields["status"] = "active" if match.group(1) in ("Active", "Attiva") else "inactive"
+    if match := _LIBRARY_ID_RE.search(text):
+        fields["library_id"] = match.group(1)
+
+    if match := _RANGE_RE.search(text):
+        fields["started_on"], fields["ended_on"] = parse_date(match.group(1)), parse_date(match.group(2))
+    elif match := _STARTED_RE.search(text):
+        fields["started_on"] = parse_date(match.group(1))
+
+    if match := _ACTIVE_TIME_RE.search(text):
+        fields["active_hours"] = parse_duration_hours(match.group(1))
+    if fields["active_hours"] is None and fields["started_on"]:
+        until = fields["ended_on"] or saved_at
+        if until and until >= fields["started_on"]:
+            fields["active_hours"] = round((until - fields["started_on"]).total_seconds() / 3600, 2)
+
+    if match := _VERSIONS_RE.search(text):
+        fields["versions"] = int(match.group(1))
+        fields["multiple_versions"] = fields["versions"] > 1
+    elif _MULTIPLE_RE.search(text):
+        fields["multiple_versions"] = True
+
+    if match := _ADVERTISER_RE.search(text):
+        fields["advertiser"] = match.group(1).strip() or None
+
+    # the domain and the CTA come after "Sponsored", in the creative
+    creative = creative_text(text)
+    if domain := _last_match(_DOMAIN_RE, creative):
+        fields["domain"] = domain.lower()
+    fields["cta"] = _last_match(_CTA_RE, creative)
+    return fields
+
+
+def parse_batch(ads: list) -> list:
+    """[(_id, full_html_text, created_at)] -> [(_id, fields)], the unit of work of the backfill processes"""
+    return [(ad_id, parse_full_html_text(text, saved_at)) for ad_id, text, saved_at in ads]
@@ -0,0 +1,149 @@
+"""
+Windowed ads grid of the FB Saved Ads app: the loaded pages are kept in session state as compact card records
+in a small LRU, only the pages of the current window are rendered, and evicted pages are fetched again
+(from the process-wide get_ads cache, most of the times) when the user scrolls back to them.
+
+Session state:
+- ads_filter: (tags, type_ad, search, sort, collapse) of the loaded pages
+- ads_page_cursors: get_ads cursor of each page, cursors[i] fetches page i (None for page 0)
+- ads_pages: OrderedDict page index -> list of compact ads, at most ADS_SESSION_MAX_PAGES
+- ads_window: [first, last] page index rendered
+- ads_data: the ads of the window (what the cards and the bulk tagging work on)
+- last_id: cursor of the page after the window
+"""
+from collections import OrderedDict
+
+import streamlit as st
+
+from src import mongo
+from src.config import ADS_WINDOW_PAGES, ADS_SESSION_MAX_PAGES
+
+# fields of an ad kept in session state: what the card renders plus the paging keys
+COMPACT_FIELDS = ["_id", "ad_archive_id", "video_url", "img_url", "poster_url", "tags", "search_score", "active_hours", "variants"]
+COMPACT_FLAGS = ["has_ai_image_analysis", "has_ai_video_analysis"]
+
+
+def compact_ad(ad: dict) -> dict:
+    record = {field: ad[field] for field in COMPACT_FIELDS if ad.get(field) is not None}
+    record.update({flag: True for flag in COMPACT_FLAGS if ad.get(flag)})
+    if "active_hours" in ad:
+        record["active_hours"] = ad["active_hours"]  # None too: page_cursor recognizes the longest_running pages by it
+    return record
+
+
+def reset_grid(page_size: int, tags: list = [], type_ad: str = "all", search: str = "", sort: str = "newest",
+               collapse: bool = False) -> list:
+    """Drop the loaded pages and load the first page of the given filter and sort. Returns its ads"""
+    st.session_state["ads_page_size"] = page_size
+    st.session_state["ads_filter"] = (list(tags), type_ad, search, sort, collapse)
+    st.session_state["ads_page_cursors"] = [None]
+    st.session_state["ads_pages"] = OrderedDict()
+    st.session_state["ads_window"] = [0, 0]
+    ads = _get_page(0)
+    _refresh_window()
+    return ads
+
+
+def _get_page(page: int) -> list:
+    """Ads of the page, from the session LRU or fetched again with its cursor"""
+    pages = st.session_state["ads_pages"]
+    if page in pages:
+        pages.move_to_end(page)
+        return pages[page]
+
+    cursors = st.session_state["ads_page_cursors"]
+    tags, type_ad, search, sort, collapse = st.session_state["ads_filter"]
+    ads = [compact_ad(ad) for ad in mongo.get_ads(
+        last_fetched_ad_id=cursors[page],
+        limit=st.session_state["ads_page_size"],
+        tags=tags,
+        type_ad=type_ad,
+        search=search,
+        sort=sort,
+        collapse=collapse
+    )]
+
+    cursor = mongo.page_cursor(ads)
+    if page + 1 < len(cursors):
+        cursors[page + 1] = cursor
+    else:
+        cursors.append(cursor)
+
+    pages[page] = ads
+    _evict_pages()
+    return ads
+
+
+def _evict_pages() -> None:
+    """Drop the least recently used pages outside the window above ADS_SESSION_MAX_PAGES"""
+    pages = st.session_state["ads_pages"]
+    first, last = st.session_state["ads_window"]
+    for page in list(pages.keys()):
+        if len(pages) <= ADS_SESSION_MAX_PAGES:
+            break
+        if not first <= page <= last:
+            del pages[page]
+    return None
+
+
+def _refresh_window() -> None:
+    first, last = st.session_state["ads_window"]
+    st.session_state["ads_data"] = [ad for page in range(first, last + 1) for ad in _get_page(page)]
+    st.session_state["last_id"] = st.session_state["ads_page_cursors"][last + 1]
+    return None
+
+
+def has_more() -> bool:
+    return st.session_state["ads_page_cursors"][st.session_state["ads_window"][1] + 1] is not None
+
+
+def load_more() -> list:
+    """Append the next page to the window, sliding it forward if it's full. Returns the new ads"""
+    first, last = st.session_state["ads_window"]
+    if not has_more():
+        return []
+    ads = _get_page(last + 1)
+    if not ads:
+        return []
+
+    last += 1
+    first = max(first, last - ADS_WINDOW_PAGES + 1)
+    st.session_state["ads_window"] = [first, last]
+    _refresh_window()
+    return ads
+
+
+def show_previous() -> None:
+    """on_click callback: slide the window one page back"""
+    first, last = st.session_state["ads_window"]
+    if first == 0:
+        return None
+    first -= 1
+    last = min(last, first + ADS_WINDOW_PAGES - 1)
+    st.session_state["ads_window"] = [first, last]
+    _refresh_window()
+    return None
+
+
+def remove_ads(ad_archive_ids: set) -> int:
+    """Remove the ads from the window and from the pages in memory (deleted or not matching the filter anymore)"""
+    removed = 0
+    for page, ads in st.session_state["ads_pages"].items():
+        kept = [ad for ad in ads if ad["ad_archive_id"] not in ad_archive_ids]
+        removed += len(ads) - len(kept)
+        st.session_state["ads_pages"][page] = kept
+    first, last = st.session_state["ads_window"]
+    st.session_state["ads_data"] = [ad for page in range(first, last + 1) for ad in st.session_state["ads_pages"].get(page, [])]
+    return removed
+
+
+def window_info() -> str:
+    first, last = st.session_state["ads_window"]
+    page_size = st.session_state["ads_page_size"]
+    if not st.session_state["ads_data"]:
+        return "No ads displayed"
+    start = first * page_size + 1
+    return (
+        f"Displaying ads {start}-{start + len(st.session_state['ads_data']) - 1} "
+        f"(pages {first + 1}-{last + 1}, {len(st.session_state['ads_pages'])} pages in memory)"
+    )
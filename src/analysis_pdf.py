@@ -0,0 +1,127 @@
+"""
+PDFs of the AI image/video analyses, rendered in memory and cached on disk by the hash of the markdown:
+the same analysis is rendered once for all the users, and a pre-render job covers the ads changed since its last run.
+"""
+import hashlib
+import io
+import json
+import os
+from datetime import datetime
+
+from markdown_pdf import MarkdownPdf, Section
+
+from src.config import ANALYSIS_PDF_CACHE_DIR
+from src.utils import TTLCache
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+ANALYSIS_FIELDS = ["ai_image_analysis", "ai_video_analysis"]
+
+# the most recently used PDFs also stay in memory, to skip the disk read
+_memory_cache = TTLCache(max_size=64, ttl=3600)
+
+_state_path = os.path.join(ANALYSIS_PDF_CACHE_DIR, "_prerender_state.json")
+
+
+def analysis_hash(analysis_content: str) -> str:
+    return hashlib.sha256(analysis_content.encode("utf-8")).hexdigest()
+
+
+def _cache_path(content_hash: str) -> str:
+    return os.path.join(ANALYSIS_PDF_CACHE_DIR, content_hash[:2], f"{content_hash}.pdf")
+
+
+def render_analysis_pdf(analysis_content: str) -> bytes:
+    """Render the markdown to PDF bytes in memory (no temporary file)"""
+    analysis_pdf = MarkdownPdf(toc_level=2, optimize=True)
+    analysis_pdf.add_section(Section(analysis_content))
+    buffer = io.BytesIO()
+    analysis_pdf.save_bytes(buffer)
+    return buffer.getvalue()
+
+
+def get_analysis_pdf(analysis_content: str) -> bytes:
+    """PDF of the analysis from the memory or disk cache, rendered and stored on a miss"""
+    content_hash = analysis_hash(analysis_content)
+    return _memory_cache.get_or_set(content_hash, lambda: _load_or_render(content_hash, analysis_content))
+
+
+def is_cached(analysis_content: str) -> bool:
+    return os.path.exists(_cache_path(analysis_hash(analysis_content)))
+
+
+def _load_or_render(content_hash: str, analysis_content: str) -> bytes:
+    path = _cache_path(content_hash)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    pdf_bytes = render_analysis_pdf(analysis_content)
+
+    # atomic write: concurrent renders of the same analysis just overwrite the same content
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_path, path)
+    log.info("Rendered analysis PDF", extra={"hash": content_hash[:12], "bytes": len(pdf_bytes)})
+    return pdf_bytes
+
+
+def _load_watermark():
+    try:
+        with open(_state_path) as f:
+            return datetime.fromisoformat(json.load(f)["updated_at"])
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+def _save_watermark(updated_at: datetime) -> None:
+    os.makedirs(ANALYSIS_PDF_CACHE_DIR, exist_ok=True)
+    with open(_state_path, "w") as f:
+        json.dump({"updated_at": updated_at.isoformat()}, f)
+    return None
+
+
+def prerender_analysis_pdfs(full: bool = False, batch_size: int = 100) -> dict:
+    """
+    Render the PDFs of the analyses of the ads updated since the last run (all the ads with full=True).
+    The updated_at watermark is saved after every batch, so an interrupted run resumes where it stopped.
+    """
+    from src import mongo
+
+    watermark = None if full else _load_watermark()
+    query = {"$or": [{field: {"$type": "string", "$ne": ""}} for field in ANALYSIS_FIELDS]}
+    if watermark:
+        query["updated_at"] = {"$gt": watermark}
+
+    cursor = mongo.client["gigi_ads_saved"].find(
+        query, {"_id": 0, "ad_archive_id": 1, "updated_at": 1, **{field: 1 for field in ANALYSIS_FIELDS}}
+    ).sort("updated_at", 1).batch_size(batch_size)
+
+    stats = {"ads": 0, "rendered": 0, "cached": 0, "errors": 0}
+    last_updated_at = None
+    for ad in cursor:
+        stats["ads"] += 1
+        for field in ANALYSIS_FIELDS:
+            if not ad.get(field):
+                continue
+            if is_cached(ad[field]):
+                stats["cached"] += 1
+                continue
+            try:
+                _load_or_render(analysis_hash(ad[field]), ad[field])
+                stats["rendered"] += 1
+            except Exception as e:
+                log.error("Error rendering analysis PDF", extra={"ad_archive_id": ad.get("ad_archive_id"), "field": field, "error": str(e)})
+                stats["errors"] += 1
+
+        if ad.get("updated_at") and stats["ads"] % batch_size == 0:
+            _save_watermark(ad["updated_at"])
+        last_updated_at = ad.get("updated_at") or last_updated_at
+    if last_updated_at:
+        _save_watermark(last_updated_at)
+
+    log.info("Pre-rendered analysis PDFs", extra={"since": watermark, **stats})
+    return stats
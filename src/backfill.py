@@ -0,0 +1,99 @@
+"""
+Backfill of the fields parsed from full_html_text (src/ad_fields.py) into the "extracted" field of the saved ads.
+The ads are read in _id order in batches, parsed by a pool of worker processes (the regexes are CPU bound)
+and written back with one unordered bulk_write per batch.
+
+Resumable: the _id of the last written batch is checkpointed in gigi_ads_backfill_state, so an interrupted run
+continues from there and a scheduled run only parses the ads saved since the previous one. The checkpoint is
+reset by full=True and when PARSER_VERSION changes (the ads parsed by an older parser are parsed again).
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable
+
+from pymongo import UpdateOne, ASCENDING
+
+from src import mongo, metrics
+from src.ad_fields import PARSER_VERSION, parse_batch
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+STATE_COLLECTION = "gigi_ads_backfill_state"
+STATE_ID = "ad_fields"
+
+BATCH_SIZE = 1000
+
+
+def get_state() -> dict:
+    """{"last_id", "version", "ads", "updated_at"} of the backfill, {} before the first run"""
+    return mongo.client[STATE_COLLECTION].find_one({"_id": STATE_ID}) or {}
+
+
+def _write_batch(last_id, results: list) -> int:
+    mongo.client["gigi_ads_saved"].bulk_write(
+        [UpdateOne({"_id": ad_id}, {"$set": {"extracted": fields}}) for ad_id, fields in results], ordered=False
+    )
+    mongo.client[STATE_COLLECTION].update_one(
+        {"_id": STATE_ID},
+        {"$set": {"last_id": last_id, "version": PARSER_VERSION, "updated_at": datetime.now()}, "$inc": {"ads": len(results)}},
+        upsert=True
+    )
+    return len(results)
+
+
+@metrics.timed("backfill_seconds")
+def backfill_ad_fields(full: bool = False, batch_size: int = BATCH_SIZE, workers: int = None, limit: int = 0,
+                       progress: Callable = None) -> dict:
+    """
+    Parse the ads after the checkpoint (all of them if full or the parser changed) and store their fields.
+    At most 2 * workers batches are in flight: the cursor is not read faster than the processes parse.
+    Returns {"ads": ads parsed, "batches", "seconds", "resumed_from": checkpoint _id or None}.
+    """
+    workers = workers or os.cpu_count() or 1
+    state = get_state()
+    if full or state.get("version") != PARSER_VERSION:
+        mongo.client[STATE_COLLECTION].delete_one({"_id": STATE_ID})
+        state = {}
+    after_id = state.get("last_id")
+
+    started = time.perf_counter()
+    query = {"_id": {"$gt": after_id}} if after_id else {}
+    cursor = mongo.client["gigi_ads_saved"].find(
+        query, {"full_html_text": 1, "created_at": 1}
+    ).sort("_id", ASCENDING).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    stats = {"ads": 0, "batches": 0, "resumed_from": str(after_id) if after_id else None}
+    pending = deque()
+
+    def write_oldest() -> None:
+        # in submission order, so that the checkpoint never skips an unwritten batch
+        last_id, future = pending.popleft()
+        stats["ads"] += _write_batch(last_id, future.result())
+        stats["batches"] += 1
+        if progress:
+            progress(stats["ads"])
+        return None
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        batch = []
+        for ad in cursor:
+            batch.append((ad["_id"], ad.get("full_html_text"), ad.get("created_at")))
+            if len(batch) >= batch_size:
+                pending.append((batch[-1][0], executor.submit(parse_batch, batch)))
+                batch = []
+                while len(pending) >= 2 * workers:
+                    write_oldest()
+        if batch:
+            pending.append((batch[-1][0], executor.submit(parse_batch, batch)))
+        while pending:
+            write_oldest()
+
+    stats["seconds"] = round(time.perf_counter() - started, 1)
+    log.info("Backfilled ad fields", extra={**stats, "version": PARSER_VERSION})
+    return stats
@@ -0,0 +1,148 @@
+"""
+Compare mode of the MCP Chatbot: one user query sent concurrently to N models over the /stream endpoint,
+each answer streamed into its own column with its time to first token and total latency.
+"""
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+import streamlit as st
+from bson.objectid import ObjectId
+
+from src import config, http_client, sse
+from src.chat_stream import CHATBOT_HEADERS_STREAM, log_chat_event
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+# seconds between two redraws of the same column while streaming
+REDRAW_INTERVAL = 0.05
+
+
+def _stream_model(url: str, model_name: str, body: Dict[str, Any], events: queue.Queue) -> None:
+    """
+    Worker thread (no streamlit calls here): stream one model's answer and push
+    (model_name, event) to the queue, then (model_name, None) when done.
+    """
+    start = time.perf_counter()
+    response = None
+    try:
+        response = http_client.post(url, json=body, headers=CHATBOT_HEADERS_STREAM, stream=True)
+        if response.status_code != 200:
+            events.put((model_name, sse.ChatEvent("error", {"error": f"{response.status_code} - {response.text[:100]}"})))
+            return None
+
+        for i, event in enumerate(sse.iter_chat_events(response.iter_content(chunk_size=None))):
+            log_chat_event(i, event)
+            events.put((model_name, event))
+            if event.type in ["complete", "error"]:
+                return None
+    except Exception as e:
+        log.error("Error streaming the model", extra={"model": model_name, "url": url, "error": str(e)})
+        events.put((model_name, sse.ChatEvent("error", {"error": str(e)})))
+    finally:
+        if response is not None:
+            response.close()
+        http_client.record_latency(f"{http_client.endpoint_name(url)} ({model_name})", time.perf_counter() - start)
+        events.put((model_name, None))
+    return None
+
+
+def compare_models(url: str, user_input: str, model_names: list, image: str = None) -> dict:
+    """
+    Send user_input to every model concurrently and render the answers side by side while they stream.
+    Returns the turn {"query", "wall_s", "answers": {model_name: {"content", "ttft_s", "total_s", "token_usage", "error"}}}.
+    """
+    sessions = st.session_state["chatbot_compare_sessions"]
+    events = queue.Queue()
+
+    # one worker per model for this query only: concurrent compare users never queue behind each other
+    executor = ThreadPoolExecutor(max_workers=len(model_names), thread_name_prefix="chat_compare")
+    start = time.perf_counter()
+    for model_name in model_names:
+        # one chatbot session per model, so follow-up questions keep each model's own context
+        sessions.setdefault(model_name, str(ObjectId()))
+        body = {
+            "user_query": user_input,
+            "sessionId": sessions[model_name],
+            # test chats: the compare sessions stay out of the production history (get_history_chats)
+            "is_test_chat": True,
+            "model": config.CHATBOT_MODELS[model_name],
+        }
+        if image is not None:
+            body["image"] = image
+        executor.submit(_stream_model, url, model_name, body, events)
+    # the workers end with their streams, even if this script run is stopped while draining the queue
+    executor.shutdown(wait=False)
+
+    answers = {name: {"content": "", "ttft_s": None, "total_s": None, "token_usage": [], "error": None} for name in model_names}
+    texts = {name: "" for name in model_names}
+    last_redraw = {name: 0.0 for name in model_names}
+
+    columns = st.columns(len(model_names))
+    placeholders = {}
+    for col, model_name in zip(columns, model_names):
+        col.markdown(f"**{model_name}**")
+        placeholders[model_name] = (col.empty(), col.empty())
+
+    # the main script thread drains the queue and owns all the streamlit calls
+    pending = set(model_names)
+    while pending:
+        model_name, event = events.get()
+        answer = answers[model_name]
+        elapsed = time.perf_counter() - start
+
+        if event is None:
+            pending.discard(model_name)
+            answer["total_s"] = elapsed
+            placeholders[model_name][0].markdown(texts[model_name] or answer["content"])
+            placeholders[model_name][1].caption(_timings_caption(answer))
+            continue
+
+        if event.type == "content":
+            if answer["ttft_s"] is None:
+                answer["ttft_s"] = elapsed
+            answer["content"] += event.payload.get("chunk", "")
+        elif event.type == "complete":
+            answer["token_usage"] = event.payload.get("token_usage", [])
+        elif event.type == "error":
+            answer["error"] = event.payload.get("error", "Unknown error")
+        texts[model_name] += sse.format_chat_event(event)
+
+        if time.perf_counter() - last_redraw[model_name] >= REDRAW_INTERVAL:
+            placeholders[model_name][0].markdown(texts[model_name])
+            last_redraw[model_name] = time.perf_counter()
+
+    wall_s = time.perf_counter() - start
+    log.info("Compared models", extra={
+        "models": len(model_names), "wall_s": round(wall_s, 2), "sum_s": round(sum(a["total_s"] for a in answers.values()), 2)
+    })
+    return {"query": user_input, "wall_s": wall_s, "answers": answers}
+
+
+def _timings_caption(answer: dict) -> str:
+    ttft = f"{answer['ttft_s']:.2f}s" if answer["ttft_s"] is not None else "n/a"
+    caption = f"⏱️ first token {ttft} · total {answer['total_s']:.2f}s"
+    if answer["error"]:
+        caption += f" · ❌ {answer['error']}"
+    return caption
+
+
+def display_compare_turns() -> None:
+    """Display the previous compare turns of this session from the session state"""
+    for turn in st.session_state["chatbot_compare_turns"]:
+        st.chat_message("user").markdown(turn["query"])
+        columns = st.columns(len(turn["answers"]))
+        for col, (model_name, answer) in zip(columns, turn["answers"].items()):
+            col.markdown(f"**{model_name}**")
+            col.markdown(answer["content"] or f"[ERROR] {answer['error']}")
+            col.caption(_timings_caption(answer))
+        st.caption(f"Wall clock: {turn['wall_s']:.2f}s for {len(turn['answers'])} models")
+    return None
+
+
+def reset_compare() -> None:
+    st.session_state["chatbot_compare_sessions"] = {}
+    st.session_state["chatbot_compare_turns"] = []
+    return None
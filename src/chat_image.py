@@ -0,0 +1,77 @@
+"""
+Image uploads of the chatbot: decoded at reduced size (JPEG draft mode + thumbnail, keeping the aspect ratio),
+encoded as compact JPEG/WebP within a byte budget, memoized by the hash of the uploaded bytes.
+No streamlit imports, so it can be used by the benchmarks too.
+"""
+import base64
+import hashlib
+import io
+from typing import NamedTuple
+
+from PIL import Image, ImageOps
+
+from src.config import CHAT_IMAGE_MAX_SIDE, CHAT_IMAGE_MAX_BYTES, CHAT_IMAGE_FORMAT
+from src.utils import TTLCache
+
+# qualities tried in order until the encoded image fits the byte budget
+QUALITY_STEPS = [85, 75, 65, 55, 45]
+
+# same upload in the uploader (rerun) or uploaded again by another session: processed once
+_image_cache = TTLCache(max_size=64, ttl=3600)
+
+
+class ChatImage(NamedTuple):
+    base64: str
+    format: str
+    width: int
+    height: int
+    size: int  # bytes of the encoded image (before base64)
+    original_size: int  # bytes of the upload
+
+
+def _decode(data: bytes, max_side: int) -> Image.Image:
+    image = Image.open(io.BytesIO(data))
+    # JPEG: let the decoder scale down by 1/2, 1/4 or 1/8 instead of decoding the full resolution
+    image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode in ("RGBA", "LA", "P"):
+        # transparent screenshots/PNGs on a white background, JPEG has no alpha
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    return image
+
+
+def _encode(image: Image.Image, image_format: str, max_bytes: int) -> bytes:
+    """Highest quality that fits max_bytes, then halve the resolution if even the lowest one doesn't"""
+    while True:
+        for quality in QUALITY_STEPS:
+            with io.BytesIO() as output:
+                image.save(output, format=image_format, quality=quality, optimize=image_format == "JPEG")
+                encoded = output.getvalue()
+            if len(encoded) <= max_bytes:
+                return encoded
+        if max(image.size) <= 256:
+            return encoded
+        image = image.resize((max(1, image.width // 2), max(1, image.height // 2)), Image.Resampling.LANCZOS)
+
+
+def process_chat_image(data: bytes, max_side: int = CHAT_IMAGE_MAX_SIDE, max_bytes: int = CHAT_IMAGE_MAX_BYTES,
+                       image_format: str = CHAT_IMAGE_FORMAT) -> ChatImage:
+    image = _decode(data, max_side)
+    encoded = _encode(image, image_format, max_bytes)
+    with Image.open(io.BytesIO(encoded)) as result:
+        width, height = result.size
+    return ChatImage(base64.b64encode(encoded).decode("utf-8"), image_format, width, height, len(encoded), len(data))
+
+
+def get_chat_image(data: bytes) -> ChatImage:
+    """process_chat_image memoized by the sha256 of the uploaded bytes"""
+    key = (hashlib.sha256(data).hexdigest(), CHAT_IMAGE_MAX_SIDE, CHAT_IMAGE_MAX_BYTES, CHAT_IMAGE_FORMAT)
+    return _image_cache.get_or_set(key, lambda: process_chat_image(data))
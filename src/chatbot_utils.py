@@ -1,380 +1,551 @@
-import io, base64, requests, gc
-from typing import Dict, Any, Union, Tuple
-from bson.objectid import ObjectId
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from PIL import Image
-import streamlit as st
-
-from src.config import CHATBOT_HEADERS
-from src import mongo
-
-
-def get_image_base64(uploaded_file) -> Union[str, None]:
-    if uploaded_file is not None:
-        bytes_data = uploaded_file.getvalue()
-        image = Image.open(io.BytesIO(bytes_data)).convert("RGBA").resize((512, 512))
-        with io.BytesIO() as output:
-            image.save(output, format="PNG")
-            bytes_data = output.getvalue()
-        return base64.b64encode(bytes_data).decode('utf-8')
-    return None
-
-
-def call_chatbot(url: str, params: Dict[str, Any]=None, body: Dict[str, Any]=None) -> Union[dict, None]:
-    print(f"Calling {url} with params: {params.keys() if params else None} and body: {body.keys() if body else None}")
-    try:
-        response = requests.post(url, params=params, json=body, headers=CHATBOT_HEADERS)
-
-        if response.status_code != 200:
-            print(f"Error calling {url}: {response.status_code} - {response.text[:100]}")
-            return None
-
-        res = response.json()
-        if not res.get("success", False):
-            print(f"Error calling {url}: {res}")
-            return None
-        return res
-
-    except Exception as e:
-        print(f"Error calling {url}: {e}")
-        return None
-
-
-def parse_tool_calls(response_messages: list) -> list:
-    messages_tool_calls = {}
-    for message in response_messages:
-        if message['role'] == "assistant" and message.get("tool_calls", None):
-            for tool_call in message["tool_calls"]:
-                messages_tool_calls[tool_call["id"]] = {
-                    "id": tool_call["id"],
-                    "tool": tool_call["function"]["name"],
-                    "parameters": tool_call["function"]["arguments"],
-                    "result": None
-                }
-
-        ## now find the tool responses in the messages by id
-        if message['role'] == "tool" and message.get("content", None):
-            messages_tool_calls[message["tool_call_id"]]["result"] = message.get("content", "")
-
-    return list(filter(lambda x: x["result"] is not None, messages_tool_calls.values()))
-
-
-def reset_chat() -> None:
-    del st.session_state["chatbot_messages"][:]
-    del st.session_state["chatbot_tool_calls"][:]
-    del st.session_state["chatbot_uploaded_image"]
-    gc.collect()
-
-    st.session_state["chatbot_messages"] = []
-    st.session_state["chatbot_tool_calls"] = []
-    st.session_state["chatbot_uploaded_image"] = None
-    st.session_state["chatbot_sessionId"] = str(ObjectId())
-    st.session_state["chatbot_history"] = mongo.get_history_chats(limit=20, skip=0)
-    print("Chat session reset.")
-    return None
-
-
-def set_chat(session_id: str) -> None:
-    session = mongo.get_chatbot_session(session_id)
-    if session:
-        st.session_state["chatbot_messages"] = session.get("messages", [])
-        st.session_state["chatbot_uploaded_image"] = None
-        st.session_state["chatbot_sessionId"] = session_id
-        st.session_state["chatbot_tool_calls"] = parse_tool_calls(session["messages"])
-        st.session_state["chatbot_history"] = mongo.get_history_chats(limit=20, skip=0)
-        print(f"Loaded chat session {session_id} with {len(st.session_state['chatbot_messages'])} messages.")
-    else:
-        # Reset to a new session if not found
-        print(f"No chat session found for ID {session_id}. Resetting to a new session.")
-        reset_chat()
-    return None
-
-
-def delete_history_chat(session_id: str) -> None:
-    if mongo.delete_chat_session(session_id):
-        st.session_state["chatbot_history"] = [s for s in st.session_state["chatbot_history"] if str(s["_id"]) != session_id]
-        print(f"Deleted chat session {session_id} from history.")
-    else:
-        print(f"Failed to delete chat session {session_id}.")
-    st.rerun()
-    return None
-
-
-def display_chat_tools() -> None:
-    ## create a sidebar expander for the tool calls
-    with st.sidebar.expander("Tool Calls", expanded=True):
-        if st.session_state["chatbot_tool_calls"]:
-            for tool_call in st.session_state["chatbot_tool_calls"]:
-                st.markdown(f"**Tool:** {tool_call['tool']}\n**Parameters:** {tool_call['parameters']}\n**Result:** {tool_call['result'][:100]}...")
-                st.write("-------")
-        else:
-            st.write("No tool calls made in this session.")
-    return None
-
-
-def display_old_chats_history() -> None:
-    # on the sidebar, show the last chat sessions with a button each to load the session
-    with st.sidebar.expander("Chat History", expanded=False):
-        if st.session_state["chatbot_history"]:
-            for session in st.session_state["chatbot_history"]:
-                session_id = str(session["_id"])
-
-                # Render a styled block with a button
-                with st.container(border=True, key=f"chatbot_history_container_session_{session_id}"):
-                    col1, col2 = st.columns([4, 1])
-                    with col1:
-                        st.markdown(f"""\
-**Created At:** {session['created_at'].strftime('%Y-%m-%d %H:%M:%S')}  
-**Last Updated:** {session['updated_at'].strftime('%Y-%m-%d %H:%M:%S')}  
-**Messages:** {session['num_messages']}\n
-**Rating:** {session.get('rating', 'Not Rated Yet')}
-""")
-                    with col2:
-                        # a button to load the session (with an arrow emoji)
-                        st.button(
-                            "➡️",
-                            key=f"button_load_session_{session_id}",
-                            on_click=lambda session_id: set_chat(session_id),
-                            args=(session_id,),
-                            use_container_width=True
-                        )
-                        # a button to delete the session (red cross emoji)
-                        st.button(
-                            "❌",
-                            key=f"button_delete_session_{session_id}",
-                            on_click=lambda session_id: delete_history_chat(session_id),
-                            args=(session_id,),
-                            use_container_width=True
-                        )
-
-            # add a button to load more history chats
-            if st.button("Load More History Chats"):
-                more_sessions = mongo.get_history_chats(limit=20, skip=len(st.session_state["chatbot_history"]))
-                if more_sessions:
-                    st.write(f"Loaded {len(more_sessions)} more chat sessions.")
-                    st.session_state["chatbot_history"].extend(more_sessions)
-                    st.rerun()
-                else:
-                    st.write("No more chat history available.")
-        else:
-            st.write("No chat history available.")
-
-    return None
-
-
-def insert_slider_score_chat(chatbot_container) -> None:
-    with chatbot_container:
-        current_rating = st.session_state.get(f'chat_rating_{st.session_state["chatbot_sessionId"]}', None)
-        current_rating = f"Current Rating: {current_rating}" if current_rating is not None else "No rating yet"
-        st.write(f"### Chatbot Conversation - Current Rating: {current_rating}")
-        st.slider(
-            "### Rate this chat",
-            min_value=0,
-            max_value=5,
-            value=4,
-            step=1,
-            key=f"slider_chat_rating_{st.session_state['chatbot_sessionId']}",
-            on_change=lambda : mongo.update_chat_session_rating(
-                st.session_state["chatbot_sessionId"],
-                st.session_state.get(f"slider_chat_rating_{st.session_state['chatbot_sessionId']}", 4)
-            )
-        )
-        st.write("---")
-    return None
-
-
-def display_download_chat_button() -> None:
-    if len(st.session_state["chatbot_messages"]) > 0:
-        try:
-            pdf_bytes, filename = generate_chat_pdf()
-
-            st.sidebar.download_button(
-                label="📄 Download Chat as PDF",
-                data=pdf_bytes,
-                file_name=filename,
-                mime="application/pdf",
-                key=f"download_chat_pdf_{st.session_state['chatbot_sessionId']}"
-            )
-            return None
-
-        except Exception as e:
-            print(f"Error generating PDF: {str(e)}")
-
-    st.sidebar.info("Start a conversation to enable PDF download")
-
-    return None
-
-
-def generate_chat_pdf() -> Tuple[bytes, str]:
-    # Create a buffer to store the PDF
-    buffer = io.BytesIO()
-    
-    # Create the PDF document
-    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=1*inch, bottomMargin=1*inch)
-    
-    # Get styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        alignment=1,  # Center alignment
-        spaceAfter=30,
-    )
-    
-    user_style = ParagraphStyle(
-        'UserMessage',
-        parent=styles['Normal'],
-        fontSize=12,
-        leftIndent=20,
-        rightIndent=20,
-        spaceBefore=12,
-        spaceAfter=6,
-        textColor='green'
-    )
-    
-    assistant_style = ParagraphStyle(
-        'AssistantMessage',
-        parent=styles['Normal'],
-        fontSize=12,
-        leftIndent=20,
-        rightIndent=20,
-        spaceBefore=6,
-        spaceAfter=12,
-        textColor='black'
-    )
-    
-    tool_section_style = ParagraphStyle(
-        'ToolSection',
-        parent=styles['Heading2'],
-        fontSize=14,
-        alignment=0,
-        spaceAfter=15,
-        spaceBefore=30,
-    )
-    
-    tool_call_style = ParagraphStyle(
-        'ToolCall',
-        parent=styles['Normal'],
-        fontSize=10,
-        leftIndent=30,
-        rightIndent=20,
-        spaceBefore=8,
-        spaceAfter=8,
-        textColor='gray'
-    )
-    
-    tool_inline_style = ParagraphStyle(
-        'ToolInline',
-        parent=styles['Normal'],
-        fontSize=11,
-        leftIndent=20,
-        rightIndent=20,
-        spaceBefore=6,
-        spaceAfter=6,
-        textColor='orange'
-    )
-    
-    # Build the PDF content
-    story = []
-    
-    ## take the creation time from mongo using the session_id
-    mongo_doc = mongo.client['gigi_chatbot_sessions'].find_one(
-        {"_id": ObjectId(st.session_state["chatbot_sessionId"])},
-        {"created_at": 1, "num_messages": 1, "tool_calls": 1, "updated_at": 1, "rating": 1}
-    )
-
-    assert mongo_doc is not None, f"Chat session not found in MongoDB: {st.session_state['chatbot_sessionId']}"
-
-    # Add title
-    title = f"Chat Conversation - Created At: {mongo_doc['created_at'].strftime('%Y-%m-%d %H:%M:%S')} | Messages: {mongo_doc['num_messages']} | Rating: {mongo_doc.get('rating', 'Not Rated')}"
-    story.append(Paragraph(title, title_style))
-    story.append(Spacer(1, 20))
-    
-    # Add session info
-    session_info = f"Session ID: {st.session_state.get('chatbot_sessionId', 'Unknown')}"
-    story.append(Paragraph(session_info, styles['Normal']))
-    story.append(Spacer(1, 20))
-    
-    # Add messages
-    messages = st.session_state.get("chatbot_messages", [])
-
-    for i, message in enumerate(messages):
-        role = message['role'].capitalize()
-
-        if message['role'] == 'tool':
-            continue
-
-        elif message['role'] == 'assistant' and not message.get('content') and message.get('tool_calls'):
-            tool_names = [tool['function']['name'] for tool in message['tool_calls']]
-            tools_text = f"🔧 <b>Tools used:</b> {', '.join(tool_names)}"
-            story.append(Paragraph(tools_text, tool_inline_style))
-            continue
-
-        image_content = ""
-        if role == 'User' and isinstance(message['content'], list):
-            content = "\n".join([c['text'] for c in message['content'] if 'text' in c and c.get('type') == 'text'])
-            image_content = "Un Image was uploaded by the user" if any(c['type'] != 'text' for c in message['content']) else ""
-        else:
-            content = message['content']
-
-        content = content.strip().replace('\n', '<br/>')
-
-        # Escape HTML characters
-        content = content.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-        content = content.replace('&lt;br/&gt;', '<br/>')  # Keep line breaks    
-        content = image_content + content
-
-        # Choose style based on role
-        if message['role'] == 'user':
-            msg_style = user_style
-            role_prefix = f"<b>👤 {role}:</b> "
-        else:
-            msg_style = assistant_style
-            role_prefix = f"<b>🤖 {role}:</b> "
-
-        # Add the message
-        full_message = role_prefix + content
-        story.append(Paragraph(full_message, msg_style))
-        
-        # Add space between messages
-        if i < len(messages) - 1:
-            story.append(Spacer(1, 12))
-
-    # Add Tool Calls DETAILED section
-    tool_calls = parse_tool_calls(messages)
-
-    if tool_calls:
-        story.append(Spacer(1, 30))
-        story.append(Paragraph("🔧 Tool Calls Used in This Conversation", tool_section_style))
-        story.append(Spacer(1, 15))
-        
-        for i, tool_call in enumerate(tool_calls):
-            tool_name = tool_call.get('tool', 'Unknown Tool')
-            parameters = tool_call.get('parameters', '')
-            result = tool_call.get('result', 'No result available')
-            
-            # Format the tool call information
-            tool_info = f"<b>Tool {i+1}: {tool_name}</b><br/>"
-            tool_info += f"<b>Parameters:</b> {parameters}<br/>"
-            tool_info += f"<b>Result:</b> {result[:100]}...(truncated for brevity)"
-            
-            story.append(Paragraph(tool_info, tool_call_style))
-
-            # Add space between tool calls
-            if i < len(tool_calls) - 1:
-                story.append(Spacer(1, 10))
-    
-    # Build the PDF
-    doc.build(story)
-    
-    # Get the PDF bytes
-    pdf_bytes = buffer.getvalue()
-    buffer.close()
-    
-    filename = f"chatbot_meta_mcp_{mongo_doc['created_at'].strftime('%Y_%m_%d_at_%H_%M_%S')}_messages_{mongo_doc['num_messages']}.pdf"
-
-    return pdf_bytes, filename
+import io, gc
+from datetime import datetime, timezone
+from typing import Dict, Any, Union, Tuple
+from bson.objectid import ObjectId
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+import streamlit as st
+
+from src.config import CHATBOT_HEADERS, CHAT_PDF_CACHE_SIZE
+from src.utils import TTLCache
+from src import mongo, http_client, chat_image, tool_calls, metrics
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+# PDFs of the chats, keyed by (session id, number of messages), shared by all the sessions
+chat_pdf_cache = TTLCache(max_size=CHAT_PDF_CACHE_SIZE, ttl=3600)
+
+
+def get_image_base64(uploaded_file) -> Union[str, None]:
+    if uploaded_file is not None:
+        return chat_image.get_chat_image(uploaded_file.getvalue()).base64
+    return None
+
+
+@metrics.timed("chatbot_call_seconds")
+def call_chatbot(url: str, params: Dict[str, Any]=None, body: Dict[str, Any]=None) -> Union[dict, None]:
+    log.debug("Calling the chatbot", extra={
+        "url": url, "params": list(params.keys()) if params else None, "body": list(body.keys()) if body else None
+    })
+    try:
+        response = http_client.post(url, params=params, json=body, headers=CHATBOT_HEADERS)
+
+        if response.status_code != 200:
+            log.error("Error calling the chatbot", extra={"url": url, "status": response.status_code, "response": response.text[:100]})
+            return None
+
+        res = response.json()
+        if not res.get("success", False):
+            log.error("Error calling the chatbot", extra={"url": url, "response": str(res)[:200]})
+            return None
+        return res
+
+    except Exception as e:
+        log.error("Error calling the chatbot", extra={"url": url, "error": str(e)})
+        return None
+
+
+def parse_tool_calls(response_messages: list) -> list:
+    """Tool calls with their result found in the messages (full scan, see index_chat_messages for the chat)"""
+    return tool_calls.completed_calls(tool_calls.update_index(None, response_messages))
+
+
+@metrics.timed("chat_tool_index_seconds")
+def index_chat_messages(start: int) -> list:
+    """
+    Index the tool calls of the messages appended to the chat from position start, persist the index on the
+    session and refresh the sidebar list. Returns the tool calls completed by these messages.
+    """
+    messages = st.session_state["chatbot_messages"]
+    known_ids = {call["id"] for call in st.session_state["chatbot_tool_calls"]}
+    index = tool_calls.update_index(st.session_state.get("chatbot_tool_call_index"), messages[start:], start=start)
+    st.session_state["chatbot_tool_call_index"] = index
+    st.session_state["chatbot_tool_calls"] = tool_calls.completed_calls(index)
+    mongo.save_tool_call_index(st.session_state["chatbot_sessionId"], index)
+    return [call for call in st.session_state["chatbot_tool_calls"] if call["id"] not in known_ids]
+
+
+def reset_chat() -> None:
+    del st.session_state["chatbot_messages"][:]
+    del st.session_state["chatbot_tool_calls"][:]
+    del st.session_state["chatbot_uploaded_image"]
+    gc.collect()
+
+    st.session_state["chatbot_messages"] = []
+    st.session_state["chatbot_tool_calls"] = []
+    st.session_state["chatbot_tool_call_index"] = tool_calls.new_index()
+    st.session_state["chatbot_uploaded_image"] = None
+    st.session_state["chatbot_sessionId"] = str(ObjectId())
+    log.debug("Chat session reset.")
+    return None
+
+
+@metrics.timed("chat_load_seconds")
+def set_chat(session_id: str) -> None:
+    session = mongo.get_chatbot_session(session_id)
+    if session:
+        st.session_state["chatbot_messages"] = session.get("messages", [])
+        st.session_state["chatbot_uploaded_image"] = None
+        st.session_state["chatbot_sessionId"] = session_id
+        # the index saved on the session covers its messages, unless they were written by an older version
+        index = session.get("tool_call_index")
+        if not tool_calls.is_complete(index, len(session["messages"])):
+            start = index["num_messages"] if index else 0
+            index = tool_calls.update_index(index, session["messages"][start:], start=start)
+            mongo.save_tool_call_index(session_id, index)
+        st.session_state["chatbot_tool_call_index"] = index
+        st.session_state["chatbot_tool_calls"] = tool_calls.completed_calls(index)
+        log.info("Loaded chat session", extra={"session_id": session_id, "messages": len(st.session_state["chatbot_messages"])})
+    else:
+        # Reset to a new session if not found
+        log.warning("No chat session found, resetting to a new session", extra={"session_id": session_id})
+        reset_chat()
+    return None
+
+
+def message_markdown(message: dict) -> Union[str, None]:
+    """Markdown shown in the chat for a message, None for the tool calls and tool results"""
+    if message['role'] not in ["user", "assistant"] or not message.get("content") or message.get("tool_calls"):
+        return None
+    if isinstance(message["content"], list):
+        # multimodal user message: show the text parts, not the base64 image payload
+        text = "\n".join(c['text'] for c in message["content"] if c.get('type') == 'text' and 'text' in c)
+        if any(c.get('type') != 'text' for c in message["content"]):
+            text = "🖼️ *Image uploaded*\n\n" + text
+        return text
+    return message["content"]
+
+
+def transcript_entries() -> list:
+    """
+    (role, markdown) of the displayed messages of the current chat, cached in session state:
+    only the messages appended since the previous rerun are converted.
+    """
+    messages = st.session_state["chatbot_messages"]
+    transcript = st.session_state.get("chatbot_transcript")
+    if (
+        transcript is None
+        or transcript["session_id"] != st.session_state["chatbot_sessionId"]
+        or transcript["messages_id"] != id(messages)
+        or transcript["count"] > len(messages)
+    ):
+        transcript = {"session_id": st.session_state["chatbot_sessionId"], "messages_id": id(messages), "count": 0, "entries": []}
+        st.session_state["chatbot_transcript"] = transcript
+
+    for message in messages[transcript["count"]:]:
+        text = message_markdown(message)
+        if text is not None:
+            transcript["entries"].append((message["role"], text))
+    transcript["count"] = len(messages)
+    return transcript["entries"]
+
+
+def display_transcript() -> None:
+    for role, text in transcript_entries():
+        st.chat_message(role).markdown(text)
+    return None
+
+
+def load_history_chats(limit: int = 20) -> None:
+    """Load the first page of the chat history in the sidebar"""
+    sessions, cursor = mongo.get_history_chats(limit=limit)
+    st.session_state["chatbot_history"] = sessions
+    st.session_state["chatbot_history_cursor"] = cursor
+    return None
+
+
+def touch_history_chat(session_id: str, num_messages: int) -> None:
+    """Move the session on top of the sidebar history after new messages, without refetching the history"""
+    # the chatbot backend stores naive UTC datetimes
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    history = st.session_state["chatbot_history"]
+    session = next((s for s in history if str(s["_id"]) == session_id), None)
+    if session is None:
+        session = {"_id": ObjectId(session_id), "created_at": now}
+    else:
+        history.remove(session)
+    session["updated_at"] = now
+    session["num_messages"] = num_messages
+    history.insert(0, session)
+    return None
+
+
+def rate_chat() -> None:
+    """on_change of the rating slider: store the rating and update the sidebar history locally"""
+    session_id = st.session_state["chatbot_sessionId"]
+    rating = st.session_state.get(f"slider_chat_rating_{session_id}", 4)
+    if mongo.update_chat_session_rating(session_id, rating):
+        st.session_state[f"chat_rating_{session_id}"] = rating
+        chat_pdf_cache.invalidate(lambda key, value: key[0] == session_id)  # the PDF title has the rating
+        for session in st.session_state["chatbot_history"]:
+            if str(session["_id"]) == session_id:
+                session["rating"] = rating
+    return None
+
+
+def delete_history_chat(session_id: str) -> None:
+    if mongo.delete_chat_session(session_id):
+        st.session_state["chatbot_history"] = [s for s in st.session_state["chatbot_history"] if str(s["_id"]) != session_id]
+        log.info("Deleted chat session from history", extra={"session_id": session_id})
+    else:
+        log.warning("Failed to delete chat session", extra={"session_id": session_id})
+    return None
+
+
+def display_chat_tools() -> None:
+    with st.sidebar:
+        _chat_tools_fragment()
+    return None
+
+
+@st.fragment
+def _chat_tools_fragment() -> None:
+    ## create a sidebar expander for the tool calls
+    with st.expander("Tool Calls", expanded=True):
+        if st.session_state["chatbot_tool_calls"]:
+            for tool_call in st.session_state["chatbot_tool_calls"]:
+                st.markdown(f"**Tool:** {tool_call['tool']}\n**Parameters:** {tool_call['parameters']}\n**Result:** {tool_call['result'][:100]}...")
+                st.write("-------")
+        else:
+            st.write("No tool calls made in this session.")
+    return None
+
+
+def display_old_chats_history() -> None:
+    with st.sidebar:
+        _old_chats_history_fragment()
+    return None
+
+
+@st.fragment
+def _old_chats_history_fragment() -> None:
+    # on the sidebar, show the last chat sessions with a button each to load the session
+    # (browsing, deleting and loading more sessions rerun only this fragment, loading a session the whole app)
+    with st.expander("Chat History", expanded=False):
+        if st.session_state["chatbot_history"]:
+            for session in st.session_state["chatbot_history"]:
+                session_id = str(session["_id"])
+
+                # Render a styled block with a button
+                with st.container(border=True, key=f"chatbot_history_container_session_{session_id}"):
+                    col1, col2 = st.columns([4, 1])
+                    with col1:
+                        st.markdown(f"""\
+**Created At:** {session['created_at'].strftime('%Y-%m-%d %H:%M:%S')}  
+**Last Updated:** {session['updated_at'].strftime('%Y-%m-%d %H:%M:%S')}  
+**Messages:** {session['num_messages']}\n
+**Rating:** {session.get('rating', 'Not Rated Yet')}
+""")
+                    with col2:
+                        # a button to load the session (with an arrow emoji)
+                        if st.button("➡️", key=f"button_load_session_{session_id}", use_container_width=True):
+                            set_chat(session_id)
+                            st.rerun()
+                        # a button to delete the session (red cross emoji)
+                        if st.button("❌", key=f"button_delete_session_{session_id}", use_container_width=True):
+                            delete_history_chat(session_id)
+                            st.rerun(scope="fragment")
+
+            # add a button to load more history chats
+            if st.session_state.get("chatbot_history_cursor") and st.button("Load More History Chats"):
+                more_sessions, cursor = mongo.get_history_chats(limit=20, cursor=st.session_state["chatbot_history_cursor"])
+                st.session_state["chatbot_history_cursor"] = cursor
+                loaded_ids = {str(s["_id"]) for s in st.session_state["chatbot_history"]}
+                more_sessions = [s for s in more_sessions if str(s["_id"]) not in loaded_ids]
+                if more_sessions:
+                    st.write(f"Loaded {len(more_sessions)} more chat sessions.")
+                    st.session_state["chatbot_history"].extend(more_sessions)
+                    st.rerun(scope="fragment")
+                else:
+                    st.write("No more chat history available.")
+        else:
+            st.write("No chat history available.")
+
+    return None
+
+
+def insert_slider_score_chat(chatbot_container) -> None:
+    with chatbot_container:
+        _slider_score_chat_fragment()
+    return None
+
+
+@st.fragment
+def _slider_score_chat_fragment() -> None:
+    # rating the chat reruns only this fragment
+    current_rating = st.session_state.get(f'chat_rating_{st.session_state["chatbot_sessionId"]}', None)
+    current_rating = f"Current Rating: {current_rating}" if current_rating is not None else "No rating yet"
+    st.write(f"### Chatbot Conversation - Current Rating: {current_rating}")
+    st.slider(
+        "### Rate this chat",
+        min_value=0,
+        max_value=5,
+        value=4,
+        step=1,
+        key=f"slider_chat_rating_{st.session_state['chatbot_sessionId']}",
+        on_change=rate_chat
+    )
+    st.write("---")
+    return None
+
+
+def display_streaming_toggle() -> None:
+    with st.sidebar:
+        _streaming_toggle_fragment()
+    return None
+
+
+@st.fragment
+def _streaming_toggle_fragment() -> None:
+    ## toggling the streaming mode reruns only this fragment, the mode is read when a message is sent
+    st.session_state["chatbot_stream"] = st.toggle(
+        "Streaming Mode",
+        value=st.session_state["chatbot_stream"],
+        key="toggle_streaming_mode"
+    )
+    return None
+
+
+@st.fragment
+def display_image_uploader() -> None:
+    # uploading or removing an image reruns only this fragment, the processed image waits in session state
+    uploaded_image = st.file_uploader(
+        "Upload an image (optional)",
+        type=["png", "jpg", "jpeg"],
+        key=f"image_uploader_chatbot_{st.session_state['chatbot_image_uploader_id']}",
+    )
+    if uploaded_image is None:
+        st.session_state["chatbot_uploaded_image"] = None
+        return None
+
+    # processed once per uploaded content, the reruns just hit the cache
+    processed_image = chat_image.get_chat_image(uploaded_image.getvalue())
+    st.image(uploaded_image, caption="Uploaded Image")
+    st.caption(
+        f"Sent as {processed_image.format} {processed_image.width}x{processed_image.height}, "
+        f"{processed_image.size / 1024:.0f} KB (uploaded {processed_image.original_size / 1024:.0f} KB)"
+    )
+    st.session_state["chatbot_uploaded_image"] = processed_image.base64
+    return None
+
+
+def display_download_chat_button() -> None:
+    if len(st.session_state["chatbot_messages"]) > 0:
+        session_id = st.session_state["chatbot_sessionId"]
+        messages = st.session_state["chatbot_messages"]
+        num_messages = len(messages)
+
+        # the PDF is built only when the button is clicked (on a separate thread, without session state access)
+        # and cached by (session, number of messages), rate_chat drops the cached PDFs of the session
+        def build_pdf() -> bytes:
+            try:
+                return chat_pdf_cache.get_or_set(
+                    (session_id, num_messages),
+                    lambda: generate_chat_pdf(session_id, messages[:num_messages])[0]
+                )
+            except Exception as e:
+                log.error("Error generating the chat PDF", extra={"session_id": session_id, "error": str(e)})
+                raise
+
+        st.sidebar.download_button(
+            label="📄 Download Chat as PDF",
+            data=build_pdf,
+            file_name=chat_pdf_filename(session_id, num_messages),
+            mime="application/pdf",
+            key=f"download_chat_pdf_{session_id}"
+        )
+        return None
+
+    st.sidebar.info("Start a conversation to enable PDF download")
+
+    return None
+
+
+def chat_pdf_filename(session_id: str, num_messages: int) -> str:
+    # creation time from the sidebar history if loaded, otherwise from the session ObjectId
+    session = next((s for s in st.session_state.get("chatbot_history", []) if str(s["_id"]) == session_id), None)
+    created_at = session["created_at"] if session else ObjectId(session_id).generation_time
+    return f"chatbot_meta_mcp_{created_at.strftime('%Y_%m_%d_at_%H_%M_%S')}_messages_{num_messages}.pdf"
+
+
+@metrics.timed("chat_pdf_seconds")
+def generate_chat_pdf(session_id: str = None, messages: list = None) -> Tuple[bytes, str]:
+    # defaults to the current chat, pass both arguments when called outside of the script thread
+    session_id = session_id or st.session_state["chatbot_sessionId"]
+    messages = messages if messages is not None else st.session_state.get("chatbot_messages", [])
+
+    # Create a buffer to store the PDF
+    buffer = io.BytesIO()
+    
+    # Create the PDF document
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=1*inch, bottomMargin=1*inch)
+    
+    # Get styles
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        alignment=1,  # Center alignment
+        spaceAfter=30,
+    )
+    
+    user_style = ParagraphStyle(
+        'UserMessage',
+        parent=styles['Normal'],
+        fontSize=12,
+        leftIndent=20,
+        rightIndent=20,
+        spaceBefore=12,
+        spaceAfter=6,
+        textColor='green'
+    )
+    
+    assistant_style = ParagraphStyle(
+        'AssistantMessage',
+        parent=styles['Normal'],
+        fontSize=12,
+        leftIndent=20,
+        rightIndent=20,
+        spaceBefore=6,
+        spaceAfter=12,
+        textColor='black'
+    )
+    
+    tool_section_style = ParagraphStyle(
+        'ToolSection',
+        parent=styles['Heading2'],
+        fontSize=14,
+        alignment=0,
+        spaceAfter=15,
+        spaceBefore=30,
+    )
+    
+    tool_call_style = ParagraphStyle(
+        'ToolCall',
+        parent=styles['Normal'],
+        fontSize=10,
+        leftIndent=30,
+        rightIndent=20,
+        spaceBefore=8,
+        spaceAfter=8,
+        textColor='gray'
+    )
+    
+    tool_inline_style = ParagraphStyle(
+        'ToolInline',
+        parent=styles['Normal'],
+        fontSize=11,
+        leftIndent=20,
+        rightIndent=20,
+        spaceBefore=6,
+        spaceAfter=6,
+        textColor='orange'
+    )
+    
+    # Build the PDF content
+    story = []
+    
+    ## take the creation time from mongo using the session_id
+    mongo_doc = mongo.client['gigi_chatbot_sessions'].find_one(
+        {"_id": ObjectId(session_id)},
+        {"created_at": 1, "num_messages": 1, "tool_call_index": 1, "updated_at": 1, "rating": 1}
+    )
+
+    assert mongo_doc is not None, f"Chat session not found in MongoDB: {session_id}"
+
+    # Add title
+    title = f"Chat Conversation - Created At: {mongo_doc['created_at'].strftime('%Y-%m-%d %H:%M:%S')} | Messages: {mongo_doc['num_messages']} | Rating: {mongo_doc.get('rating', 'Not Rated')}"
+    story.append(Paragraph(title, title_style))
+    story.append(Spacer(1, 20))
+    
+    # Add session info
+    session_info = f"Session ID: {session_id}"
+    story.append(Paragraph(session_info, styles['Normal']))
+    story.append(Spacer(1, 20))
+    
+    # Add messages
+    for i, message in enumerate(messages):
+        role = message['role'].capitalize()
+
+        if message['role'] == 'tool':
+            continue
+
+        elif message['role'] == 'assistant' and not message.get('content') and message.get('tool_calls'):
+            tool_names = [tool['function']['name'] for tool in message['tool_calls']]
+            tools_text = f"🔧 <b>Tools used:</b> {', '.join(tool_names)}"
+            story.append(Paragraph(tools_text, tool_inline_style))
+            continue
+
+        image_content = ""
+        if role == 'User' and isinstance(message['content'], list):
+            content = "\n".join([c['text'] for c in message['content'] if 'text' in c and c.get('type') == 'text'])
+            image_content = "Un Image was uploaded by the user" if any(c['type'] != 'text' for c in message['content']) else ""
+        else:
+            content = message['content']
+
+        content = content.strip().replace('\n', '<br/>')
+
+        # Escape HTML characters
+        content = content.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        content = content.replace('&lt;br/&gt;', '<br/>')  # Keep line breaks    
+        content = image_content + content
+
+        # Choose style based on role
+        if message['role'] == 'user':
+            msg_style = user_style
+            role_prefix = f"<b>👤 {role}:</b> "
+        else:
+            msg_style = assistant_style
+            role_prefix = f"<b>🤖 {role}:</b> "
+
+        # Add the message
+        full_message = role_prefix + content
+        story.append(Paragraph(full_message, msg_style))
+        
+        # Add space between messages
+        if i < len(messages) - 1:
+            story.append(Spacer(1, 12))
+
+    # Add Tool Calls DETAILED section
+    # the index saved on the session when it covers exactly these messages, a scan otherwise
+    index = mongo_doc.get("tool_call_index")
+    if index and index["num_messages"] == len(messages):
+        chat_tool_calls = tool_calls.completed_calls(index)
+    else:
+        chat_tool_calls = parse_tool_calls(messages)
+
+    if chat_tool_calls:
+        story.append(Spacer(1, 30))
+        story.append(Paragraph("🔧 Tool Calls Used in This Conversation", tool_section_style))
+        story.append(Spacer(1, 15))
+        
+        for i, tool_call in enumerate(chat_tool_calls):
+            tool_name = tool_call.get('tool', 'Unknown Tool')
+            parameters = tool_call.get('parameters', '')
+            result = tool_call.get('result', 'No result available')
+            
+            # Format the tool call information
+            tool_info = f"<b>Tool {i+1}: {tool_name}</b><br/>"
+            tool_info += f"<b>Parameters:</b> {parameters}<br/>"
+            tool_info += f"<b>Result:</b> {result[:100]}...(truncated for brevity)"
+            
+            story.append(Paragraph(tool_info, tool_call_style))
+
+            # Add space between tool calls
+            if i < len(chat_tool_calls) - 1:
+                story.append(Spacer(1, 10))
+    
+    # Build the PDF
+    doc.build(story)
+    
+    # Get the PDF bytes
+    pdf_bytes = buffer.getvalue()
+    buffer.close()
+    
+    filename = f"chatbot_meta_mcp_{mongo_doc['created_at'].strftime('%Y_%m_%d_at_%H_%M_%S')}_messages_{mongo_doc['num_messages']}.pdf"
+
+    return pdf_bytes, filename
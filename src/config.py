@@ -1,21 +1,83 @@
-import os
-from dotenv import load_dotenv
-import streamlit as st
-
-load_dotenv(override=True)
-
-IS_DEBUG = os.getenv("DEBUG", "").lower() == "true"
-
-CHATBOT_HEADERS = {
-    "authorization": st.secrets["password_endpoint"],
-    "Content-Type": "application/json"
-}
-
-CHATBOT_MODELS = {
-    "gpt-4.1": "gpt-4.1",
-    "gpt-4.1-mini": "gpt-4.1-mini",
-    # finetuned on tool usage + knowledge at final response
-    "gpt-4.1-mini + tools + knowledge": "ft:gpt-4.1-mini-2025-04-14:yakkyo-spa:tools-and-knowledge:Bx7yOspD",
-    # finetune of Bx7yOspD with also Q&A pairs
-    "gpt-4.1-mini + tools + knowledge + Q&A": "ft:gpt-4.1-mini-2025-04-14:yakkyo-spa:tools-and-knowledge-and-q-a:C8lsCilS",
-}
+import os
+from dotenv import load_dotenv
+import streamlit as st
+
+load_dotenv(override=True)
+
+IS_DEBUG = os.getenv("DEBUG", "").lower() == "true"
+
+# logs of src/ and apps/ (src/logs.py) and metrics of the hot paths (src/metrics.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if IS_DEBUG else "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text (key=value) | json
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # Prometheus text endpoint at /metrics, 0 = disabled
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# shared MongoClient (src/mongo.py)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60_000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5_000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5_000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30_000))  # raise it for long maintenance jobs
+
+# process-wide cache of get_ads pages, shared by all the sessions
+ADS_CACHE_TTL = int(os.getenv("ADS_CACHE_TTL", 120))  # seconds
+ADS_CACHE_MAX_PAGES = int(os.getenv("ADS_CACHE_MAX_PAGES", 512))
+AD_DETAILS_CACHE_SIZE = int(os.getenv("AD_DETAILS_CACHE_SIZE", 256))
+
+# windowed ads grid (src/ads_grid.py): pages rendered at once and pages kept in each session
+ADS_WINDOW_PAGES = int(os.getenv("ADS_WINDOW_PAGES", 3))
+ADS_SESSION_MAX_PAGES = int(os.getenv("ADS_SESSION_MAX_PAGES", 8))
+
+# chat PDF exports kept in memory (LRU across the sessions)
+CHAT_PDF_CACHE_SIZE = int(os.getenv("CHAT_PDF_CACHE_SIZE", 32))
+
+# AI analysis PDFs, content-addressed on disk (src/analysis_pdf.py)
+ANALYSIS_PDF_CACHE_DIR = os.getenv("ANALYSIS_PDF_CACHE_DIR", ".cache/analysis_pdfs")
+
+# images uploaded to the chatbot (src/chat_image.py): longest side, byte budget and format sent to the webhook
+CHAT_IMAGE_MAX_SIDE = int(os.getenv("CHAT_IMAGE_MAX_SIDE", 1024))
+CHAT_IMAGE_MAX_BYTES = int(os.getenv("CHAT_IMAGE_MAX_BYTES", 200_000))
+CHAT_IMAGE_FORMAT = os.getenv("CHAT_IMAGE_FORMAT", "JPEG").upper()  # JPEG | WEBP
+
+# local thumbnails of the fbcdn creatives (src/media_cache.py), served from ./static/thumbs
+MEDIA_THUMB_WIDTH = int(os.getenv("MEDIA_THUMB_WIDTH", 480))  # pixels
+MEDIA_FETCH_WORKERS = int(os.getenv("MEDIA_FETCH_WORKERS", 4))
+MEDIA_MAX_BYTES_PER_S = int(os.getenv("MEDIA_MAX_BYTES_PER_S", 2_000_000))  # download bandwidth of all the workers, 0 = unlimited
+MEDIA_MAX_DOWNLOAD_BYTES = int(os.getenv("MEDIA_MAX_DOWNLOAD_BYTES", 10_000_000))
+MEDIA_READ_TIMEOUT = float(os.getenv("MEDIA_READ_TIMEOUT", 20))  # seconds
+MEDIA_RETRY_AFTER = int(os.getenv("MEDIA_RETRY_AFTER", 600))  # seconds before retrying a failed download
+
+# exports of the filtered ads (src/export.py), kept in .cache/exports and downloaded through the app
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 2_000))  # ads per cursor batch
+EXPORT_MAX_AGE = int(os.getenv("EXPORT_MAX_AGE", 3600))  # seconds before an export file is removed
+# largest export downloaded from the sidebar (read in memory by the download button), bigger ones: manage.py export-ads
+EXPORT_MAX_DOWNLOAD_BYTES = int(os.getenv("EXPORT_MAX_DOWNLOAD_BYTES", 50_000_000))
+
+# analytics rollups (src/rollups.py): the dashboard applies the changed ads when they are older than the interval
+ROLLUP_REFRESH_INTERVAL = int(os.getenv("ROLLUP_REFRESH_INTERVAL", 300))  # seconds
+ROLLUP_CACHE_TTL = int(os.getenv("ROLLUP_CACHE_TTL", 30))  # seconds
+
+# pooled HTTP client of the chatbot webhook (src/http_client.py)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))  # seconds
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 180))  # seconds, the agent can run several tools
+HTTP_CONNECT_RETRIES = int(os.getenv("HTTP_CONNECT_RETRIES", 3))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", 0.5))  # seconds, doubled at each retry
+
+# debug log of the chatbot stream: 1 content chunk logged every STREAM_LOG_SAMPLE
+STREAM_LOG_SAMPLE = int(os.getenv("STREAM_LOG_SAMPLE", 100))
+
+CHATBOT_HEADERS = {
+    "authorization": st.secrets["password_endpoint"],
+    "Content-Type": "application/json"
+}
+
+CHATBOT_MODELS = {
+    "gpt-4.1": "gpt-4.1",
+    "gpt-4.1-mini": "gpt-4.1-mini",
+    # finetuned on tool usage + knowledge at final response
+    "gpt-4.1-mini + tools + knowledge": "ft:gpt-4.1-mini-2025-04-14:yakkyo-spa:tools-and-knowledge:Bx7yOspD",
+    # finetune of Bx7yOspD with also Q&A pairs
+    "gpt-4.1-mini + tools + knowledge + Q&A": "ft:gpt-4.1-mini-2025-04-14:yakkyo-spa:tools-and-knowledge-and-q-a:C8lsCilS",
+}
@@ -0,0 +1,233 @@
+"""
+Near-duplicate clustering of the saved ads: competitors run dozens of variants of the same copy (another emoji,
+another headline), get_ads(collapse=True) shows one ad per cluster with the number of its variants.
+
+The ad copy (snapshot.body.text, or the creative part of full_html_text) is reduced to lowercase words, emojis
+and punctuation dropped, and shingled into SHINGLE_WORDS-grams. The NUM_PERM MinHash values of the shingles are
+computed with numpy for a whole batch of ads at once and cut into BANDS bands of ROWS values (LSH): the ads
+sharing a band are candidates, and variants when the share of equal MinHash values (the estimated Jaccard
+similarity of their shingles) is at least SIMILARITY.
+
+    gigi_ads_minhash: one document per clustered ad, the bands are indexed to look up the candidates
+    { "_id": ObjectId("..."), "bands": [-4356..., ...], "signature": Binary(NUM_PERM uint32), "cluster_id": "686cddf3..." }
+
+On the ads: cluster_id (the _id string of the oldest ad of the cluster, its head), variant_of (the same, only on
+the other ads of the cluster, so that collapse mode is a {"variant_of": None} filter) and variants (on the head,
+the number of other ads). cluster_ads() is incremental: the ads saved after the checkpoint join the clusters of
+the ads they match, the clusters joined by a new ad are merged into the oldest one. Clusters are never split,
+cluster_ads(full=True) clusters everything again (e.g. after changing the parameters).
+"""
+import re
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable
+
+import numpy as np
+from bson.binary import Binary
+from pymongo import ReplaceOne, UpdateOne, ASCENDING
+
+from src import mongo, metrics
+from src.ad_fields import creative_text
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+STATE_COLLECTION = "gigi_ads_dedup_state"
+
+SHINGLE_WORDS = 3
+NUM_PERM = 128
+BANDS, ROWS = 16, 8  # candidates from ~0.7 similarity, (1 / BANDS) ** (1 / ROWS)
+SIMILARITY = 0.8
+BATCH_SIZE = 1000
+SEED = 1
+
+# universal hashing of the 32 bit shingle hashes, h(x) = (a * x + b) mod p: a * x + b fits in 64 bits
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(SEED)
+_A = _rng.integers(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def ad_copy(ad: dict) -> str:
+    body = ((ad.get("snapshot") or {}).get("body") or {}).get("text")
+    return body if body else creative_text(ad.get("full_html_text") or "")
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """crc32 of the distinct word SHINGLE_WORDS-grams of the text (one shingle if shorter), empty without words"""
+    words = _WORD_RE.findall(text.lower())
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    shingles.discard("")
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def signatures(hash_lists: list) -> np.ndarray:
+    """MinHash signatures (len(hash_lists) x NUM_PERM uint32) of non-empty shingle hash arrays, in one pass"""
+    lengths = np.array([len(hashes) for hashes in hash_lists])
+    permuted = (np.outer(np.concatenate(hash_lists), _A) + _B) % _PRIME
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    return np.minimum.reduceat(permuted, offsets, axis=0).astype(np.uint32)
+
+
+def band_keys(signatures: np.ndarray) -> np.ndarray:
+    """(n x BANDS) int64 keys, a hash of the ROWS values of each band salted with the band number"""
+    bands = signatures.reshape(len(signatures), BANDS, ROWS).astype(np.uint64)
+    keys = np.arange(BANDS, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    with np.errstate(over="ignore"):
+        for row in range(ROWS):
+            keys = keys * np.uint64(1099511628211) ^ bands[:, :, row]
+    return keys.view(np.int64)
+
+
+def get_state() -> dict:
+    """{"last_id", "ads", "updated_at"} of the clustering, {} before the first run"""
+    return mongo.client[STATE_COLLECTION].find_one({"_id": "ads"}) or {}
+
+
+def reset_clusters() -> None:
+    # delete_many, not drop: the bands and cluster_id indexes stay
+    mongo.client[mongo.MINHASH_COLLECTION].delete_many({})
+    mongo.client["gigi_ads_saved"].update_many(
+        {"cluster_id": {"$exists": True}}, {"$unset": {"cluster_id": "", "variant_of": "", "variants": ""}}
+    )
+    mongo.client[STATE_COLLECTION].delete_one({"_id": "ads"})
+    return None
+
+
+@metrics.timed("dedup_seconds")
+def cluster_ads(full: bool = False, batch_size: int = BATCH_SIZE, progress: Callable = None) -> dict:
+    """
+    Cluster the ads saved after the checkpoint (all of them if full), oldest first.
+    Returns {"ads": ads clustered, "variants": ads that joined a cluster, "merged": clusters merged into older ones,
+    "removed": deleted ads removed from their clusters, "seconds"}.
+    """
+    if full:
+        reset_clusters()
+    after_id = get_state().get("last_id")
+
+    started = time.perf_counter()
+    stats = {"ads": 0, "variants": 0, "merged": 0, "removed": 0}
+    cursor = mongo.client["gigi_ads_saved"].find(
+        {"_id": {"$gt": after_id}} if after_id else {}, {"snapshot.body.text": 1, "full_html_text": 1}
+    ).sort("_id", ASCENDING).batch_size(batch_size)
+
+    batch = []
+    for ad in cursor:
+        batch.append(ad)
+        if len(batch) >= batch_size:
+            _cluster_batch(batch, stats)
+            batch = []
+            if progress:
+                progress(stats["ads"])
+    if batch:
+        _cluster_batch(batch, stats)
+
+    stats["removed"] = _remove_deleted_ads()
+    stats["seconds"] = round(time.perf_counter() - started, 1)
+    log.info("Clustered ads", extra=stats)
+    return stats
+
+
+def _cluster_batch(ads: list, stats: dict) -> None:
+    copies = [(ad["_id"], shingle_hashes(ad_copy(ad))) for ad in ads]
+    with_copy = [(ad_id, hashes) for ad_id, hashes in copies if len(hashes)]
+    batch_signatures = signatures([hashes for _, hashes in with_copy]) if with_copy else np.empty((0, NUM_PERM), np.uint32)
+    batch_keys = band_keys(batch_signatures)
+
+    # the clustered ads sharing a band with the batch, then the batch itself as it's clustered
+    buckets, known = defaultdict(list), {}
+    for doc in mongo.client[mongo.MINHASH_COLLECTION].find({"bands": {"$in": list(set(batch_keys.ravel().tolist()))}}):
+        known[doc["_id"]] = (np.frombuffer(doc["signature"], dtype=np.uint32), doc["cluster_id"])
+        for key in doc["bands"]:
+            buckets[key].append(doc["_id"])
+
+    # union-find of the cluster ids, the root is the oldest cluster (ObjectId hex strings sort like the ObjectIds)
+    parent, new_keys = {}, {}
+
+    def find(cluster_id: str) -> str:
+        while parent.get(cluster_id, cluster_id) != cluster_id:
+            cluster_id = parent[cluster_id]
+        return cluster_id
+
+    for (ad_id, _), signature, keys in zip(with_copy, batch_signatures, batch_keys.tolist()):
+        own = str(ad_id)
+        candidates = list({candidate for key in keys for candidate in buckets.get(key, [])})
+        if candidates:
+            matches = np.count_nonzero(np.stack([known[c][0] for c in candidates]) == signature, axis=1)
+            for candidate in (c for c, equal in zip(candidates, matches) if equal >= SIMILARITY * NUM_PERM):
+                root, other = sorted([find(own), find(known[candidate][1])])
+                if root != other:
+                    parent[other] = root
+        known[ad_id], new_keys[ad_id] = (signature, own), keys
+        for key in keys:
+            buckets[key].append(ad_id)
+
+    # clusters of earlier batches merged into an older one
+    merged = {cluster_id for cluster_id in parent if find(cluster_id) != cluster_id and cluster_id < str(ads[0]["_id"])}
+    for cluster_id in merged:
+        root = find(cluster_id)
+        # the former head becomes a variant: its count of variants goes with it
+        mongo.client["gigi_ads_saved"].update_many(
+            {"cluster_id": cluster_id}, {"$set": {"cluster_id": root, "variant_of": root}, "$unset": {"variants": ""}}
+        )
+        mongo.client[mongo.MINHASH_COLLECTION].update_many({"cluster_id": cluster_id}, {"$set": {"cluster_id": root}})
+
+    minhashes, updates, roots = [], [], set()
+    for ad_id, hashes in copies:
+        root = find(str(ad_id))
+        if len(hashes):
+            minhashes.append(ReplaceOne(
+                {"_id": ad_id}, {"bands": new_keys[ad_id], "signature": Binary(known[ad_id][0].tobytes()), "cluster_id": root}, upsert=True
+            ))
+        else:
+            # no copy to compare: a cluster of its own, kept in the collection for the deleted ads check
+            minhashes.append(ReplaceOne({"_id": ad_id}, {"bands": [], "signature": None, "cluster_id": root}, upsert=True))
+        if root == str(ad_id):
+            updates.append(UpdateOne({"_id": ad_id}, {"$set": {"cluster_id": root}, "$unset": {"variant_of": ""}}))
+        else:
+            updates.append(UpdateOne({"_id": ad_id}, {"$set": {"cluster_id": root, "variant_of": root}, "$unset": {"variants": ""}}))
+            roots.add(root)
+            stats["variants"] += 1
+    mongo.client[mongo.MINHASH_COLLECTION].bulk_write(minhashes, ordered=False)
+    mongo.client["gigi_ads_saved"].bulk_write(updates, ordered=False)
+    for root in roots | {find(cluster_id) for cluster_id in merged}:
+        mongo.update_cluster_head(root)
+
+    stats["ads"] += len(ads)
+    stats["merged"] += len(merged)
+    mongo.client[STATE_COLLECTION].update_one(
+        {"_id": "ads"},
+        {"$set": {"last_id": ads[-1]["_id"], "updated_at": datetime.now()}, "$inc": {"ads": len(ads)}},
+        upsert=True
+    )
+    return None
+
+
+def _remove_deleted_ads() -> int:
+    """MinHash documents of the ads no longer in the collection (only looked for when there are more than ads)"""
+    minhashes, ads = mongo.client[mongo.MINHASH_COLLECTION], mongo.client["gigi_ads_saved"]
+    if minhashes.estimated_document_count() <= ads.estimated_document_count():
+        return 0
+
+    removed = 0
+    batch = []
+    for doc in minhashes.find({}, {"cluster_id": 1}).batch_size(BATCH_SIZE):
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            removed += _remove_orphans(batch)
+            batch = []
+    if batch:
+        removed += _remove_orphans(batch)
+    return removed
+
+
+def _remove_orphans(docs: list) -> int:
+    existing = {ad["_id"] for ad in mongo.client["gigi_ads_saved"].find({"_id": {"$in": [doc["_id"] for doc in docs]}}, {"_id": 1})}
+    orphans = [doc for doc in docs if doc["_id"] not in existing]
+    for doc in orphans:
+        mongo.remove_ad_from_cluster(doc)
+    return len(orphans)
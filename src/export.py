@@ -0,0 +1,245 @@
+"""
+Export of the ads matching a get_ads filter (tags, type, search) to CSV, JSONL or Parquet, one flat row per ad:
+query_params and snapshot.body.text are flattened and the competitor page name is joined from get_competitors.
+The ads are streamed from a batched cursor and written as they come (Parquet by row groups), so the memory
+stays constant whatever the number of ads. Used by the sidebar of the FB Saved Ads page (in a background thread,
+the file is kept in .cache/exports and downloaded through the app) and by `python manage.py export-ads`.
+"""
+import csv
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterator
+
+from src import mongo
+from src.config import EXPORT_BATCH_SIZE, EXPORT_MAX_AGE, EXPORT_MAX_DOWNLOAD_BYTES
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+# not under ./static: the exports are only downloaded through the app, after the login
+EXPORTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "exports")
+
+# query_params of the ads saved by the extension (see the schema in src/mongo.py), one column each
+QUERY_PARAMS = ["active_status", "ad_type", "country", "is_targeted_country", "media_type", "search_type", "view_all_page_id"]
+
+COLUMNS = (
+    ["ad_archive_id", "created_at", "updated_at", "tags", "media_type", "img_url", "video_url", "poster_url",
+     "competitor_name", "body_text", "has_ai_image_analysis", "has_ai_video_analysis"]
+    + [f"query_params.{key}" for key in QUERY_PARAMS]
+)
+
+EXPORT_FIELDS = {
+    "_id": 0,
+    "ad_archive_id": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "tags": 1,
+    "img_url": 1,
+    "video_url": 1,
+    "poster_url": 1,
+    "query_params": 1,
+    "snapshot.body.text": 1,
+    "has_ai_image_analysis": mongo.CARD_FIELDS["has_ai_image_analysis"],
+    "has_ai_video_analysis": mongo.CARD_FIELDS["has_ai_video_analysis"],
+}
+
+PARQUET_ROW_GROUP = 50_000
+
+
+class ExportTooLargeError(Exception):
+    pass
+
+
+def iter_ads(tags: list = [], type_ad: str = "all", search: str = "", batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[dict]:
+    """
+    Every ad matching the filter of get_ads, newest first (in the text index order when searching),
+    fetched batch_size documents per round trip
+    """
+    query = mongo.build_ads_query(None, tags, type_ad)
+    if search.strip():
+        # no relevance sort: it would be an in-memory sort of all the matches on the server
+        cursor = mongo.client["gigi_ads_saved"].find({"$text": {"$search": search.strip()}, **query}, EXPORT_FIELDS)
+    else:
+        cursor = mongo.client["gigi_ads_saved"].find(query, EXPORT_FIELDS).sort("_id", -1)
+    yield from cursor.batch_size(batch_size)
+
+
+def flatten_ad(ad: dict, competitors: dict) -> dict:
+    query_params = ad.get("query_params") or {}
+    page_id = str(query_params.get("view_all_page_id", ""))
+    row = {
+        "ad_archive_id": ad.get("ad_archive_id"),
+        "created_at": ad.get("created_at"),
+        "updated_at": ad.get("updated_at"),
+        "tags": ad.get("tags") or [],
+        "media_type": "video" if ad.get("video_url") else "image" if ad.get("img_url") else None,
+        "img_url": ad.get("img_url"),
+        "video_url": ad.get("video_url"),
+        "poster_url": ad.get("poster_url"),
+        "competitor_name": competitors.get(page_id),
+        "body_text": ((ad.get("snapshot") or {}).get("body") or {}).get("text"),
+        "has_ai_image_analysis": bool(ad.get("has_ai_image_analysis")),
+        "has_ai_video_analysis": bool(ad.get("has_ai_video_analysis")),
+    }
+    for key in QUERY_PARAMS:
+        value = query_params.get(key)
+        row[f"query_params.{key}"] = None if value is None else str(value)
+    return row
+
+
+def _write_csv(rows: Iterator[dict], path: str) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            row["tags"] = ", ".join(row["tags"])
+            writer.writerow(row)
+    return None
+
+
+def _write_jsonl(rows: Iterator[dict], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, default=str, ensure_ascii=False))
+            f.write("\n")
+    return None
+
+
+def _write_parquet(rows: Iterator[dict], path: str) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    fields = {column: pa.string() for column in COLUMNS}
+    fields.update({
+        "created_at": pa.timestamp("ms"), "updated_at": pa.timestamp("ms"), "tags": pa.list_(pa.string()),
+        "has_ai_image_analysis": pa.bool_(), "has_ai_video_analysis": pa.bool_(),
+    })
+    schema = pa.schema([(column, fields[column]) for column in COLUMNS])
+
+    def write_group(writer, group: list) -> None:
+        writer.write_table(pa.Table.from_pylist(group, schema=schema))
+        return None
+
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        group = []
+        for row in rows:
+            group.append(row)
+            if len(group) >= PARQUET_ROW_GROUP:
+                write_group(writer, group)
+                group = []
+        if group:
+            write_group(writer, group)
+    return None
+
+
+WRITERS = {"csv": _write_csv, "jsonl": _write_jsonl, "parquet": _write_parquet}
+MIME_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+
+
+def export_ads(path: str, fmt: str = "csv", tags: list = [], type_ad: str = "all", search: str = "",
+               batch_size: int = EXPORT_BATCH_SIZE, progress: Callable = None, cancel: threading.Event = None,
+               max_bytes: int = 0) -> dict:
+    """
+    Write the ads matching the filter to path (written to a temporary file, renamed when complete).
+    progress(rows) is called every batch; a set cancel event stops the export (InterruptedError).
+    With max_bytes, the export stops (ExportTooLargeError) once the file is larger, checked every batch
+    (Parquet files only grow by row groups of PARQUET_ROW_GROUP ads).
+    Returns {"rows", "bytes", "seconds"}.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format {fmt}, expected one of {list(WRITERS)}")
+    start = time.perf_counter()
+    competitors = {str(c["competitor_id_page"]): c["page_name"] for c in mongo.get_competitors()}
+    count = 0
+
+    def rows() -> Iterator[dict]:
+        nonlocal count
+        for ad in iter_ads(tags, type_ad, search, batch_size):
+            yield flatten_ad(ad, competitors)
+            count += 1
+            if count % batch_size == 0:
+                if cancel is not None and cancel.is_set():
+                    raise InterruptedError("export cancelled")
+                if max_bytes and os.path.getsize(tmp_path) > max_bytes:
+                    raise ExportTooLargeError(f"export larger than {max_bytes} bytes")
+                if progress:
+                    progress(count)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        WRITERS[fmt](rows(), tmp_path)
+        if max_bytes and os.path.getsize(tmp_path) > max_bytes:
+            raise ExportTooLargeError(f"export larger than {max_bytes} bytes")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    if progress:
+        progress(count)
+
+    stats = {"rows": count, "bytes": os.path.getsize(path), "seconds": round(time.perf_counter() - start, 1)}
+    log.info("Exported ads", extra={"format": fmt, "tags": tags, "type_ad": type_ad, "search": search, **stats})
+    return stats
+
+
+def remove_old_exports(max_age: int = EXPORT_MAX_AGE) -> int:
+    """The exports of the sidebar only stay max_age seconds on disk"""
+    removed = 0
+    if not os.path.isdir(EXPORTS_DIR):
+        return removed
+    for name in os.listdir(EXPORTS_DIR):
+        path = os.path.join(EXPORTS_DIR, name)
+        if os.path.isfile(path) and time.time() - os.path.getmtime(path) > max_age:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def start_export(fmt: str, tags: list = [], type_ad: str = "all", search: str = "") -> dict:
+    """
+    Run export_ads in a background thread into EXPORTS_DIR, up to EXPORT_MAX_DOWNLOAD_BYTES: the download button
+    holds the whole file in memory, the bigger exports are made with `python manage.py export-ads`.
+    Returns the job, a dict updated by the thread:
+    {"status": "running" | "done" | "too_large" | "error" | "cancelled", "rows", "file", "download_name", "error", "cancel"}
+    """
+    remove_old_exports()
+    download_name = f"ads_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    file_name = download_name.replace(f".{fmt}", f"_{secrets.token_urlsafe(12)}.{fmt}")
+    job = {
+        "status": "running", "format": fmt, "rows": 0, "file": file_name, "download_name": download_name,
+        "error": None, "cancel": threading.Event(),
+    }
+
+    def run() -> None:
+        try:
+            stats = export_ads(
+                os.path.join(EXPORTS_DIR, file_name), fmt, tags, type_ad, search,
+                progress=lambda rows: job.update(rows=rows), cancel=job["cancel"], max_bytes=EXPORT_MAX_DOWNLOAD_BYTES
+            )
+            job.update(status="done", **stats)
+        except InterruptedError:
+            job["status"] = "cancelled"
+        except ExportTooLargeError:
+            job["status"] = "too_large"
+        except Exception as e:
+            log.exception("Error exporting ads", extra={"format": fmt})
+            job.update(status="error", error=str(e))
+        return None
+
+    threading.Thread(target=run, name="ads_export", daemon=True).start()
+    return job
+
+
+def export_path(job: dict) -> str:
+    return os.path.join(EXPORTS_DIR, job["file"])
+
+
+def read_export(job: dict) -> bytes:
+    """Content of the finished export (at most EXPORT_MAX_DOWNLOAD_BYTES), read when its download button is clicked"""
+    with open(export_path(job), "rb") as f:
+        return f.read()
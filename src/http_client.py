@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Dict, Any
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src import metrics
+from src.logs import get_logger
+from src.config import (
+    HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_CONNECT_RETRIES, HTTP_RETRY_BACKOFF
+)
+
+log = get_logger(__name__)
+
+# process-wide session shared by all the streamlit sessions: keeps the TCP+TLS connections alive
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _build_session() -> requests.Session:
+    # retry only when the connection can't be established: the request never reached the webhook,
+    # so retrying a POST is safe. Read errors and HTTP error statuses are never retried.
+    retry = Retry(
+        total=HTTP_CONNECT_RETRIES,
+        connect=HTTP_CONNECT_RETRIES,
+        read=False,
+        status=0,
+        other=False,
+        redirect=0,
+        allowed_methods=None,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry, pool_block=False)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    log.info("Created pooled HTTP session", extra={
+        "pool_size": HTTP_POOL_SIZE, "connect_timeout_s": HTTP_CONNECT_TIMEOUT, "read_timeout_s": HTTP_READ_TIMEOUT
+    })
+    return session
+
+
+def post(url: str, params: Dict[str, Any]=None, json: Dict[str, Any]=None, headers: Dict[str, str]=None,
+         stream: bool=False, timeout: tuple=None) -> requests.Response:
+    """
+    POST through the pooled session with explicit (connect, read) timeouts.
+    With stream=True the latency is the time to the response headers, the body is read by the caller.
+    Raises the requests exceptions (e.g. requests.Timeout) like requests.post.
+    """
+    start = time.perf_counter()
+    try:
+        response = get_session().post(
+            url, params=params, json=json, headers=headers, stream=stream,
+            timeout=timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        )
+    except requests.RequestException:
+        record_latency(endpoint_name(url), time.perf_counter() - start, error=True)
+        raise
+    record_latency(endpoint_name(url), time.perf_counter() - start, error=response.status_code >= 400)
+    return response
+
+
+def endpoint_name(url: str) -> str:
+    return urlsplit(url).path or url
+
+
+def record_latency(name: str, seconds: float, error: bool=False) -> None:
+    """Observe the call in the http_request_seconds histogram of src/metrics.py, labelled endpoint=name"""
+    metrics.observe("http_request_seconds", seconds, endpoint=name)
+    if error:
+        metrics.inc(metrics.errors_name("http_request_seconds"), endpoint=name)
+    (log.warning if error else log.debug)("HTTP call", extra={"endpoint": name, "seconds": round(seconds, 3), "error": error})
+    return None
+
@@ -0,0 +1,221 @@
+"""
+Declares the indexes required by the queries in src/mongo.py, creates them idempotently
+and verifies with explain() that every query shape actually uses them.
+"""
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from src import mongo
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+
+class QueryPlanError(Exception):
+    """Raised when a query shape is planned with a collection scan or an in-memory sort"""
+
+
+# collection -> indexes required by the queries of src/mongo.py
+INDEXES = {
+    "gigi_ads_saved": [
+        # update_ad_tags, delete_ad (and the extension backend) match on ad_archive_id
+        IndexModel([("ad_archive_id", ASCENDING)], name="ad_archive_id_unique", unique=True),
+        # get_ads with tags: $in on tags + sort by _id (merged index scans, no in-memory sort)
+        IndexModel([("tags", ASCENDING), ("_id", DESCENDING)], name="tags_id"),
+        # get_ads with type_ad video/image: $exists on the media url + sort by _id
+        IndexModel(
+            [("_id", DESCENDING)], name="id_video",
+            partialFilterExpression={"video_url": {"$exists": True}}
+        ),
+        IndexModel(
+            [("_id", DESCENDING)], name="id_image",
+            partialFilterExpression={"img_url": {"$exists": True}}
+        ),
+        # get_ads with tags and type_ad
+        IndexModel(
+            [("tags", ASCENDING), ("_id", DESCENDING)], name="tags_id_video",
+            partialFilterExpression={"video_url": {"$exists": True}}
+        ),
+        IndexModel(
+            [("tags", ASCENDING), ("_id", DESCENDING)], name="tags_id_image",
+            partialFilterExpression={"img_url": {"$exists": True}}
+        ),
+        # get_ads with sort longest_running: keyset on (extracted.active_hours, _id), with and without tags
+        IndexModel([("extracted.active_hours", DESCENDING), ("_id", DESCENDING)], name="active_hours_id"),
+        IndexModel(
+            [("tags", ASCENDING), ("extracted.active_hours", DESCENDING), ("_id", DESCENDING)], name="tags_active_hours_id"
+        ),
+        # fields parsed from full_html_text (src/ad_fields.py): the ads of a landing domain, started since a date
+        IndexModel([("extracted.domain", ASCENDING), ("_id", DESCENDING)], name="domain_id", sparse=True),
+        IndexModel([("extracted.started_on", DESCENDING)], name="started_on", sparse=True),
+        # get_ads with collapse: the heads of the clusters of variants ({"variant_of": None}) + sort by _id
+        IndexModel([("variant_of", ASCENDING), ("_id", DESCENDING)], name="variant_of_id"),
+        IndexModel([("tags", ASCENDING), ("variant_of", ASCENDING), ("_id", DESCENDING)], name="tags_variant_of_id"),
+        # cluster_ads: the ads of a cluster, oldest first
+        IndexModel([("cluster_id", ASCENDING), ("_id", ASCENDING)], name="cluster_id_id", sparse=True),
+        # backfill_ad_fields: ads saved after the checkpoint, by _id (default index)
+        # refresh_rollups: ads changed since the watermark
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+        # get_ads with search: full-text search over the ad copy
+        IndexModel(
+            [("snapshot.body.text", TEXT), ("full_html_text", TEXT)], name="ad_text",
+            weights={"snapshot.body.text": 2, "full_html_text": 1},
+            default_language="english", language_override="text_language"
+        ),
+    ],
+    "gigi_chatbot_sessions": [
+        # get_history_chats: is_test_chat filter (production) + keyset on (updated_at, _id)
+        IndexModel(
+            [("is_test_chat", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)],
+            name="is_test_chat_updated_at_id"
+        ),
+        # get_history_chats in debug mode (no is_test_chat filter)
+        IndexModel([("updated_at", DESCENDING), ("_id", DESCENDING)], name="updated_at_id"),
+    ],
+    mongo.TAGS_COLLECTION: [
+        IndexModel([("count", DESCENDING)], name="count"),
+    ],
+    # cluster_ads: the clustered ads sharing a LSH band with the new ones, the documents of a cluster
+    "gigi_ads_minhash": [
+        IndexModel([("bands", ASCENDING)], name="bands"),
+        IndexModel([("cluster_id", ASCENDING)], name="cluster_id"),
+    ],
+    "facebook_competitors": [
+        IndexModel([("competitor_id_page", ASCENDING)], name="competitor_id_page", sparse=True),
+    ],
+}
+
+
+def ensure_indexes() -> dict:
+    """
+    Create the declared indexes, skipping the ones that already exist. Each index is created on its own,
+    so that one failure (e.g. duplicated ad_archive_id values prevent the unique index) doesn't block the others.
+    Returns {"created": {collection: [index names]}, "failed": {collection: {index name: error}}}.
+    """
+    created, failed = {}, {}
+    for collection, indexes in INDEXES.items():
+        existing = set(mongo.client[collection].index_information().keys())
+        for index in indexes:
+            name = index.document["name"]
+            if name in existing:
+                continue
+            try:
+                mongo.client[collection].create_indexes([index])
+                created.setdefault(collection, []).append(name)
+                log.info("Created index", extra={"collection": collection, "index": name})
+            except OperationFailure as e:
+                failed.setdefault(collection, {})[name] = str(e)
+                log.error("Error creating index", extra={"collection": collection, "index": name, "error": str(e)})
+    return {"created": created, "failed": failed}
+
+
+def get_query_shapes() -> list:
+    """
+    The query shapes issued by src/mongo.py, as (name, collection, filter, sort, projection).
+    Filters are built with the same helpers used by the queries themselves.
+    """
+    some_id = ObjectId()
+    shapes = [
+        ("get_tags", mongo.TAGS_COLLECTION, {"count": {"$gt": 0}}, None, {"count": 1}),
+        ("get_competitors", "facebook_competitors", {"competitor_id_page": {"$exists": True}}, None,
+         {"_id": 0, "page_name": 1, "competitor_id_page": 1}),
+        ("update_ad_tags / delete_ad", "gigi_ads_saved", {"ad_archive_id": "1947996416031676"}, None, {"tags": 1}),
+        ("get_chatbot_session", "gigi_chatbot_sessions", {"_id": some_id}, None, {"messages": 1}),
+    ]
+    shapes.append((
+        "refresh_rollups", "gigi_ads_saved", {"updated_at": {"$gte": datetime.now()}}, [("updated_at", ASCENDING)],
+        {"tags": 1}
+    ))
+    shapes.append(("cluster_ads (candidates)", "gigi_ads_minhash", {"bands": {"$in": [1, 2]}}, None, {"signature": 1}))
+    shapes.append((
+        "cluster_ads (cluster head)", "gigi_ads_saved", {"cluster_id": str(some_id)}, [("_id", ASCENDING)], {"_id": 1}
+    ))
+    for tags in [[], ["ugc"]]:
+        # ranked by textScore: the top-k sort on the score happens in the aggregation, only the match is checked here
+        shapes.append((
+            f"get_ads(search=..., tags={tags})", "gigi_ads_saved",
+            {"$text": {"$search": "turmeric soap"}, **mongo.build_ads_query(None, tags, "all")}, None, {"ad_archive_id": 1}
+        ))
+    history_cursor = mongo.encode_history_cursor({"updated_at": datetime.now(), "_id": some_id})
+    for cursor in [None, history_cursor]:
+        shapes.append((
+            f"get_history_chats(cursor={'yes' if cursor else 'no'})", "gigi_chatbot_sessions",
+            mongo.build_history_chats_query(cursor), [("updated_at", DESCENDING), ("_id", DESCENDING)],
+            {"updated_at": 1}
+        ))
+    longevity_cursor = mongo.page_cursor([{"_id": str(some_id), "active_hours": 72.0}])
+    for tags in [[], ["ugc"]]:
+        for cursor in [None, longevity_cursor]:
+            shapes.append((
+                f"get_ads(sort=longest_running, tags={tags}, cursor={'yes' if cursor else 'no'})", "gigi_ads_saved",
+                mongo.build_longevity_query(cursor, tags, "all"),
+                [("extracted.active_hours", DESCENDING), ("_id", DESCENDING)], {"ad_archive_id": 1}
+            ))
+    for tags in [[], ["ugc"], ["ugc", "hook"]]:
+        for cursor in [None, some_id]:
+            shapes.append((
+                f"get_ads(collapse=True, tags={tags}, cursor={'yes' if cursor else 'no'})", "gigi_ads_saved",
+                mongo.build_ads_query(cursor, tags, "all", collapse=True), [("_id", DESCENDING)], {"ad_archive_id": 1}
+            ))
+    for type_ad in ["all", "video", "image"]:
+        for tags in [[], ["ugc"], ["ugc", "hook"]]:
+            for cursor in [None, some_id]:
+                name = f"get_ads(type_ad={type_ad}, tags={tags}, cursor={'yes' if cursor else 'no'})"
+                shapes.append((
+                    name, "gigi_ads_saved", mongo.build_ads_query(cursor, tags, type_ad),
+                    [("_id", DESCENDING)], {"ad_archive_id": 1}
+                ))
+    return shapes
+
+
+def _plan_stages(plan) -> list:
+    """Collect the stage names of an explain() plan tree (classic and slot based engine)"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key in ["inputStage", "queryPlan", "outerStage", "innerStage"]:
+            stages += _plan_stages(plan.get(key))
+        for child in plan.get("inputStages", []):
+            stages += _plan_stages(child)
+    return stages
+
+
+def explain_query_shapes() -> list:
+    """
+    Run explain() on every query shape.
+    Returns a list of {name, collection, stages, problems} reports.
+    """
+    reports = []
+    for name, collection, query, sort, projection in get_query_shapes():
+        cursor = mongo.client[collection].find(query, projection).limit(20)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = _plan_stages(plan)
+
+        problems = []
+        if "COLLSCAN" in stages:
+            problems.append("COLLSCAN")
+        if "SORT" in stages:
+            problems.append("in-memory SORT")
+        reports.append({"name": name, "collection": collection, "stages": stages, "problems": problems})
+    return reports
+
+
+def verify_query_plans(reports: list = None) -> list:
+    """
+    Fail loudly if any query shape is planned with a collection scan or an in-memory sort.
+    Checks the given explain_query_shapes() reports (explained here if None), returns them if everything is fine.
+    """
+    if reports is None:
+        reports = explain_query_shapes()
+    failures = [report for report in reports if report["problems"]]
+    if failures:
+        raise QueryPlanError(
+            f"{len(failures)} query shapes are not covered by an index: "
+            + "; ".join(f"{r['name']} ({', '.join(r['problems'])})" for r in failures)
+        )
+    return reports
@@ -0,0 +1,65 @@
+"""
+Logs of src/ and apps/: one "meta_ads" logger tree on stdout, gated by LOG_LEVEL, one line per record
+as key=value pairs (LOG_FORMAT=text) or as a JSON object (LOG_FORMAT=json). Fields go in extra:
+
+    log = get_logger(__name__)
+    log.info("Fetched ads from MongoDB", extra={"count": len(ads)})
+
+    ts=2025-07-08T16:01:26.057Z level=info logger=src.mongo msg="Fetched ads from MongoDB" count=20
+"""
+import json
+import logging
+import sys
+import time
+
+from src.config import LOG_LEVEL, LOG_FORMAT
+
+ROOT_LOGGER = "meta_ads"
+
+# attributes of every LogRecord, the other ones come from extra
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class StructuredFormatter(logging.Formatter):
+
+    def __init__(self, json_lines: bool = False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            "ts": f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created))}.{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name.removeprefix(f"{ROOT_LOGGER}."),
+            "msg": record.getMessage(),
+        }
+        fields.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS})
+        if record.exc_info:
+            fields["exc"] = self.formatException(record.exc_info)
+
+        if self.json_lines:
+            return json.dumps(fields, default=str, ensure_ascii=False)
+        return " ".join(f"{key}={_format_value(value)}" for key, value in fields.items())
+
+
+def _format_value(value) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, default=str, ensure_ascii=False)
+    if text == "" or any(char in text for char in ' "=\n'):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+def _configure() -> logging.Logger:
+    logger = logging.getLogger(ROOT_LOGGER)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(StructuredFormatter(json_lines=LOG_FORMAT == "json"))
+        logger.addHandler(handler)
+        logger.propagate = False  # streamlit configures the root logger with its own format
+        logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    return logger
+
+
+def get_logger(name: str) -> logging.Logger:
+    _configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
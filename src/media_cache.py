@@ -0,0 +1,212 @@
+"""
+Local cache of the ad creatives: the fbcdn urls of img_url/poster_url expire (oe= parameter) and every grid render
+made each browser hit Facebook's CDN. A worker pool downloads each creative once, normalizes it to a fixed-width
+JPEG thumbnail and stores it content-addressed in ./static/thumbs, served by streamlit's static file serving
+(with ETag / 304 handling; the file names never change content, so they are cacheable forever).
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Optional, Union
+
+import requests
+from PIL import Image, ImageOps
+
+from src import mongo, http_client
+from src.config import (
+    MEDIA_THUMB_WIDTH, MEDIA_FETCH_WORKERS, MEDIA_MAX_BYTES_PER_S, MEDIA_MAX_DOWNLOAD_BYTES,
+    MEDIA_READ_TIMEOUT, MEDIA_RETRY_AFTER, HTTP_CONNECT_TIMEOUT
+)
+from src.utils import TTLCache
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+# ./static next to main.py is served by streamlit at app/static/ (server.enableStaticServing)
+THUMBS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "thumbs")
+THUMBS_URL = "app/static/thumbs"
+
+_executor = ThreadPoolExecutor(max_workers=MEDIA_FETCH_WORKERS, thread_name_prefix="media_cache")
+
+# ad_archive_id -> thumbnail file name, "" while a failed download waits MEDIA_RETRY_AFTER before the next try
+_known_media = TTLCache(max_size=4096, ttl=MEDIA_RETRY_AFTER)
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+class _Throttle:
+    """Token bucket shared by the workers: caps the total download bandwidth to rate bytes/s"""
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self._allowance = float(rate)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, num_bytes: int) -> None:
+        if not self.rate:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(float(self.rate), self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= num_bytes
+            delay = -self._allowance / self.rate if self._allowance < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+        return None
+
+
+_throttle = _Throttle(MEDIA_MAX_BYTES_PER_S)
+
+
+def source_url(ad: dict) -> Optional[str]:
+    """The creative to cache: the poster of a video ad, the image of an image ad"""
+    return ad.get("poster_url") if ad.get("video_url") else ad.get("img_url")
+
+
+def thumbnail_urls(ads: list) -> dict:
+    """
+    {ad_archive_id: local thumbnail url} for the ads already cached (one query for the whole page).
+    The missing ones are scheduled for download, the grid keeps the original url until they are ready.
+    """
+    urls, missing = {}, []
+    for ad in ads:
+        file_name = _known_media.get(ad["ad_archive_id"])
+        if file_name:
+            urls[ad["ad_archive_id"]] = f"{THUMBS_URL}/{file_name}"
+        elif file_name is None and source_url(ad):
+            missing.append(ad)
+
+    if missing:
+        try:
+            media = mongo.get_ads_media([ad["ad_archive_id"] for ad in missing])
+        except Exception as e:
+            log.error("Error reading the media cache", extra={"error": str(e)})
+            return urls
+        for ad in missing:
+            file_name = media.get(ad["ad_archive_id"], {}).get("file")
+            if file_name and os.path.exists(os.path.join(THUMBS_DIR, file_name)):
+                _known_media.set(ad["ad_archive_id"], file_name)
+                urls[ad["ad_archive_id"]] = f"{THUMBS_URL}/{file_name}"
+            else:
+                schedule_fetch(ad["ad_archive_id"], source_url(ad))
+    return urls
+
+
+def schedule_fetch(ad_archive_id: str, url: str):
+    """Queue the download of the creative, unless it's already queued. Returns the future or None"""
+    with _in_flight_lock:
+        if ad_archive_id in _in_flight:
+            return None
+        _in_flight.add(ad_archive_id)
+    return _executor.submit(_fetch_worker, ad_archive_id, url)
+
+
+def _fetch_worker(ad_archive_id: str, url: str) -> Optional[str]:
+    try:
+        return fetch_thumbnail(ad_archive_id, url)
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(ad_archive_id)
+
+
+def fetch_thumbnail(ad_archive_id: str, url: str) -> Optional[str]:
+    """Download, normalize and store the creative of one ad. Returns the thumbnail file name, None on errors"""
+    start = time.perf_counter()
+    try:
+        data = _download(url)
+        thumbnail, width, height = make_thumbnail(data)
+        file_name = store_thumbnail(thumbnail)
+    except (requests.RequestException, OSError, ValueError, Image.DecompressionBombError) as e:
+        http_client.record_latency("fbcdn media", time.perf_counter() - start, error=True)
+        log.warning("Error caching the creative of ad", extra={"ad_archive_id": ad_archive_id, "error": str(e)})
+        _known_media.set(ad_archive_id, "")
+        try:
+            mongo.set_ad_media(ad_archive_id, {"source_url": url, "error": str(e)[:200], "failed_at": datetime.now()})
+        except Exception as e:
+            log.error("Error saving the media error of ad", extra={"ad_archive_id": ad_archive_id, "error": str(e)})
+        return None
+
+    http_client.record_latency("fbcdn media", time.perf_counter() - start)
+    try:
+        mongo.set_ad_media(ad_archive_id, {
+            "file": file_name, "source_url": url, "width": width, "height": height, "bytes": len(thumbnail),
+            "fetched_at": datetime.now(), "error": None
+        })
+    except Exception as e:
+        # counted as a failed download: retried after MEDIA_RETRY_AFTER, the stored file is found again
+        log.error("Error saving the media of ad", extra={"ad_archive_id": ad_archive_id, "error": str(e)})
+        _known_media.set(ad_archive_id, "")
+        return None
+    _known_media.set(ad_archive_id, file_name)
+    return file_name
+
+
+def _download(url: str) -> bytes:
+    response = http_client.get_session().get(url, stream=True, timeout=(HTTP_CONNECT_TIMEOUT, MEDIA_READ_TIMEOUT))
+    try:
+        if response.status_code != 200:
+            # 403 "URL signature expired" once the oe= timestamp has passed
+            raise ValueError(f"{response.status_code} - {response.text[:100]}")
+        chunks, size = [], 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > MEDIA_MAX_DOWNLOAD_BYTES:
+                raise ValueError(f"creative larger than {MEDIA_MAX_DOWNLOAD_BYTES} bytes")
+            _throttle.consume(len(chunk))
+            chunks.append(chunk)
+        return b"".join(chunks)
+    finally:
+        response.close()
+
+
+def make_thumbnail(data: bytes, width: int = MEDIA_THUMB_WIDTH) -> tuple:
+    """(JPEG bytes, width, height) of the image scaled to the given width (never upscaled), aspect ratio kept"""
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (width, width * 4))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+    with io.BytesIO() as output:
+        image.save(output, format="JPEG", quality=80, optimize=True, progressive=True)
+        return output.getvalue(), image.width, image.height
+
+
+def store_thumbnail(thumbnail: bytes) -> str:
+    """Write the thumbnail under the sha256 of its bytes (atomic, identical creatives share the file)"""
+    file_name = f"{hashlib.sha256(thumbnail).hexdigest()}.jpg"
+    path = os.path.join(THUMBS_DIR, file_name)
+    if not os.path.exists(path):
+        os.makedirs(THUMBS_DIR, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(thumbnail)
+        os.replace(tmp_path, path)
+    return file_name
+
+
+def warm_media_cache(limit: int = 0) -> dict:
+    """Download the creatives of the ads without a cached thumbnail (newest first) and wait for the workers"""
+    futures = []
+    for ad in mongo.get_ads_without_media(limit):
+        future = schedule_fetch(ad["ad_archive_id"], source_url(ad)) if source_url(ad) else None
+        if future is not None:
+            futures.append(future)
+    wait(futures)
+    results = [future.result() for future in futures]
+    return {"ads": len(results), "cached": sum(1 for r in results if r), "errors": sum(1 for r in results if not r)}
+
+
+def display_url(ad: dict, thumbnails: dict) -> Union[str, None]:
+    """The url to show for the creative of the ad: local thumbnail if cached, original url otherwise"""
+    return thumbnails.get(ad["ad_archive_id"]) or source_url(ad)
@@ -0,0 +1,226 @@
+"""
+In-process metrics of the hot paths, shared by all the streamlit sessions: labelled counters and latency
+histograms, plus callbacks read at export time (e.g. the ads cache counters). Read by the debug performance
+panel of main.py (get_stats: p50/p95 per operation) and exported in the Prometheus text format at /metrics
+(start_metrics_server, METRICS_PORT). No streamlit imports.
+
+    @metrics.timed("mongo_call_seconds")            # label op=<function name>
+    def get_ads(...): ...
+
+    with metrics.timer("rerun_seconds", app="MCP Chatbot"): ...
+    metrics.inc("chatbot_stream_events_total", type="content")
+"""
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+PREFIX = "meta_ads_"
+
+# upper bounds of the histogram buckets in seconds: from the cached mongo reads to the agent's webhook calls
+BUCKETS_S = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> {"buckets", "count", "sum", "max"}
+_callbacks = {}   # name -> (type, function returning the value)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    return None
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    key = (name, _label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * (len(BUCKETS_S) + 1), "count": 0, "sum": 0.0, "max": 0.0}
+        histogram["buckets"][_bucket_index(seconds)] += 1
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+        histogram["max"] = max(histogram["max"], seconds)
+    return None
+
+
+def _bucket_index(seconds: float) -> int:
+    for i, bound in enumerate(BUCKETS_S):
+        if seconds <= bound:
+            return i
+    return len(BUCKETS_S)
+
+
+def errors_name(name: str) -> str:
+    """Counter of the failed calls of a timer: mongo_call_seconds -> mongo_call_errors_total"""
+    return f"{name.removesuffix('_seconds')}_errors_total"
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """Observe the duration of the block, failed ones (exceptions) are also counted in errors_name(name)"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc(errors_name(name), **labels)
+        raise
+    finally:
+        # streamlit's st.rerun / st.stop are BaseExceptions: observed, not counted as errors
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timed(name: str, **labels) -> Callable:
+    """Decorator timing every call of the function, labelled op=<function name>"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, op=func.__name__, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_callback(name: str, function: Callable, kind: str = "gauge") -> None:
+    """Value read at export time (kind gauge or counter), e.g. the counters of a TTLCache"""
+    with _lock:
+        _callbacks[name] = (kind, function)
+    return None
+
+
+def quantile(histogram: dict, q: float) -> float:
+    """q quantile of a histogram, linear interpolation inside the bucket (like Prometheus' histogram_quantile)"""
+    if not histogram["count"]:
+        return 0.0
+    rank, seen, lower = q * histogram["count"], 0, 0.0
+    for bound, count in zip(BUCKETS_S + [math.inf], histogram["buckets"]):
+        if count and seen + count >= rank:
+            if bound == math.inf:
+                return histogram["max"]
+            return min(lower + (bound - lower) * (rank - seen) / count, histogram["max"])
+        seen += count
+        lower = bound
+    return histogram["max"]
+
+
+def _labels_text(labels: tuple) -> str:
+    return ",".join(f"{key}={value}" for key, value in labels)
+
+
+def get_stats(name: str = None) -> list:
+    """
+    One row per timed operation (only the ones of the histogram name if given):
+    [{"metric", "labels", "count", "errors", "p50_ms", "p95_ms", "max_ms", "total_s"}]
+    """
+    with _lock:
+        histograms = {
+            key: {**h, "buckets": list(h["buckets"])} for key, h in _histograms.items() if name is None or key[0] == name
+        }
+        counters = dict(_counters)
+    return [
+        {
+            "metric": metric,
+            "labels": _labels_text(labels),
+            "count": histogram["count"],
+            "errors": int(counters.get((errors_name(metric), labels), 0)),
+            "p50_ms": round(quantile(histogram, 0.5) * 1000, 1),
+            "p95_ms": round(quantile(histogram, 0.95) * 1000, 1),
+            "max_ms": round(histogram["max"] * 1000, 1),
+            "total_s": round(histogram["sum"], 3),
+        }
+        for (metric, labels), histogram in sorted(histograms.items())
+    ]
+
+
+def get_counters(name: str = None) -> dict:
+    """{"name{labels}": value} of the counters (only the ones named name if given)"""
+    with _lock:
+        counters = {key: value for key, value in _counters.items() if name is None or key[0] == name}
+    return {
+        f"{metric}{{{_labels_text(labels)}}}" if labels else metric: value
+        for (metric, labels), value in sorted(counters.items())
+    }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _sample(name: str, labels: tuple, value: float) -> str:
+    labels_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+    number = str(int(value)) if float(value).is_integer() else repr(float(value))
+    return f"{PREFIX}{name}{{{labels_text}}} {number}" if labels_text else f"{PREFIX}{name} {number}"
+
+
+def render_prometheus() -> str:
+    """All the metrics in the Prometheus text exposition format (version 0.0.4)"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: {**h, "buckets": list(h["buckets"])} for key, h in _histograms.items()}
+        callbacks = dict(_callbacks)
+
+    lines, typed = [], set()
+
+    def header(name: str, kind: str) -> None:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(_sample(name, labels, value))
+
+    for (name, labels), histogram in sorted(histograms.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS_S + [math.inf], histogram["buckets"]):
+            cumulative += count
+            le = "+Inf" if bound == math.inf else f"{bound:g}"
+            lines.append(_sample(f"{name}_bucket", labels + (("le", le),), cumulative))
+        lines.append(_sample(f"{name}_sum", labels, histogram["sum"]))
+        lines.append(_sample(f"{name}_count", labels, histogram["count"]))
+
+    for name, (kind, function) in sorted(callbacks.items()):
+        try:
+            value = float(function())
+        except Exception:
+            continue  # a failing callback never breaks the scrape
+        header(name, kind)
+        lines.append(_sample(name, (), value))
+
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return None
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return None
+
+    def log_message(self, format, *args):
+        return None  # one line per scrape would flood the logs
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread of the streamlit process. Raises OSError if the port is taken"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics_server", daemon=True).start()
+    return server
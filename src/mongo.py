@@ -1,157 +1,768 @@
-from pymongo import MongoClient
-from bson.objectid import ObjectId
-from datetime import datetime
-import streamlit as st
-
-from src.config import IS_DEBUG
-
-client = MongoClient(st.secrets["MONGO_DB_URL"])[st.secrets["MONGO_DB_NAME"]]
-
-# {
-#   "ad_archive_id": "1947996416031676",
-#   "created_at": {
-#     "$date": "2025-07-08T16:01:26.058Z"
-#   },
-#   "full_html_text": "​ActiveLibrary ID: 1947996416031676Started running on 7 Jul 2025 · Total active time 11 hrsPlatforms​​​​​This ad has multiple versions​Open Drop-down​See ad detailsGlowvaniSponsored\"I used to feel so insecure about my dark inner thighs. I tried scrubs, DIY turmeric masks, and nothing worked—until Glowvani.After 2 weeks, I could finally see a difference.It’s gentle enough for intimate areas, packed with turmeric + kojic acid, and doesn’t leave stains or irritation like other soaps.If you’ve tried everything and still feel uncomfortable in your skin… this is the bar everyone’s talking about.\"GLOWVANI.COMNaturally Lighten Dark Inner Thighs in 2–3 Weeks ✨Real results. No harsh chemicals. 30-day money-back guarantee.Shop NowClick to select tags...Add TagSave ad",
-#   "img_url": "https://scontent.fcia3-1.fna.fbcdn.net/v/t39.35426-6/516527147_4181958772038273_3026234701252935008_n.jpg?stp=dst-jpg_s60x60_tt6&_nc_cat=101&ccb=1-7&_nc_sid=c53f8f&_nc_ohc=AzmTW8hxfyMQ7kNvwHcJp2Z&_nc_oc=Adl8X0c5AfgZgabkCqhcOnTgxYWms7P6RJm_Q7yUXFQrb-0nWAnieaNScD0T96qo7DE&_nc_zt=14&_nc_ht=scontent.fcia3-1.fna&_nc_gid=WAOgiOdCDQ4pfjP4t58U2A&oh=00_AfT7aP2s5i405YBnJGCutw1t6HYqY-CvdgABy8e9KvrHMg&oe=6872FC81",
-#   "query_params": {
-#     "active_status": "active",
-#     "ad_type": "all",
-#     "country": "ALL",
-#     "is_targeted_country": "false",
-#     "media_type": "all",
-#     "search_type": "page",
-#     "view_all_page_id": "566562996533315"
-#   },
-#   "tags": [],
-#   "updated_at": {
-#     "$date": "2025-07-08T16:01:26.057Z"
-#   }
-# }
-
-def get_ads(last_fetched_ad_id: ObjectId=None, tags: list=[], limit: int=20, type_ad: str="all") -> list:
-    """
-    Fetch ads from the MongoDB collection.
-    If last_fetched_ad_id is provided, fetch ads after that ID.
-    """
-    query = {}
-    if last_fetched_ad_id:
-        query["_id"] = {"$lt": ObjectId(last_fetched_ad_id)}
-    if tags:
-        query["tags"] = {"$in": tags}
-    if type_ad == "video":
-        query["video_url"] = {"$exists": True}
-    elif type_ad == "image":
-        query["img_url"] = {"$exists": True}
-
-
-    fields = {
-        'ad_archive_id': 1,
-        'video_url': 1,
-        'img_url': 1,
-        'poster_url': 1,
-        'full_html_text': 1,
-        'query_params': 1,
-        'tags': 1,
-        'created_at': 1,
-        'updated_at': 1,
-        'snapshot': 1,
-        'ai_image_analysis': 1,
-        'ai_video_analysis': 1
-    }
-    ads = list(client["gigi_ads_saved"].find(query, fields).sort("_id", -1).limit(limit))
-
-    # Convert ObjectId to string for JSON compatibility
-    for ad in ads:
-        ad["_id"] = str(ad["_id"])
-    
-    print(f"Fetched {len(ads)} ads from MongoDB.")
-    return ads
-
-
-def get_tags() -> list:
-    """
-    Fetch all unique tags from the ads collection.
-    """
-    tags = client["gigi_ads_saved"].aggregate([
-        {"$unwind": "$tags"},
-        {"$group": {"_id": "$tags"}},
-        {"$project": {"tag": "$_id"}}
-    ])
-    tags = [tag["tag"] for tag in tags]
-    print(f"Fetched {len(tags)} unique tags from MongoDB.")
-    return list(set(tags))  # Return unique tags
-
-
-def get_competitors() -> list:
-    return list(client["facebook_competitors"].find(
-        {"competitor_id_page": {"$exists": True}},
-        {"_id": 0, "page_name": 1, "competitor_id_page": 1}
-    ))
-
-
-def update_ad_tags(ad_archive_id: str, new_tags: list) -> bool:
-    """
-    Update tags for a specific ad in the database.
-    Returns True if successful, False otherwise.
-    """
-    try:
-        client["gigi_ads_saved"].update_one(
-            {"ad_archive_id": ad_archive_id},
-            {"$set": {"tags": new_tags, "updated_at": datetime.now()}}  # MongoDB will auto-set current date
-        )
-        print(f"Updated tags for ad {ad_archive_id}: {new_tags}")
-        return True
-    except Exception as e:
-        print(f"Error updating ad tags: {str(e)}")
-        return False
-
-
-def update_chat_session_rating(session_id: str, rating: int) -> bool:
-    try:
-        res = client["gigi_chatbot_sessions"].update_one(
-            {"_id": ObjectId(session_id)},
-            {"$set": {"rating": rating}}
-        )
-        print(f"Updated rating for chatbot session {session_id} to {rating}")
-        st.session_state[f'chat_rating_{st.session_state["chatbot_sessionId"]}'] = st.session_state[f'chat_rating_{st.session_state["chatbot_sessionId"]}'];
-        return True if res.modified_count > 0 else False
-    except Exception as e:
-        print(f"Error updating chatbot session rating: {str(e)}")
-        return False
-
-
-def get_chatbot_session(session_id: str) -> dict:
-    try:
-        session = client["gigi_chatbot_sessions"].find_one({"_id": ObjectId(session_id)}, {"messages": 1})
-        assert session is not None, f"Session with ID {session_id} not found"
-        session["_id"] = str(session["_id"])  # Convert ObjectId to string for JSON compatibility
-        print(f"Fetched chatbot session {session_id} with {len(session['messages'])} messages")
-        return session
-    except Exception as e:
-        print(f"Error fetching chatbot session: {type(e)} - {str(e)}")
-    return None
-
-
-def get_history_chats(limit: int = 12, skip: int = 0) -> list:
-    query = {}
-    if not IS_DEBUG:
-        query["is_test_chat"] = False
-
-    sessions = list(client["gigi_chatbot_sessions"].find(
-        query,
-        {"updated_at": 1, "created_at": 1, "num_messages": 1, "rating": 1}
-    ).sort("updated_at", -1).skip(skip).limit(limit))
-
-    print(f"Fetched {len(sessions)} chatbot sessions from MongoDB. Skip: {skip}, Limit: {limit}")
-    return sessions
-
-
-def delete_chat_session(session_id: str) -> bool:
-    try:
-        res = client["gigi_chatbot_sessions"].delete_one({"_id": ObjectId(session_id)})
-        print(f"Deleted chatbot session {session_id}")
-        return True if res.deleted_count > 0 else False
-    except Exception as e:
-        print(f"Error deleting chatbot session: {str(e)}")
-        return False
+from pymongo import MongoClient, UpdateOne, ReturnDocument
+from bson.objectid import ObjectId
+from datetime import datetime
+from typing import Tuple, Union
+import base64, json
+import streamlit as st
+
+from src.config import (
+    IS_DEBUG, ADS_CACHE_TTL, ADS_CACHE_MAX_PAGES, AD_DETAILS_CACHE_SIZE,
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS
+)
+from src.utils import TTLCache
+from src.mongo_stats import command_stats
+from src.logs import get_logger
+from src import metrics, mongo_stats
+
+log = get_logger(__name__)
+
+
+@st.cache_resource
+def get_mongo_client() -> MongoClient:
+    """One MongoClient (and connection pool) per process, shared by all the sessions and reruns"""
+    log.info("Creating MongoClient", extra={
+        "pool": f"{MONGO_MIN_POOL_SIZE}-{MONGO_MAX_POOL_SIZE}", "socket_timeout_ms": MONGO_SOCKET_TIMEOUT_MS
+    })
+    return MongoClient(
+        st.secrets["MONGO_DB_URL"],
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        event_listeners=[command_stats],
+        appname="meta-ads-explorer",
+    )
+
+
+client = get_mongo_client()[st.secrets["MONGO_DB_NAME"]]
+
+# read-through cache of get_ads pages, keyed by (tags, type_ad, search, sort, collapse, cursor, limit)
+ads_cache = TTLCache(max_size=ADS_CACHE_MAX_PAGES, ttl=ADS_CACHE_TTL)
+
+# detail fields of single ads, loaded lazily by ad_archive_id when a card is opened
+ad_details_cache = TTLCache(max_size=AD_DETAILS_CACHE_SIZE, ttl=ADS_CACHE_TTL)
+
+for _name, _cache in [("ads_cache", ads_cache), ("ad_details_cache", ad_details_cache)]:
+    for _stat, _kind in [("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")]:
+        metrics.register_callback(
+            f"{_name}_{_stat}" + ("_total" if _kind == "counter" else ""),
+            lambda cache=_cache, stat=_stat: cache.stats()[stat], kind=_kind
+        )
+
+# materialized tag catalog: one document per tag with the number of saved ads using it
+# { "_id": "ugc", "count": 132, "updated_at": {"$date": "2025-07-08T16:01:26.057Z"} }
+TAGS_COLLECTION = "gigi_ads_tags"
+
+# locally cached thumbnail of the creative of each ad (src/media_cache.py), the fbcdn urls expire
+# { "_id": "1947996416031676", "file": "3f2a...e9.jpg", "source_url": "https://scontent...", "width": 480, "height": 600, "bytes": 41234, "fetched_at": {"$date": ...}, "error": null }
+MEDIA_COLLECTION = "gigi_ads_media"
+
+# MinHash signature and LSH bands of each clustered ad (src/dedup.py), the clusters are on the ads (cluster_id, variant_of, variants)
+# { "_id": ObjectId("..."), "bands": [-4356..., ...], "signature": Binary(...), "cluster_id": "686cddf3..." }
+MINHASH_COLLECTION = "gigi_ads_minhash"
+
+# analytics rollups (src/rollups.py): ads, videos and images per (kind, key), and the contribution of each ad to them
+# { "_id": "tag:ugc", "kind": "tag", "key": "ugc", "count": 132, "video": 40, "image": 92 }
+# { "_id": ObjectId("..."), "page": "566562996533315", "tags": ["ugc"], "day": "2025-07-08", "video": 1, "image": 0 }
+ROLLUPS_COLLECTION = "gigi_ads_rollups"
+ROLLUP_CONTRIBS_COLLECTION = "gigi_ads_rollup_contribs"
+
+# orders of the get_ads pages (search results are always ranked by relevance)
+SORTS = ["newest", "longest_running"]
+
+# {
+#   "ad_archive_id": "1947996416031676",
+#   "created_at": {
+#     "$date": "2025-07-08T16:01:26.058Z"
+#   },
+#   "full_html_text": "​ActiveLibrary ID: 1947996416031676Started running on 7 Jul 2025 · Total active time 11 hrsPlatforms​​​​​This ad has multiple versions​Open Drop-down​See ad detailsGlowvaniSponsored\"I used to feel so insecure about my dark inner thighs. I tried scrubs, DIY turmeric masks, and nothing worked—until Glowvani.After 2 weeks, I could finally see a difference.It’s gentle enough for intimate areas, packed with turmeric + kojic acid, and doesn’t leave stains or irritation like other soaps.If you’ve tried everything and still feel uncomfortable in your skin… this is the bar everyone’s talking about.\"GLOWVANI.COMNaturally Lighten Dark Inner Thighs in 2–3 Weeks ✨Real results. No harsh chemicals. 30-day money-back guarantee.Shop NowClick to select tags...Add TagSave ad",
+#   "img_url": "https://scontent.fcia3-1.fna.fbcdn.net/v/t39.35426-6/516527147_4181958772038273_3026234701252935008_n.jpg?stp=dst-jpg_s60x60_tt6&_nc_cat=101&ccb=1-7&_nc_sid=c53f8f&_nc_ohc=AzmTW8hxfyMQ7kNvwHcJp2Z&_nc_oc=Adl8X0c5AfgZgabkCqhcOnTgxYWms7P6RJm_Q7yUXFQrb-0nWAnieaNScD0T96qo7DE&_nc_zt=14&_nc_ht=scontent.fcia3-1.fna&_nc_gid=WAOgiOdCDQ4pfjP4t58U2A&oh=00_AfT7aP2s5i405YBnJGCutw1t6HYqY-CvdgABy8e9KvrHMg&oe=6872FC81",
+#   "query_params": {
+#     "active_status": "active",
+#     "ad_type": "all",
+#     "country": "ALL",
+#     "is_targeted_country": "false",
+#     "media_type": "all",
+#     "search_type": "page",
+#     "view_all_page_id": "566562996533315"
+#   },
+#   "tags": [],
+#   "updated_at": {
+#     "$date": "2025-07-08T16:01:26.057Z"
+#   }
+# }
+
+@metrics.timed("mongo_call_seconds")
+def get_ads(last_fetched_ad_id: ObjectId=None, tags: list=[], limit: int=20, type_ad: str="all", search: str="", sort: str="newest",
+            collapse: bool=False) -> list:
+    """
+    Fetch ads from the MongoDB collection.
+    If last_fetched_ad_id is provided, fetch ads after that ID (use page_cursor to get it from a page).
+    If search is provided, full-text search the ad copy: ads are ranked by relevance (search_score).
+    Otherwise sort is "newest" (by _id) or "longest_running" (by extracted.active_hours, see src/ad_fields.py).
+    If collapse, only the head of each cluster of near-duplicate ads is returned, with its number of variants (src/dedup.py).
+    Pages are served from ads_cache when the same filter and cursor were fetched recently.
+    """
+    search = (search or "").strip()
+    sort = "newest" if search else sort or "newest"
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort {sort!r}, expected one of {SORTS}")
+    key = _ads_cache_key(last_fetched_ad_id, tags, limit, type_ad, search, sort, collapse)
+    if search:
+        ads = ads_cache.get_or_set(key, lambda: _search_ads(search, last_fetched_ad_id, tags, limit, type_ad, collapse))
+    elif sort == "longest_running":
+        ads = ads_cache.get_or_set(key, lambda: _fetch_longest_running_ads(last_fetched_ad_id, tags, limit, type_ad, collapse))
+    else:
+        ads = ads_cache.get_or_set(key, lambda: _fetch_ads(last_fetched_ad_id, tags, limit, type_ad, collapse))
+
+    # shallow copies: the callers update the ads (e.g. their tags) in their session state
+    return [dict(ad) for ad in ads]
+
+
+def _has_text(field: str) -> dict:
+    return {"$and": [{"$eq": [{"$type": f"${field}"}, "string"]}, {"$ne": [f"${field}", ""]}]}
+
+
+# lightweight projection of the ads grid: the heavy text fields are loaded with get_ad_details
+CARD_FIELDS = {
+    'ad_archive_id': 1,
+    'video_url': 1,
+    'img_url': 1,
+    'poster_url': 1,
+    'tags': 1,
+    'variants': 1,
+    'has_ai_image_analysis': _has_text('ai_image_analysis'),
+    'has_ai_video_analysis': _has_text('ai_video_analysis'),
+}
+
+DETAIL_FIELDS = {
+    '_id': 0,
+    'full_html_text': 1,
+    'query_params': 1,
+    'snapshot.body.text': 1,
+    'created_at': 1,
+    'updated_at': 1,
+    'ai_image_analysis': 1,
+    'ai_video_analysis': 1
+}
+
+
+def build_ads_query(last_fetched_ad_id: ObjectId=None, tags: list=[], type_ad: str="all", collapse: bool=False) -> dict:
+    query = {}
+    if last_fetched_ad_id:
+        query["_id"] = {"$lt": ObjectId(last_fetched_ad_id)}
+    if tags:
+        query["tags"] = {"$in": tags}
+    if type_ad == "video":
+        query["video_url"] = {"$exists": True}
+    elif type_ad == "image":
+        query["img_url"] = {"$exists": True}
+    if collapse:
+        # heads of the clusters and the ads not clustered yet
+        query["variant_of"] = None
+    return query
+
+
+def build_longevity_query(cursor: str=None, tags: list=[], type_ad: str="all", collapse: bool=False) -> dict:
+    """
+    Filter of the longest_running pages, keyset on (extracted.active_hours, _id) descending:
+    the ads without active_hours (not parsed yet) come last, like the null values in the sort.
+    """
+    query = build_ads_query(None, tags, type_ad, collapse)
+    if cursor:
+        token = _decode_cursor(cursor)
+        after_id = {"$lt": ObjectId(token["i"])}
+        if token["h"] is None:
+            query["extracted.active_hours"] = None
+            query["_id"] = after_id
+        else:
+            query["$or"] = [
+                {"extracted.active_hours": {"$lt": token["h"]}},
+                {"extracted.active_hours": token["h"], "_id": after_id},
+                {"extracted.active_hours": None},
+            ]
+    return query
+
+
+def _fetch_longest_running_ads(cursor: str, tags: list, limit: int, type_ad: str, collapse: bool) -> list:
+    query = build_longevity_query(cursor, tags, type_ad, collapse)
+    projection = {**CARD_FIELDS, "active_hours": {"$ifNull": ["$extracted.active_hours", None]}}
+    ads = list(
+        client["gigi_ads_saved"].find(query, projection)
+        .sort([("extracted.active_hours", -1), ("_id", -1)])
+        .limit(limit)
+    )
+
+    for ad in ads:
+        ad["_id"] = str(ad["_id"])
+
+    log.debug("Fetched longest running ads from MongoDB", extra={"count": len(ads)})
+    return ads
+
+
+def _fetch_ads(last_fetched_ad_id: ObjectId, tags: list, limit: int, type_ad: str, collapse: bool) -> list:
+    query = build_ads_query(last_fetched_ad_id, tags, type_ad, collapse)
+
+    ads = list(client["gigi_ads_saved"].find(query, CARD_FIELDS).sort("_id", -1).limit(limit))
+
+    # Convert ObjectId to string for JSON compatibility
+    for ad in ads:
+        ad["_id"] = str(ad["_id"])
+    
+    log.debug("Fetched ads from MongoDB", extra={"count": len(ads)})
+    return ads
+
+
+@metrics.timed("mongo_call_seconds")
+def get_ad_details(ad_archive_id: str) -> dict:
+    """
+    Fetch the detail fields of a single ad (body, query params, dates, AI analyses), cached by ad_archive_id.
+    """
+    def fetch_details():
+        details = client["gigi_ads_saved"].find_one({"ad_archive_id": ad_archive_id}, DETAIL_FIELDS)
+        log.debug("Fetched details of ad", extra={"ad_archive_id": ad_archive_id})
+        return details
+
+    details = ad_details_cache.get_or_set(ad_archive_id, fetch_details)
+    return dict(details) if details else {}
+
+
+def _search_ads(search: str, cursor: str, tags: list, limit: int, type_ad: str, collapse: bool) -> list:
+    """
+    Relevance ranked full-text search over full_html_text and snapshot.body.text (text index "ad_text"),
+    keyset paginated on (search_score, _id) and combined with the tag/type filters of get_ads.
+    """
+    pipeline = [
+        {"$match": {"$text": {"$search": search}, **build_ads_query(None, tags, type_ad, collapse)}},
+        {"$addFields": {"search_score": {"$meta": "textScore"}}},
+    ]
+    if cursor:
+        token = _decode_cursor(cursor)
+        pipeline.append({"$match": {"$or": [
+            {"search_score": {"$lt": token["s"]}},
+            {"search_score": token["s"], "_id": {"$lt": ObjectId(token["i"])}}
+        ]}})
+    pipeline += [
+        {"$sort": {"search_score": -1, "_id": -1}},
+        {"$limit": limit},
+        {"$project": {**CARD_FIELDS, "search_score": 1}}
+    ]
+    ads = list(client["gigi_ads_saved"].aggregate(pipeline))
+
+    for ad in ads:
+        ad["_id"] = str(ad["_id"])
+
+    log.debug("Searched ads in MongoDB", extra={"count": len(ads), "search": search})
+    return ads
+
+
+def page_cursor(ads: list) -> Union[str, None]:
+    """
+    Cursor of the page following the given get_ads page, to pass back as last_fetched_ad_id:
+    the last _id, or an opaque (search_score, _id) / (active_hours, _id) token for search / longest_running results.
+    """
+    if not ads:
+        return None
+    if "search_score" in ads[-1]:
+        return _encode_cursor({"s": ads[-1]["search_score"], "i": str(ads[-1]["_id"])})
+    if "active_hours" in ads[-1]:
+        return _encode_cursor({"h": ads[-1]["active_hours"], "i": str(ads[-1]["_id"])})
+    return ads[-1]["_id"]
+
+
+def _encode_cursor(token: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(token).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> dict:
+    return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+
+
+def _ads_cache_key(last_fetched_ad_id: ObjectId, tags: list, limit: int, type_ad: str, search: str = "", sort: str = "newest",
+                   collapse: bool = False) -> tuple:
+    return (
+        tuple(sorted(set(tags or []))),
+        type_ad or "all",
+        search,
+        sort,
+        bool(collapse),
+        str(last_fetched_ad_id) if last_fetched_ad_id else None,
+        limit
+    )
+
+
+def _ad_matches_filter(ad: dict, tags: tuple, type_ad: str) -> bool:
+    if tags and not set(tags) & set(ad.get("tags", [])):
+        return False
+    if type_ad == "video" and not ad.get("video_url"):
+        return False
+    if type_ad == "image" and not ad.get("img_url"):
+        return False
+    return True
+
+
+def invalidate_ad_pages(*ad_versions: dict) -> int:
+    """
+    Drop the cached get_ads pages affected by a change of one ad.
+    Pass every version of the ad (e.g. before and after a tag update, or just the new/deleted ad),
+    each with its _id, tags, video_url and img_url: a page is dropped if any version matches its
+    filter and its _id falls inside the page's _id range (search and longest_running pages are not
+    ordered by _id, and collapsed pages depend on the other ads of the cluster, so they are dropped
+    whenever the filter matches).
+    """
+    ad_id = str(ad_versions[0]["_id"])
+
+    def is_affected(key: tuple, ads: list) -> bool:
+        tags, type_ad, search, sort, collapse, cursor, limit = key
+        if search or sort != "newest" or collapse:
+            return any(_ad_matches_filter(ad, tags, type_ad) for ad in ad_versions)
+        # ObjectId hex strings have a fixed length, so they sort like the ObjectIds
+        if cursor and ad_id >= cursor:
+            return False
+        if len(ads) >= limit and ad_id < ads[-1]["_id"]:
+            return False
+        return any(_ad_matches_filter(ad, tags, type_ad) for ad in ad_versions)
+
+    count = ads_cache.invalidate(is_affected)
+    if count:
+        log.debug("Invalidated cached ads pages", extra={"count": count, "ad_id": ad_id})
+    return count
+
+
+def invalidate_ads_cache() -> None:
+    ads_cache.clear()
+    log.info("Cleared the cached ads pages.")
+    return None
+
+
+def get_command_stats() -> list:
+    """Latency and documents per collection and command, recorded by the client's CommandListener"""
+    return mongo_stats.get_stats()
+
+
+def get_ads_cache_stats() -> dict:
+    return ads_cache.stats()
+
+
+def get_tags() -> list:
+    """
+    Fetch all unique tags from the tag catalog.
+    """
+    return list(get_tag_counts().keys())
+
+
+@metrics.timed("mongo_call_seconds")
+def get_tag_counts() -> dict:
+    """
+    Fetch all tags with the number of ads using them, from the materialized tag catalog.
+    The catalog is rebuilt from the ads collection only if it's still empty.
+    """
+    tags = list(client[TAGS_COLLECTION].find({"count": {"$gt": 0}}, {"count": 1}))
+    if not tags and client["gigi_ads_saved"].find_one({"tags.0": {"$exists": True}}, {"_id": 1}):
+        log.warning("Tag catalog is empty, rebuilding it from the ads collection.")
+        return rebuild_tag_catalog()
+
+    tag_counts = {tag["_id"]: tag["count"] for tag in sorted(tags, key=lambda x: (-x["count"], x["_id"]))}
+    log.debug("Fetched the tag catalog", extra={"tags": len(tag_counts)})
+    return tag_counts
+
+
+@metrics.timed("mongo_call_seconds")
+def rebuild_tag_catalog() -> dict:
+    """
+    Recompute the tag catalog from scratch with a full $unwind over the ads collection,
+    fixing any drift (e.g. ads saved or tagged directly by the chrome extension backend).
+    Returns the reconciled {tag: count} mapping.
+    """
+    tags = client["gigi_ads_saved"].aggregate([
+        {"$unwind": "$tags"},
+        {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}}
+    ])
+    tag_counts = {tag["_id"]: tag["count"] for tag in tags}
+
+    now = datetime.now()
+    operations = [
+        UpdateOne({"_id": tag}, {"$set": {"count": count, "updated_at": now}}, upsert=True)
+        for tag, count in tag_counts.items()
+    ]
+    if operations:
+        client[TAGS_COLLECTION].bulk_write(operations, ordered=False)
+    res = client[TAGS_COLLECTION].delete_many({"_id": {"$nin": list(tag_counts.keys())}})
+
+    log.info("Rebuilt tag catalog", extra={"tags": len(tag_counts), "removed": res.deleted_count})
+    return tag_counts
+
+
+def _update_tag_catalog(old_tags: list, new_tags: list) -> None:
+    """
+    Apply the difference between the old and new tags of a single ad to the tag catalog with $inc.
+    """
+    old_tags, new_tags = set(old_tags or []), set(new_tags or [])
+    diff = {tag: 1 for tag in new_tags - old_tags}
+    diff.update({tag: -1 for tag in old_tags - new_tags})
+    _inc_tag_catalog(diff)
+
+
+def _inc_tag_catalog(diff: dict) -> None:
+    """
+    Increment the catalog counts by the given {tag: delta} mapping, dropping tags no longer used.
+    """
+    diff = {tag: delta for tag, delta in diff.items() if delta}
+    if not diff:
+        return None
+    try:
+        now = datetime.now()
+        client[TAGS_COLLECTION].bulk_write([
+            UpdateOne({"_id": tag}, {"$inc": {"count": delta}, "$set": {"updated_at": now}}, upsert=True)
+            for tag, delta in diff.items()
+        ], ordered=False)
+        client[TAGS_COLLECTION].delete_many({"_id": {"$in": list(diff.keys())}, "count": {"$lte": 0}})
+    except Exception as e:
+        # the catalog can always be reconciled with rebuild_tag_catalog()
+        log.error("Error updating tag catalog", extra={"diff": diff, "error": str(e)})
+    return None
+
+
+def get_competitors() -> list:
+    return list(client["facebook_competitors"].find(
+        {"competitor_id_page": {"$exists": True}},
+        {"_id": 0, "page_name": 1, "competitor_id_page": 1}
+    ))
+
+
+@metrics.timed("mongo_call_seconds")
+def get_ads_media(ad_archive_ids: list) -> dict:
+    """Cached thumbnails of the given ads: {ad_archive_id: media document}"""
+    return {doc["_id"]: doc for doc in client[MEDIA_COLLECTION].find({"_id": {"$in": list(ad_archive_ids)}})}
+
+
+def set_ad_media(ad_archive_id: str, media: dict) -> None:
+    client[MEDIA_COLLECTION].update_one({"_id": ad_archive_id}, {"$set": media}, upsert=True)
+    return None
+
+
+@metrics.timed("mongo_call_seconds")
+def get_ads_without_media(limit: int = 0) -> list:
+    """Ads with a creative url and no cached thumbnail yet (newest first), for the media cache warm-up"""
+    pipeline = [
+        {"$match": {"$or": [{"img_url": {"$type": "string"}}, {"poster_url": {"$type": "string"}}]}},
+        {"$sort": {"_id": -1}},
+        {"$project": {"_id": 0, "ad_archive_id": 1, "img_url": 1, "poster_url": 1, "video_url": 1}},
+        {"$lookup": {"from": MEDIA_COLLECTION, "localField": "ad_archive_id", "foreignField": "_id", "as": "media"}},
+        {"$match": {"media.file": {"$exists": False}}},
+        {"$project": {"media": 0}},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    return list(client["gigi_ads_saved"].aggregate(pipeline))
+
+
+@metrics.timed("mongo_call_seconds")
+def update_ad_tags(ad_archive_id: str, new_tags: list) -> bool:
+    """
+    Update tags for a specific ad in the database, keeping the tag catalog in sync.
+    Returns True if successful, False otherwise.
+    """
+    try:
+        old_ad = client["gigi_ads_saved"].find_one_and_update(
+            {"ad_archive_id": ad_archive_id},
+            {"$set": {"tags": new_tags, "updated_at": datetime.now()}},
+            projection={"tags": 1, "video_url": 1, "img_url": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if old_ad is None:
+            log.warning("Ad not found, tags not updated", extra={"ad_archive_id": ad_archive_id})
+            return False
+
+        _update_tag_catalog(old_ad.get("tags", []), new_tags)
+        invalidate_ad_pages(old_ad, {**old_ad, "tags": new_tags})
+        ad_details_cache.delete(ad_archive_id)
+        log.info("Updated tags of ad", extra={"ad_archive_id": ad_archive_id, "tags": new_tags})
+        return True
+    except Exception as e:
+        log.error("Error updating ad tags", extra={"ad_archive_id": ad_archive_id, "error": str(e)})
+        return False
+
+
+@metrics.timed("mongo_call_seconds")
+def delete_ad(ad_archive_id: str) -> bool:
+    """
+    Delete a saved ad and remove it from the tag catalog, its cluster of variants and the analytics rollups.
+    Returns True if the ad was deleted, False otherwise.
+    """
+    try:
+        ad = client["gigi_ads_saved"].find_one_and_delete(
+            {"ad_archive_id": ad_archive_id},
+            projection={"tags": 1, "video_url": 1, "img_url": 1, "cluster_id": 1}
+        )
+        if ad is None:
+            log.warning("Ad not found, nothing deleted", extra={"ad_archive_id": ad_archive_id})
+            return False
+
+        _update_tag_catalog(ad.get("tags", []), [])
+        invalidate_ad_pages(ad)
+        ad_details_cache.delete(ad_archive_id)
+        # the thumbnail file is content-addressed and may be shared, only the reference goes
+        client[MEDIA_COLLECTION].delete_one({"_id": ad_archive_id})
+        log.info("Deleted ad", extra={"ad_archive_id": ad_archive_id})
+    except Exception as e:
+        log.error("Error deleting ad", extra={"ad_archive_id": ad_archive_id, "error": str(e)})
+        return False
+
+    # the ad is gone whatever happens here: a failure is fixed by the next cluster_ads run (its MinHash document is left)
+    try:
+        remove_ad_from_cluster(ad)
+    except Exception as e:
+        log.error("Error removing the deleted ad from its cluster", extra={"ad_archive_id": ad_archive_id, "error": str(e)})
+    # a failure leaves the contribution: `manage.py refresh-rollups` removes the ones of the deleted ads
+    try:
+        remove_rollup_contribution(ad["_id"])
+    except Exception as e:
+        log.error("Error removing the deleted ad from the rollups", extra={"ad_archive_id": ad_archive_id, "error": str(e)})
+    return True
+
+
+def rollup_keys(contrib: dict) -> list:
+    """(kind, key) of the rollups an ad contribution counts in"""
+    return (
+        [("total", "all"), ("competitor", contrib["page"]), ("day", contrib["day"])]
+        + [("tag", tag) for tag in contrib["tags"]]
+    )
+
+
+def remove_rollup_contribution(ad_id: ObjectId) -> bool:
+    """Subtract the contribution of a deleted ad from the rollups. Returns False if the ad had none"""
+    contrib = client[ROLLUP_CONTRIBS_COLLECTION].find_one_and_delete({"_id": ad_id})
+    if contrib is None:
+        return False
+    delta = {"count": -1, "video": -contrib["video"], "image": -contrib["image"]}
+    client[ROLLUPS_COLLECTION].bulk_write(
+        [UpdateOne({"_id": f"{kind}:{key}"}, {"$inc": delta}) for kind, key in rollup_keys(contrib)], ordered=False
+    )
+    return True
+
+
+def update_cluster_head(cluster_id: str) -> None:
+    """Make the oldest remaining ad of the cluster of variants (src/dedup.py) its head and store its number of variants"""
+    ads = client["gigi_ads_saved"]
+    oldest = ads.find_one({"cluster_id": cluster_id}, {"_id": 1}, sort=[("_id", 1)])
+    if oldest is None:
+        return None
+    head = str(oldest["_id"])
+    if head != cluster_id:
+        ads.update_many({"cluster_id": cluster_id}, {"$set": {"cluster_id": head, "variant_of": head}, "$unset": {"variants": ""}})
+        client[MINHASH_COLLECTION].update_many({"cluster_id": cluster_id}, {"$set": {"cluster_id": head}})
+    ads.update_one(
+        {"_id": oldest["_id"]},
+        {"$set": {"variants": ads.count_documents({"cluster_id": head}) - 1}, "$unset": {"variant_of": ""}}
+    )
+    return None
+
+
+def remove_ad_from_cluster(ad: dict) -> None:
+    """
+    Take a deleted ad (its _id and cluster_id) out of its cluster: the next oldest ad becomes the head.
+    The MinHash document goes last, so that cluster_ads finds the ad again if the head update fails.
+    """
+    if ad.get("cluster_id"):
+        update_cluster_head(ad["cluster_id"])
+    client[MINHASH_COLLECTION].delete_one({"_id": ad["_id"]})
+    return None
+
+
+@metrics.timed("mongo_call_seconds")
+def bulk_update_ad_tags(ad_archive_ids: list, add: list = [], remove: list = [], replace: list = None) -> dict:
+    """
+    Add, remove or replace tags on many ads with a single bulk_write ($addToSet / $pull / $set),
+    keeping the tag catalog and the ads cache in sync.
+    Returns a summary {"matched", "modified", "tags": {ad_archive_id: new tags}}.
+    """
+    summary = {"matched": 0, "modified": 0, "tags": {}}
+    if not ad_archive_ids or (not add and not remove and replace is None):
+        return summary
+    if replace is not None:
+        replace = list(dict.fromkeys(replace))
+
+    try:
+        old_ads = list(client["gigi_ads_saved"].find(
+            {"ad_archive_id": {"$in": ad_archive_ids}},
+            {"ad_archive_id": 1, "tags": 1, "video_url": 1, "img_url": 1}
+        ))
+
+        now = datetime.now()
+        operations = []
+        for ad in old_ads:
+            match = {"ad_archive_id": ad["ad_archive_id"]}
+            if replace is not None:
+                operations.append(UpdateOne(match, {"$set": {"tags": replace, "updated_at": now}}))
+                continue
+            # $pull and $addToSet can't target the same field in one update
+            if remove:
+                operations.append(UpdateOne(match, {"$pull": {"tags": {"$in": remove}}, "$set": {"updated_at": now}}))
+            if add:
+                operations.append(UpdateOne(match, {"$addToSet": {"tags": {"$each": add}}, "$set": {"updated_at": now}}))
+        if not operations:
+            return summary
+
+        client["gigi_ads_saved"].bulk_write(operations, ordered=True)
+        summary["matched"] = len(old_ads)
+
+        # apply the same change locally to keep the tag catalog and the cache in sync
+        catalog_diff = {}
+        for ad in old_ads:
+            old_tags = ad.get("tags", [])
+            if replace is not None:
+                new_tags = replace
+            else:
+                new_tags = [tag for tag in old_tags if tag not in remove]
+                new_tags += [tag for tag in dict.fromkeys(add) if tag not in new_tags]
+            summary["tags"][ad["ad_archive_id"]] = new_tags
+            if set(new_tags) != set(old_tags):
+                summary["modified"] += 1
+
+            for tag in set(new_tags) - set(old_tags):
+                catalog_diff[tag] = catalog_diff.get(tag, 0) + 1
+            for tag in set(old_tags) - set(new_tags):
+                catalog_diff[tag] = catalog_diff.get(tag, 0) - 1
+            invalidate_ad_pages(ad, {**ad, "tags": new_tags})
+            ad_details_cache.delete(ad["ad_archive_id"])
+        _inc_tag_catalog(catalog_diff)
+
+        log.info("Bulk updated ad tags", extra={
+            "matched": summary["matched"], "modified": summary["modified"], "add": add, "remove": remove, "replace": replace
+        })
+    except Exception as e:
+        log.error("Error bulk updating ad tags", extra={"error": str(e)})
+        summary["error"] = str(e)
+    return summary
+
+
+@metrics.timed("mongo_call_seconds")
+def add_tags_to_filter(new_tags: list, tags: list = [], type_ad: str = "all", search: str = "") -> dict:
+    """
+    Add tags server-side to every ad matching the get_ads filter (tags, type_ad, search) with update_many.
+    Returns {tag: number of ads that got the tag}.
+    """
+    query = build_ads_query(None, tags, type_ad)
+    # $text must stay at the top level of the filter
+    text = {"$text": {"$search": search.strip()}} if search.strip() else {}
+    added = {}
+    for tag in dict.fromkeys(new_tags):
+        # only the ads without the tag are modified, so modified_count is the exact catalog increment
+        res = client["gigi_ads_saved"].update_many(
+            {**text, "$and": [query, {"tags": {"$ne": tag}}]},
+            {"$addToSet": {"tags": tag}, "$set": {"updated_at": datetime.now()}}
+        )
+        added[tag] = res.modified_count
+
+    _inc_tag_catalog(added)
+    invalidate_ads_cache()
+    ad_details_cache.clear()
+    log.info("Added tags to the ads of the filter", extra={"added": added, "tags": tags, "type_ad": type_ad, "search": search})
+    return added
+
+
+@metrics.timed("mongo_call_seconds")
+def update_chat_session_rating(session_id: str, rating: int) -> bool:
+    try:
+        res = client["gigi_chatbot_sessions"].update_one(
+            {"_id": ObjectId(session_id)},
+            {"$set": {"rating": rating}}
+        )
+        log.info("Updated rating of chatbot session", extra={"session_id": session_id, "rating": rating})
+        return True if res.modified_count > 0 else False
+    except Exception as e:
+        log.error("Error updating chatbot session rating", extra={"session_id": session_id, "error": str(e)})
+        return False
+
+
+@metrics.timed("mongo_call_seconds")
+def get_chatbot_session(session_id: str) -> dict:
+    try:
+        session = client["gigi_chatbot_sessions"].find_one({"_id": ObjectId(session_id)}, {"messages": 1, "tool_call_index": 1})
+        assert session is not None, f"Session with ID {session_id} not found"
+        session["_id"] = str(session["_id"])  # Convert ObjectId to string for JSON compatibility
+        log.debug("Fetched chatbot session", extra={"session_id": session_id, "messages": len(session["messages"])})
+        return session
+    except Exception as e:
+        log.error("Error fetching chatbot session", extra={"session_id": session_id, "error": f"{type(e).__name__}: {e}"})
+    return None
+
+
+@metrics.timed("mongo_call_seconds")
+def save_tool_call_index(session_id: str, tool_call_index: dict) -> bool:
+    """Persist the tool call index (src/tool_calls.py) on the session document written by the chatbot backend"""
+    try:
+        res = client["gigi_chatbot_sessions"].update_one(
+            {"_id": ObjectId(session_id)},
+            {"$set": {"tool_call_index": tool_call_index}}
+        )
+        return res.matched_count > 0
+    except Exception as e:
+        log.error("Error saving the tool call index", extra={"session_id": session_id, "error": str(e)})
+        return False
+
+
+def build_history_chats_query(cursor: str = None) -> dict:
+    query = {}
+    if not IS_DEBUG:
+        query["is_test_chat"] = False
+    # legacy sessions without a date updated_at can't be paged (nor encoded in a cursor): left out
+    query["updated_at"] = {"$type": "date"}
+    if cursor:
+        # keyset on (updated_at, _id) descending: the $lte bound drives the index scan, the $or breaks the ties
+        updated_at, session_id = decode_history_cursor(cursor)
+        query["updated_at"] = {"$lte": updated_at}
+        query["$or"] = [
+            {"updated_at": {"$lt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$lt": session_id}}
+        ]
+    return query
+
+
+def encode_history_cursor(session: dict) -> Union[str, None]:
+    """Opaque continuation token pointing after the given session, None if it has no updated_at date to page from"""
+    updated_at = session.get("updated_at")
+    if not isinstance(updated_at, datetime):
+        log.warning("Chat session without updated_at, no history cursor", extra={"session_id": str(session.get("_id"))})
+        return None
+    return _encode_cursor({"u": updated_at.isoformat(), "i": str(session["_id"])})
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    token = _decode_cursor(cursor)
+    return datetime.fromisoformat(token["u"]), ObjectId(token["i"])
+
+
+@metrics.timed("mongo_call_seconds")
+def get_history_chats(limit: int = 12, cursor: str = None) -> Tuple[list, Union[str, None]]:
+    """
+    Fetch a page of chat sessions, most recently updated first.
+    Returns the sessions and the cursor of the next page (None if there are no more sessions).
+    """
+    query = build_history_chats_query(cursor)
+
+    sessions = list(client["gigi_chatbot_sessions"].find(
+        query,
+        {"updated_at": 1, "created_at": 1, "num_messages": 1, "rating": 1}
+    ).sort([("updated_at", -1), ("_id", -1)]).limit(limit))
+
+    next_cursor = encode_history_cursor(sessions[-1]) if len(sessions) == limit else None
+
+    log.debug("Fetched chatbot sessions", extra={"count": len(sessions), "cursor": cursor, "limit": limit})
+    return sessions, next_cursor
+
+
+@metrics.timed("mongo_call_seconds")
+def delete_chat_session(session_id: str) -> bool:
+    try:
+        res = client["gigi_chatbot_sessions"].delete_one({"_id": ObjectId(session_id)})
+        log.info("Deleted chatbot session", extra={"session_id": session_id})
+        return True if res.deleted_count > 0 else False
+    except Exception as e:
+        log.error("Error deleting chatbot session", extra={"session_id": session_id, "error": str(e)})
+        return False
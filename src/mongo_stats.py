@@ -0,0 +1,77 @@
+"""
+pymongo command monitoring: latency and number of documents per (collection, command), registered on the
+shared MongoClient of src/mongo.py and recorded in src/metrics.py (mongo_command_seconds histogram,
+mongo_command_documents_total counter). No streamlit imports.
+"""
+import threading
+
+from pymongo import monitoring
+
+from src import metrics
+
+# commands not worth tracking (handshakes, heartbeats, sessions)
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue", "buildInfo"}
+
+
+def _collection_name(command_name: str, command: dict) -> str:
+    if command_name == "getMore":
+        return str(command.get("collection", ""))
+    value = command.get(command_name)
+    return value if isinstance(value, str) else ""
+
+
+def _num_documents(command_name: str, reply: dict) -> int:
+    """Documents returned (find/aggregate/getMore) or written (insert/update/delete) by the command"""
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if command_name in ("findAndModify",):
+        return 1 if reply.get("value") else 0
+    return int(reply.get("n", 0) or 0)
+
+
+class CommandStatsListener(monitoring.CommandListener):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # (connection, request_id) -> collection
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return None
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = _collection_name(event.command_name, event.command)
+        return None
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._record(event, error=False, documents=_num_documents(event.command_name, event.reply))
+        return None
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._record(event, error=True, documents=0)
+        return None
+
+    def _record(self, event, error: bool, documents: int) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return None
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), "")
+        labels = {"collection": collection, "command": event.command_name}
+        metrics.observe("mongo_command_seconds", event.duration_micros / 1_000_000, **labels)
+        metrics.inc("mongo_command_documents_total", documents, **labels)
+        if error:
+            metrics.inc(metrics.errors_name("mongo_command_seconds"), **labels)
+        return None
+
+
+def get_stats() -> list:
+    """One row per (collection, command): the mongo_command_seconds stats of src/metrics.py plus the documents"""
+    documents = metrics.get_counters("mongo_command_documents_total")
+    return [
+        {**row, "documents": int(documents.get(f"mongo_command_documents_total{{{row['labels']}}}", 0))}
+        for row in metrics.get_stats("mongo_command_seconds")
+    ]
+
+
+# one listener for the process, registered on the client by src/mongo.py
+command_stats = CommandStatsListener()
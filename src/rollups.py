@@ -0,0 +1,310 @@
+"""
+Analytics rollups of the saved ads, materialized so that the dashboard (apps/app_analytics.py) reads a few
+hundred small documents instead of scanning the ads collection:
+
+    gigi_ads_rollups: one document per (kind, key) with the number of ads, videos and images
+    { "_id": "competitor:566562996533315", "kind": "competitor", "key": "566562996533315", "count": 42, "video": 17, "image": 25 }
+    kinds: total (key "all"), competitor (query_params.view_all_page_id), tag, day (created_at, %Y-%m-%d UTC)
+
+rebuild_rollups() computes them from scratch with one $facet aggregation. refresh_rollups() applies
+the ads changed since the updated_at watermark of the last run: the contribution of each ad (its page, tags,
+day and media) is kept in gigi_ads_rollup_contribs, so a change is applied as the difference between the old
+and the new contribution with $inc, and processing the same ad twice changes nothing. mongo.delete_ad subtracts
+the contribution of the ads it deletes; refresh_rollups(remove_deleted=True) (`manage.py refresh-rollups`, never
+the dashboard) also looks for the contributions of ads deleted otherwise, when there are more contributions than
+ads. Like the tag catalog, a full rebuild fixes any drift.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from pymongo import ReplaceOne, UpdateOne, ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from src import mongo, metrics
+from src.config import ROLLUP_CACHE_TTL
+from src.utils import TTLCache
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+ROLLUPS_COLLECTION = mongo.ROLLUPS_COLLECTION
+CONTRIBS_COLLECTION = mongo.ROLLUP_CONTRIBS_COLLECTION
+STATE_COLLECTION = "gigi_ads_rollup_state"
+
+KINDS = ["total", "competitor", "tag", "day"]
+UNKNOWN = "unknown"
+
+# the ads updated just before the watermark may be committed after it: they are read again (no-op diffs)
+WATERMARK_OVERLAP = timedelta(seconds=60)
+BATCH_SIZE = 1000
+LEASE = timedelta(minutes=10)
+
+# the dashboard reads the rollups at most every ROLLUP_CACHE_TTL seconds per process
+_rollups_cache = TTLCache(max_size=1, ttl=ROLLUP_CACHE_TTL)
+
+# held by the background refresh started by the dashboard, one per process (the lease covers the other processes)
+_refresh_lock = threading.Lock()
+
+# per ad projection of the contribution, shared by the full rebuild and the incremental refresh
+CONTRIB_FIELDS = {
+    "page": {"$ifNull": [{"$toString": "$query_params.view_all_page_id"}, UNKNOWN]},
+    "tags": {"$setUnion": [{"$ifNull": ["$tags", []]}, []]},
+    "day": {"$ifNull": [{"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}, UNKNOWN]},
+    "video": {"$cond": [{"$eq": [{"$type": "$video_url"}, "missing"]}, 0, 1]},
+    "image": {"$cond": [{"$eq": [{"$type": "$img_url"}, "missing"]}, 0, 1]},
+}
+
+
+def _sums() -> dict:
+    return {"count": {"$sum": 1}, "video": {"$sum": "$video"}, "image": {"$sum": "$image"}}
+
+
+def contribution(ad: dict) -> dict:
+    """The CONTRIB_FIELDS of one ad, computed client side for the incremental refresh"""
+    page_id = (ad.get("query_params") or {}).get("view_all_page_id")
+    created_at = ad.get("created_at")
+    return {
+        "_id": ad["_id"],
+        "page": str(page_id) if page_id is not None else UNKNOWN,
+        "tags": sorted(set(ad.get("tags") or [])),
+        "day": created_at.strftime("%Y-%m-%d") if isinstance(created_at, datetime) else UNKNOWN,
+        "video": int("video_url" in ad),
+        "image": int("img_url" in ad),
+    }
+
+
+def _add_diff(diff: dict, contrib: dict, sign: int) -> None:
+    for kind, key in mongo.rollup_keys(contrib):
+        delta = diff.setdefault((kind, key), {"count": 0, "video": 0, "image": 0})
+        delta["count"] += sign
+        delta["video"] += sign * contrib["video"]
+        delta["image"] += sign * contrib["image"]
+    return None
+
+
+def _apply_diff(diff: dict) -> int:
+    operations = [
+        UpdateOne(
+            {"_id": f"{kind}:{key}"},
+            {"$inc": delta, "$set": {"kind": kind, "key": key}},
+            upsert=True
+        )
+        for (kind, key), delta in diff.items() if any(delta.values())
+    ]
+    if operations:
+        mongo.client[ROLLUPS_COLLECTION].bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def _acquire_lease() -> bool:
+    """One refresh at a time across the processes: the diffs of two concurrent runs would add up"""
+    now = datetime.now()
+    try:
+        mongo.client[STATE_COLLECTION].update_one(
+            {"_id": "ads", "$or": [{"lease_until": {"$lt": now}}, {"lease_until": None}]},
+            {"$set": {"lease_until": now + LEASE}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False  # the state document exists and is leased
+
+
+def _release_lease(**fields) -> None:
+    mongo.client[STATE_COLLECTION].update_one({"_id": "ads"}, {"$set": {"lease_until": None, **fields}})
+    return None
+
+
+def get_state() -> dict:
+    """{"watermark", "refreshed_at", "rebuilt_at", "lease_until"} of the rollups, {} before the first build"""
+    return mongo.client[STATE_COLLECTION].find_one({"_id": "ads"}) or {}
+
+
+@metrics.timed("rollups_seconds")
+def rebuild_rollups() -> dict:
+    """
+    Recompute the contributions ($out) and the rollups ($facet over the contributions) from scratch.
+    Returns {kind: number of rollup documents}.
+    """
+    if not _acquire_lease():
+        raise RuntimeError("A rollup refresh is already running")
+    state = {}
+    try:
+        started_at = datetime.now()
+        mongo.client["gigi_ads_saved"].aggregate([
+            {"$project": CONTRIB_FIELDS},
+            {"$out": CONTRIBS_COLLECTION},
+        ])
+        facets = next(mongo.client[CONTRIBS_COLLECTION].aggregate([
+            {"$facet": {
+                "total": [{"$group": {"_id": "all", **_sums()}}],
+                "competitor": [{"$group": {"_id": "$page", **_sums()}}],
+                "tag": [{"$unwind": "$tags"}, {"$group": {"_id": "$tags", **_sums()}}],
+                "day": [{"$group": {"_id": "$day", **_sums()}}],
+            }}
+        ], allowDiskUse=True))
+
+        operations, ids = [], []
+        for kind in KINDS:
+            for row in facets[kind]:
+                rollup_id = f"{kind}:{row['_id']}"
+                ids.append(rollup_id)
+                operations.append(ReplaceOne(
+                    {"_id": rollup_id},
+                    {"kind": kind, "key": row["_id"], "count": row["count"], "video": row["video"], "image": row["image"]},
+                    upsert=True
+                ))
+        if operations:
+            mongo.client[ROLLUPS_COLLECTION].bulk_write(operations, ordered=False)
+        mongo.client[ROLLUPS_COLLECTION].delete_many({"_id": {"$nin": ids}})
+        # the ads changed during the rebuild are applied by the next refresh
+        state = {"watermark": started_at, "refreshed_at": datetime.now(), "rebuilt_at": datetime.now()}
+    finally:
+        _release_lease(**state)
+    _rollups_cache.clear()
+
+    counts = {kind: len(facets[kind]) for kind in KINDS}
+    log.info("Rebuilt rollups", extra=counts)
+    return counts
+
+
+@metrics.timed("rollups_seconds")
+def refresh_rollups(remove_deleted: bool = False) -> dict:
+    """
+    Apply the ads changed since the watermark to the rollups, a full rebuild the first time.
+    With remove_deleted, also remove the contributions of the ads no longer in the collection (a scan of the
+    contributions when there are more of them than ads).
+    Returns {"ads": changed ads read, "updates": rollup documents updated, "deleted": deleted ads removed},
+    {"skipped": True} if another refresh is running.
+    """
+    state = get_state()
+    if not state.get("watermark"):
+        return {"rebuilt": rebuild_rollups()}
+    if not _acquire_lease():
+        return {"skipped": True}
+
+    stats = {"ads": 0, "updates": 0, "deleted": 0}
+    watermark = state["watermark"]
+    state = {}
+    try:
+        cursor = mongo.client["gigi_ads_saved"].find(
+            {"updated_at": {"$gte": watermark - WATERMARK_OVERLAP}},
+            {"query_params.view_all_page_id": 1, "tags": 1, "created_at": 1, "updated_at": 1, "video_url": 1, "img_url": 1}
+        ).sort("updated_at", ASCENDING).batch_size(BATCH_SIZE)
+
+        batch = []
+        for ad in cursor:
+            batch.append(ad)
+            if len(batch) >= BATCH_SIZE:
+                stats["updates"] += _apply_ads(batch)
+                stats["ads"] += len(batch)
+                watermark = max(watermark, batch[-1]["updated_at"])
+                batch = []
+        if batch:
+            stats["updates"] += _apply_ads(batch)
+            stats["ads"] += len(batch)
+            watermark = max(watermark, batch[-1]["updated_at"])
+
+        if remove_deleted:
+            stats["deleted"] = _remove_deleted_ads()
+        mongo.client[ROLLUPS_COLLECTION].delete_many({"count": {"$lte": 0}})
+        state = {"watermark": watermark, "refreshed_at": datetime.now()}
+    finally:
+        # on error the watermark stays: the batches already applied are no-ops the next time
+        _release_lease(**state)
+    _rollups_cache.clear()
+
+    log.info("Refreshed rollups", extra={**stats, "watermark": watermark.isoformat()})
+    return stats
+
+
+def _apply_ads(ads: list) -> int:
+    new = {ad["_id"]: contribution(ad) for ad in ads}
+    old = {c["_id"]: c for c in mongo.client[CONTRIBS_COLLECTION].find({"_id": {"$in": list(new)}})}
+
+    diff = {}
+    for ad_id, contrib in new.items():
+        if ad_id in old:
+            _add_diff(diff, old[ad_id], -1)
+        _add_diff(diff, contrib, 1)
+    updates = _apply_diff(diff)
+    mongo.client[CONTRIBS_COLLECTION].bulk_write(
+        [ReplaceOne({"_id": ad_id}, contrib, upsert=True) for ad_id, contrib in new.items()], ordered=False
+    )
+    return updates
+
+
+def _remove_deleted_ads() -> int:
+    """Contributions of the ads no longer in the collection (only looked for when there are more contributions than ads)"""
+    contribs, ads = mongo.client[CONTRIBS_COLLECTION], mongo.client["gigi_ads_saved"]
+    if contribs.estimated_document_count() <= ads.estimated_document_count():
+        return 0
+
+    removed = 0
+    batch = []
+    ids = contribs.find({}, {"_id": 1}).batch_size(BATCH_SIZE)
+    for contrib_id in (doc["_id"] for doc in ids):
+        batch.append(contrib_id)
+        if len(batch) >= BATCH_SIZE:
+            removed += _remove_orphans(batch)
+            batch = []
+    if batch:
+        removed += _remove_orphans(batch)
+    return removed
+
+
+def _remove_orphans(contrib_ids: list) -> int:
+    existing = {ad["_id"] for ad in mongo.client["gigi_ads_saved"].find({"_id": {"$in": contrib_ids}}, {"_id": 1})}
+    orphans = list(mongo.client[CONTRIBS_COLLECTION].find({"_id": {"$in": [i for i in contrib_ids if i not in existing]}}))
+    if not orphans:
+        return 0
+    diff = {}
+    for contrib in orphans:
+        _add_diff(diff, contrib, -1)
+    _apply_diff(diff)
+    mongo.client[CONTRIBS_COLLECTION].delete_many({"_id": {"$in": [contrib["_id"] for contrib in orphans]}})
+    return len(orphans)
+
+
+def refresh_in_background() -> bool:
+    """Start refresh_rollups in a daemon thread unless one is running in this process. Returns True if started"""
+    if not _refresh_lock.acquire(blocking=False):
+        return False
+
+    def run() -> None:
+        try:
+            refresh_rollups()
+        except Exception as e:
+            log.error("Error refreshing rollups", extra={"error": str(e)})
+        finally:
+            _refresh_lock.release()
+        return None
+
+    threading.Thread(target=run, name="rollups_refresh", daemon=True).start()
+    return True
+
+
+def is_refreshing() -> bool:
+    return _refresh_lock.locked()
+
+
+def get_rollups() -> dict:
+    """
+    {kind: [{"key", "count", "video", "image"}, ...] sorted by count}, the competitor rows with their page "name".
+    Cached per process for ROLLUP_CACHE_TTL seconds.
+    """
+    return _rollups_cache.get_or_set("rollups", _fetch_rollups)
+
+
+def _fetch_rollups() -> dict:
+    rollups = {kind: [] for kind in KINDS}
+    # the rollups emptied by deleted ads stay until the next refresh
+    for doc in mongo.client[ROLLUPS_COLLECTION].find({"count": {"$gt": 0}}, {"_id": 0}):
+        rollups.setdefault(doc["kind"], []).append(doc)
+    names = {str(c["competitor_id_page"]): c["page_name"] for c in mongo.get_competitors()}
+    for row in rollups["competitor"]:
+        row["name"] = names.get(row["key"], row["key"])
+    for kind in ["competitor", "tag"]:
+        rollups[kind].sort(key=lambda row: (-row["count"], row["key"]))
+    rollups["day"].sort(key=lambda row: row["key"])
+    return rollups
@@ -0,0 +1,149 @@
+"""
+Incremental server-sent events decoder working on raw bytes, plus the typed events of the chatbot /stream endpoint.
+Follows the SSE framing of the HTML spec: CRLF/LF/CR line endings, multi-line data, event, id, retry and comments.
+No streamlit imports, so it can be used by the benchmarks and the background clients too.
+"""
+import json
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+
+class SSEEvent(NamedTuple):
+    event: str  # "message" if the stream didn't set an event type
+    data: str
+    id: Optional[str]  # last event id seen on the stream
+    retry: Optional[int]  # reconnection time in ms, if set by the stream
+
+
+class ChatEvent(NamedTuple):
+    type: str  # init | content | tool_start | tool_end | complete | error | unknown | invalid
+    payload: dict
+
+
+CHAT_EVENT_TYPES = {"init", "content", "tool_start", "tool_end", "complete"}
+
+
+class SSEDecoder:
+    """
+    Feed it the byte chunks as they arrive from the network (in any split), get back the complete events.
+    """
+
+    def __init__(self):
+        self._pending = b""
+        self._data = []
+        self._event = ""
+        self._last_event_id = None
+        self._retry = None
+        self._first_line = True
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        if not chunk:
+            return []
+        buffer = self._pending + chunk
+        lines = buffer.splitlines(keepends=True)  # bytes.splitlines splits only on \r\n, \n and \r, like SSE
+
+        # keep the last line if it's incomplete, or if it ends with \r that could be the first half of a \r\n
+        last = lines[-1]
+        if not last.endswith((b"\n", b"\r")) or (last.endswith(b"\r") and not last.endswith(b"\r\n")):
+            self._pending = lines.pop()
+        else:
+            self._pending = b""
+
+        events = []
+        for line in lines:
+            event = self._process_line(line.rstrip(b"\r\n"))
+            if event is not None:
+                events.append(event)
+        return events
+
+    def flush(self) -> List[SSEEvent]:
+        """End of stream: a lone pending \\r is a line ending, an event without its blank line is discarded (spec)"""
+        events = []
+        if self._pending.endswith(b"\r"):
+            event = self._process_line(self._pending.rstrip(b"\r"))
+            if event is not None:
+                events.append(event)
+        self._pending = b""
+        self._data, self._event = [], ""
+        return events
+
+    def _process_line(self, line: bytes) -> Optional[SSEEvent]:
+        if self._first_line:
+            self._first_line = False
+            if line.startswith(b"\xef\xbb\xbf"):
+                line = line[3:]
+
+        if not line:
+            return self._dispatch()
+        if line.startswith(b":"):
+            return None  # comment / keep-alive
+
+        field, sep, value = line.partition(b":")
+        if sep and value.startswith(b" "):
+            value = value[1:]
+
+        if field == b"data":
+            self._data.append(value.decode("utf-8", errors="replace"))
+        elif field == b"event":
+            self._event = value.decode("utf-8", errors="replace")
+        elif field == b"id":
+            if b"\x00" not in value:
+                self._last_event_id = value.decode("utf-8", errors="replace")
+        elif field == b"retry":
+            if value.isdigit():
+                self._retry = int(value)
+        return None
+
+    def _dispatch(self) -> Optional[SSEEvent]:
+        if not self._data:
+            self._event = ""
+            return None
+        event = SSEEvent(self._event or "message", "\n".join(self._data), self._last_event_id, self._retry)
+        self._data, self._event = [], ""
+        return event
+
+
+def iter_sse_events(chunks: Iterable[bytes]) -> Iterator[SSEEvent]:
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+
+def parse_chat_event(event: SSEEvent) -> ChatEvent:
+    """Turn an SSE event of the chatbot /stream endpoint into a typed chat event"""
+    try:
+        payload = json.loads(event.data)
+    except json.JSONDecodeError as e:
+        return ChatEvent("invalid", {"raw": event.data, "error": str(e)})
+    if not isinstance(payload, dict):
+        return ChatEvent("invalid", {"raw": event.data, "error": "not a JSON object"})
+
+    if event.event == "error" or payload.get("type") == "error":
+        return ChatEvent("error", payload)
+    if payload.get("type") in CHAT_EVENT_TYPES:
+        return ChatEvent(payload["type"], payload)
+    if not payload.get("success", True):
+        return ChatEvent("error", payload)
+    return ChatEvent("unknown", payload)
+
+
+def format_chat_event(event: ChatEvent) -> str:
+    """Text shown in the chat for a stream event (empty for the events that are not displayed)"""
+    if event.type == 'init':
+        return f"[INIT] {event.payload.get('message', '')}\n\n"
+    elif event.type == 'content':
+        return event.payload.get('chunk', '')
+    elif event.type == 'tool_start':
+        return f"\n\n[TOOL START] {event.payload.get('tool_name', '')}\n\n"
+    elif event.type == 'tool_end':
+        return f"\n\n[TOOL END] {event.payload.get('tool_name', '')}\n\n"
+    elif event.type == 'complete':
+        return f"\n\n[COMPLETE] Token usage: {event.payload.get('token_usage', [])}"
+    elif event.type == 'error':
+        return f"\n\n[ERROR] {event.payload.get('error', 'Unknown error')}"
+    return ""
+
+
+def iter_chat_events(chunks: Iterable[bytes]) -> Iterator[ChatEvent]:
+    for event in iter_sse_events(chunks):
+        yield parse_chat_event(event)
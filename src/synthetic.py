@@ -0,0 +1,382 @@
+"""
+Synthetic data for load tests, shaped like the production documents (see the schema comments of src/mongo.py):
+gigi_ads_saved ads, their gigi_ads_tags catalog, facebook_competitors pages and gigi_chatbot_sessions with the
+tool-call message sequences of the chatbot agent. Sizes, tag skew and text lengths come from SyntheticConfig.
+
+Documents are generated lazily in blocks of BLOCK_SIZE, each with its own random generator, so the data only
+depends on the config and its seed (not on the batch size or the writers): millions of ads can be bulk-inserted in batches by a pool of writer threads
+(insert_synthetic) or streamed to mongoimport-compatible JSONL files (write_jsonl). No streamlit imports.
+"""
+import json
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, NamedTuple
+
+from bson import json_util
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+
+from src import ad_fields
+
+BLOCK_SIZE = 1000
+
+# marker document of the databases filled by this module (insert_synthetic refuses to write into other ones)
+META_COLLECTION = "synthetic_meta"
+
+TAG_NAMES = [
+    "hook", "ugc", "testimonial", "before_after", "unboxing", "founder_story", "problem_solution", "discount",
+    "free_shipping", "bundle", "skincare", "haircare", "supplements", "fitness", "pets", "home", "fashion",
+    "jewelry", "gadgets", "kitchen", "winner", "to_test", "scaled", "evergreen", "seasonal", "carousel",
+    "static", "long_video", "short_video", "voiceover", "subtitles", "meme", "comparison", "listicle",
+]
+
+WORDS = (
+    "glow serum skin routine hook offer free shipping today only discover new formula results customers love "
+    "limited edition bundle save now shop the collection before it sells out real natural gentle dark spots "
+    "turmeric kojic acid bar soap cream daily smooth bright confidence guarantee money back days weeks tried "
+    "everything finally works dermatologist tested vegan cruelty sensitive morning night easy fast best seller "
+    "thousands reviews stars rated women men your you our we this is the and for with in on to of a it that"
+).split()
+
+CTA_TEXTS = ["Shop Now", "Learn More", "Order Now", "Get Offer", "Sign Up", "Buy Now"]
+EMOJIS = ["✨", "🔥", "💯", "👇", "✅", "😍", "🎁", "⭐"]
+
+# tools of the chatbot agent (see tests/example_chatbot_response.json) and their arguments
+TOOLS = {
+    "MongoDB_-_List_Tags_of_saved_ads1": lambda rng, tags: {},
+    "Get_saved_ads1": lambda rng, tags: {
+        "skip": rng.choice([0, 0, 0, 10, 20]), "include_ai_analysis": rng.random() < 0.3,
+        "mongo_json_query": json.dumps({"tags": rng.choice(tags)}),
+    },
+}
+
+
+class SyntheticConfig(NamedTuple):
+    num_ads: int = 10_000
+    num_competitors: int = 200
+    num_sessions: int = 1_000
+    num_tags: int = 100
+    tag_skew: float = 1.1  # Zipf exponent of the tag popularity, 0 = uniform
+    tags_per_ad: tuple = (20, 35, 25, 15, 5)  # weights of 0, 1, 2... tags per ad
+    page_skew: float = 1.0  # Zipf exponent of the ads per competitor page
+    video_share: float = 0.4
+    analysis_share: float = 0.3  # ads with an AI image/video analysis
+    variant_share: float = 0.3  # ads reusing the copy of a recent ad with another emoji (near duplicates)
+    body_words: tuple = (40, 0.6)  # median and sigma (lognormal) of the ad copy length in words
+    analysis_words: tuple = (250, 0.4)
+    message_count: tuple = (8, 0.8)  # median and sigma of the messages per chat session
+    test_chat_share: float = 0.05
+    days: int = 730  # the ads are spread over the last days, newest last
+    start_index: int = 0  # first ad_archive_id/session index, to append to an existing synthetic database
+    seed: int = 0
+
+
+def _zipf_cum_weights(count: int, exponent: float) -> list:
+    total, cum_weights = 0.0, []
+    for rank in range(1, count + 1):
+        total += 1 / rank ** exponent
+        cum_weights.append(total)
+    return cum_weights
+
+
+def tag_names(num_tags: int) -> list:
+    return (TAG_NAMES + [f"tag_{i:03d}" for i in range(len(TAG_NAMES), num_tags)])[:num_tags]
+
+
+class _Corpus:
+    """A long deterministic word sequence: a text of n words is a slice of it at a random offset (fast to build)"""
+
+    def __init__(self, seed: int, size: int = 200_000):
+        rng = random.Random(f"{seed}-corpus")
+        self.words = rng.choices(WORDS, cum_weights=_zipf_cum_weights(len(WORDS), 0.8), k=size)
+
+    def text(self, rng: random.Random, num_words: int) -> str:
+        num_words = max(1, min(num_words, len(self.words) - 1))
+        start = rng.randrange(len(self.words) - num_words)
+        return " ".join(self.words[start:start + num_words])
+
+
+def _length(rng: random.Random, median_sigma: tuple, maximum: int = 5000) -> int:
+    median, sigma = median_sigma
+    return max(1, min(maximum, round(rng.lognormvariate(math.log(median), sigma))))
+
+
+def _object_id(moment: datetime, counter: int) -> ObjectId:
+    # time-ordered like the ids assigned at insert, unique thanks to the counter bytes
+    return ObjectId(f"{int(moment.timestamp()):08x}{counter:016x}")
+
+
+def _blocks(kind: str, config: SyntheticConfig, count: int, make: Callable) -> Iterator[dict]:
+    for block in range(math.ceil(count / BLOCK_SIZE)):
+        rng = random.Random(f"{config.seed}-{kind}-{config.start_index}-{block}")
+        for i in range(block * BLOCK_SIZE, min(count, (block + 1) * BLOCK_SIZE)):
+            yield make(config.start_index + i, rng)
+
+
+def competitor_page_id(i: int) -> str:
+    return str(500_000_000_000_000 + i)
+
+
+def iter_competitors(config: SyntheticConfig) -> Iterator[dict]:
+    def make(i: int, rng: random.Random) -> dict:
+        return {"competitor_id_page": competitor_page_id(i), "page_name": f"Brand {i:04d} {rng.choice(WORDS).title()}"}
+    return _blocks("competitors", config._replace(start_index=0), config.num_competitors, make)
+
+
+def iter_ads(config: SyntheticConfig, now: datetime = None) -> Iterator[dict]:
+    now = now or datetime(2025, 7, 8, 16, 0, 0)
+    corpus = _Corpus(config.seed)
+    tags = tag_names(config.num_tags)
+    tag_weights = _zipf_cum_weights(len(tags), config.tag_skew)
+    page_weights = _zipf_cum_weights(max(1, config.num_competitors), config.page_skew)
+    pages = [competitor_page_id(i) for i in range(max(1, config.num_competitors))]
+    total = max(config.start_index + config.num_ads, 1)
+    step = config.days * 86400 / total
+
+    def make(i: int, rng: random.Random) -> dict:
+        created_at = now - timedelta(days=config.days) + timedelta(seconds=i * step)
+        ad_archive_id = str(1_000_000_000_000_000 + i)
+        page_id = rng.choices(pages, cum_weights=page_weights)[0]
+        page_name = f"Brand {int(page_id) - 500_000_000_000_000:04d}"
+        # a variant reuses the copy of one of the previous ads, with another emoji
+        creative = rng.randint(max(0, i - 200), i) if i and rng.random() < config.variant_share else i
+        creative_rng = random.Random(f"{config.seed}-creative-{creative}")
+        body = f"{corpus.text(creative_rng, _length(creative_rng, config.body_words))} {rng.choice(EMOJIS)}"
+        title = corpus.text(rng, rng.randint(3, 9)).title()
+        cta = rng.choice(CTA_TEXTS)
+        num_tags = rng.choices(range(len(config.tags_per_ad)), weights=config.tags_per_ad)[0]
+        # most ads stop within a few days, a few winners run for months
+        active_days = min(int(rng.paretovariate(1.0)) - 1, config.days)
+        active_time = f"{active_days} days {rng.randint(0, 23)} hrs" if active_days else f"{rng.randint(1, 23)} hrs"
+
+        ad = {
+            "_id": _object_id(created_at, i),
+            "ad_archive_id": ad_archive_id,
+            "created_at": created_at,
+            "updated_at": created_at + timedelta(hours=rng.randint(0, 72)),
+            "full_html_text": (
+                f"​ActiveLibrary ID: {ad_archive_id}Started running on {created_at.day} {created_at.strftime('%b %Y')} · "
+                f"Total active time {active_time}Platforms​​See ad details{page_name}Sponsored"
+                f"{body}{page_name.upper().replace(' ', '')}.COM{title}{cta}Click to select tags...Add TagSave ad"
+            ),
+            "query_params": {
+                "active_status": "active", "ad_type": "all", "country": "ALL", "is_targeted_country": "false",
+                "media_type": "all", "search_type": "page", "view_all_page_id": page_id,
+            },
+            "snapshot": {
+                "page_id": page_id, "page_name": page_name, "title": title, "cta_text": cta,
+                "link_url": f"https://www.{page_name.lower().replace(' ', '')}.com/products/{ad_archive_id[-6:]}",
+                "body": {"text": body},
+            },
+            "tags": list(dict.fromkeys(rng.choices(tags, cum_weights=tag_weights, k=num_tags))),
+        }
+        media_id = f"{rng.getrandbits(60)}_{ad_archive_id}_{rng.getrandbits(60)}"
+        if rng.random() < config.video_share:
+            ad["video_url"] = f"https://video.fcia3-1.fna.fbcdn.net/o1/v/t2/f2/m69/{media_id}_n.mp4?_nc_cat=104&oe=6872FC81"
+            ad["poster_url"] = f"https://scontent.fcia3-1.fna.fbcdn.net/v/t39.35426-6/{media_id}_n.jpg?_nc_cat=101&oe=6872FC81"
+            analysis_field = "ai_video_analysis"
+        else:
+            ad["img_url"] = f"https://scontent.fcia3-1.fna.fbcdn.net/v/t39.35426-6/{media_id}_n.jpg?_nc_cat=101&oe=6872FC81"
+            analysis_field = "ai_image_analysis"
+        if rng.random() < config.analysis_share:
+            ad[analysis_field] = "\n\n".join(
+                f"## {section}\n{corpus.text(rng, max(5, _length(rng, config.analysis_words) // 4))}"
+                for section in ["Hook", "Visuals", "Offer", "Why it works"]
+            )
+        # parsed at save time, see src/ad_fields.py
+        ad["extracted"] = ad_fields.parse_full_html_text(ad["full_html_text"], created_at)
+        return ad
+
+    return _blocks("ads", config, config.num_ads, make)
+
+
+def make_messages(rng: random.Random, corpus: _Corpus, num_messages: int, tags: list) -> list:
+    """Turns of the chatbot agent: user question, [assistant tool call, tool result]..., assistant answer"""
+    messages, call = [], 0
+    while len(messages) < num_messages:
+        question = corpus.text(rng, rng.randint(5, 30))
+        if rng.random() < 0.05:
+            messages.append({"role": "user", "content": [
+                {"type": "text", "text": question},
+                {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,/9j/4AAQSkZJRg=="}},
+            ]})
+        else:
+            messages.append({"role": "user", "content": question})
+        for _ in range(rng.choices([0, 1, 2], weights=[40, 45, 15])[0]):
+            call += 1
+            tool = rng.choice(list(TOOLS))
+            call_id = f"call_{rng.getrandbits(96):024x}"
+            messages.append({"role": "assistant", "content": "", "tool_calls": [{
+                "id": call_id, "type": "function",
+                "function": {"name": tool, "arguments": json.dumps(TOOLS[tool](rng, tags))},
+            }]})
+            result = [
+                {"ad_archive_id": str(1_000_000_000_000_000 + rng.randrange(10_000_000)), "text": corpus.text(rng, rng.randint(20, 60))}
+                for _ in range(rng.randint(1, 5))
+            ]
+            messages.append({"role": "tool", "tool_call_id": call_id, "content": json.dumps(result)})
+        messages.append({"role": "assistant", "content": corpus.text(rng, rng.randint(30, 250))})
+    return messages[:num_messages]
+
+
+def make_session(i: int, rng: random.Random, config: SyntheticConfig, corpus: _Corpus,
+                 now: datetime = None, num_messages: int = None) -> dict:
+    now = now or datetime(2025, 7, 8, 16, 0, 0)
+    total = max(config.start_index + config.num_sessions, 1)
+    created_at = now - timedelta(days=365) + timedelta(seconds=i * 365 * 86400 / total)
+    messages = make_messages(
+        rng, corpus, num_messages or _length(rng, config.message_count, maximum=400), tag_names(config.num_tags)
+    )
+    return {
+        "_id": _object_id(created_at, i),
+        "created_at": created_at,
+        "updated_at": created_at + timedelta(minutes=rng.randint(1, 600)),
+        "num_messages": len(messages),
+        "is_test_chat": rng.random() < config.test_chat_share,
+        "rating": rng.choice([None, None, 1, 2, 3, 4, 5]),
+        "messages": messages,
+    }
+
+
+def iter_sessions(config: SyntheticConfig, now: datetime = None) -> Iterator[dict]:
+    corpus = _Corpus(config.seed)
+    return _blocks("sessions", config, config.num_sessions, lambda i, rng: make_session(i, rng, config, corpus, now))
+
+
+def sized_session(config: SyntheticConfig, num_messages: int) -> dict:
+    """One more session with exactly num_messages messages (chat rendering benchmarks), after the generated ones"""
+    rng = random.Random(f"{config.seed}-sized-session-{num_messages}")
+    index = config.start_index + config.num_sessions + num_messages
+    return make_session(index, rng, config, _Corpus(config.seed), num_messages=num_messages)
+
+
+def _batches(documents: Iterator[dict], batch_size: int) -> Iterator[list]:
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _count_tags(ads: Iterator[dict], tag_counts: dict) -> Iterator[dict]:
+    for ad in ads:
+        for tag in ad["tags"]:
+            tag_counts[tag] = tag_counts.get(tag, 0) + 1
+        yield ad
+
+
+def _insert_all(collection, documents: Iterator[dict], batch_size: int, workers: int, progress: Callable = None) -> int:
+    """insert_many of the batches on a pool of writer threads, at most 2 batches per writer waiting"""
+    inserted = 0
+    slots = threading.Semaphore(2 * workers)
+
+    def insert(batch: list) -> int:
+        try:
+            collection.insert_many(batch, ordered=False)
+            return len(batch)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="synthetic") as executor:
+        futures = []
+        for batch in _batches(documents, batch_size):
+            slots.acquire()
+            futures.append(executor.submit(insert, batch))
+            done = [future for future in futures if future.done()]
+            for future in done:
+                inserted += future.result()
+                futures.remove(future)
+            if progress and done:
+                progress(collection.name, inserted)
+        for future in futures:
+            inserted += future.result()
+    if progress:
+        progress(collection.name, inserted)
+    return inserted
+
+
+def check_target(db, force: bool = False) -> None:
+    """Refuse to write into a database holding ads that this module didn't generate"""
+    if force or db[META_COLLECTION].find_one({"_id": "synthetic"}):
+        return None
+    if db["gigi_ads_saved"].find_one({}, {"_id": 1}):
+        raise ValueError(f"{db.name} holds ads not generated by src/synthetic.py (use force to write anyway)")
+    return None
+
+
+def insert_synthetic(db, config: SyntheticConfig, batch_size: int = 10_000, workers: int = 4,
+                     progress: Callable = None, force: bool = False) -> dict:
+    """
+    Bulk-insert the competitors, ads (and their tag catalog) and chat sessions of the config into db,
+    a pymongo Database. Returns the number of documents per collection and the elapsed seconds.
+    """
+    check_target(db, force)
+    start = time.perf_counter()
+    tag_counts = {}
+    counts = {
+        "facebook_competitors": _insert_all(db["facebook_competitors"], iter_competitors(config), batch_size, workers, progress)
+            if config.start_index == 0 else 0,
+        "gigi_ads_saved": _insert_all(
+            db["gigi_ads_saved"], _count_tags(iter_ads(config), tag_counts), batch_size, workers, progress
+        ),
+        "gigi_chatbot_sessions": _insert_all(db["gigi_chatbot_sessions"], iter_sessions(config), batch_size, workers, progress),
+    }
+
+    # the catalog of src/mongo.py, $inc when appending (start_index) so that the counts add up
+    now = datetime.now()
+    if tag_counts and config.start_index == 0:
+        db["gigi_ads_tags"].insert_many(
+            [{"_id": tag, "count": count, "updated_at": now} for tag, count in tag_counts.items()], ordered=False
+        )
+    elif tag_counts:
+        db["gigi_ads_tags"].bulk_write([
+            UpdateOne({"_id": tag}, {"$inc": {"count": count}, "$set": {"updated_at": now}}, upsert=True)
+            for tag, count in tag_counts.items()
+        ], ordered=False)
+    counts["gigi_ads_tags"] = len(tag_counts)
+
+    db[META_COLLECTION].update_one(
+        {"_id": "synthetic"},
+        {"$set": {"updated_at": now}, "$push": {"runs": {"config": config._asdict(), "counts": counts, "at": now}}},
+        upsert=True
+    )
+    return {"counts": counts, "seconds": round(time.perf_counter() - start, 1)}
+
+
+def write_jsonl(out_dir: str, config: SyntheticConfig, progress: Callable = None) -> dict:
+    """
+    Stream the documents to <out_dir>/<collection>.jsonl in MongoDB extended JSON, for mongoimport:
+        mongoimport --db meta_ads_load --collection gigi_ads_saved --file gigi_ads_saved.jsonl --numInsertionWorkers 4
+    Returns the number of documents per file.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    tag_counts, counts = {}, {}
+    sources = [
+        ("facebook_competitors", iter_competitors(config) if config.start_index == 0 else iter([])),
+        ("gigi_ads_saved", _count_tags(iter_ads(config), tag_counts)),
+        ("gigi_chatbot_sessions", iter_sessions(config)),
+        ("gigi_ads_tags", lambda: ({"_id": tag, "count": count, "updated_at": datetime.now()} for tag, count in tag_counts.items())),
+    ]
+    for name, documents in sources:
+        if callable(documents):
+            documents = documents()  # the tag catalog is known once the ads are written
+        count = 0
+        with open(os.path.join(out_dir, f"{name}.jsonl"), "w", encoding="utf-8") as f:
+            for document in documents:
+                f.write(json_util.dumps(document, json_options=json_util.RELAXED_JSON_OPTIONS))
+                f.write("\n")
+                count += 1
+                if progress and count % 100_000 == 0:
+                    progress(name, count)
+        counts[name] = count
+        if progress:
+            progress(name, count)
+    return counts
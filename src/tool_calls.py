@@ -0,0 +1,61 @@
+"""
+Per-session index of the tool calls of the chatbot, built once and updated with the messages appended to the chat.
+Stored on the chat session document as tool_call_index:
+
+    {
+        "num_messages": 12,  # messages indexed so far
+        "calls": [{"id": "call_1", "tool": "get_saved_ads", "parameters": "{...}", "result": "[...]", "position": 3}],
+        "orphan_results": [{"id": "call_7", "result": "...", "position": 9}]  # results whose call wasn't seen yet
+    }
+
+Slices can be partial or out of order: a tool result seen before its call waits in orphan_results,
+and indexing the same messages twice doesn't duplicate anything. No streamlit imports.
+"""
+from typing import Union
+
+
+def new_index() -> dict:
+    return {"num_messages": 0, "calls": [], "orphan_results": []}
+
+
+def update_index(index: Union[dict, None], messages: list, start: int = 0) -> dict:
+    """Index messages, the slice of the chat starting at position start. Returns the updated index (new dict)"""
+    index = index or new_index()
+    calls = {call["id"]: dict(call) for call in index["calls"]}
+    orphans = {orphan["id"]: dict(orphan) for orphan in index["orphan_results"]}
+
+    for position, message in enumerate(messages, start=start):
+        if message.get('role') == "assistant" and message.get("tool_calls"):
+            for tool_call in message["tool_calls"]:
+                call = calls.setdefault(tool_call["id"], {"id": tool_call["id"], "result": None})
+                call["tool"] = tool_call.get("function", {}).get("name")
+                call["parameters"] = tool_call.get("function", {}).get("arguments")
+                call["position"] = position
+                if tool_call["id"] in orphans:
+                    call["result"] = orphans.pop(tool_call["id"])["result"]
+
+        elif message.get('role') == "tool" and message.get("content") and message.get("tool_call_id"):
+            if message["tool_call_id"] in calls:
+                calls[message["tool_call_id"]]["result"] = message["content"]
+            else:
+                orphans[message["tool_call_id"]] = {"id": message["tool_call_id"], "result": message["content"], "position": position}
+
+    return {
+        "num_messages": max(index["num_messages"], start + len(messages)),
+        "calls": sorted(calls.values(), key=lambda call: call["position"]),
+        "orphan_results": sorted(orphans.values(), key=lambda orphan: orphan["position"]),
+    }
+
+
+def completed_calls(index: Union[dict, None]) -> list:
+    """The tool calls with their result, in chat order, as {"id", "tool", "parameters", "result"}"""
+    if not index:
+        return []
+    return [
+        {"id": call["id"], "tool": call["tool"], "parameters": call["parameters"], "result": call["result"]}
+        for call in index["calls"] if call["result"] is not None
+    ]
+
+
+def is_complete(index: Union[dict, None], num_messages: int) -> bool:
+    return bool(index) and index["num_messages"] >= num_messages
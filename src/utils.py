@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry time to live, shared by all the streamlit sessions of the process.
+    Keeps hit/miss/eviction counters to measure its effectiveness.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # bumped by delete/invalidate/clear: a value computed across a bump may predate the invalidation
+        self._generation = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            self._generation += 1
+            if key in self._data:
+                del self._data[key]
+                self.invalidations += 1
+                return True
+            return False
+
+    def get_or_set(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Read-through access: compute and store the value on a miss (None values are not cached).
+        The value is computed outside the lock and not stored if the cache was invalidated meanwhile.
+        """
+        sentinel = object()
+        with self._lock:
+            value = self.get(key, sentinel)
+            generation = self._generation
+        if value is sentinel:
+            value = compute()
+            if value is not None:
+                with self._lock:
+                    if self._generation == generation:
+                        self.set(key, value)
+        return value
+
+    def invalidate(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop every entry for which predicate(key, value) is True, returns the number of dropped entries"""
+        with self._lock:
+            self._generation += 1
+            keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -1,221 +1,449 @@
-import streamlit as st
-from src import mongo
-
-def update_ad_tags(ad: dict, new_tags: list):
-    """Update tags for a specific ad in the database"""
-    try:
-        success = mongo.update_ad_tags(ad['ad_archive_id'], new_tags)
-        if success:
-            st.success(f"Tags updated successfully for ad {ad['ad_archive_id']}")
-            
-            # Update the ad in session state
-            ad['tags'] = new_tags
-
-            # remove the ad if it's tags are not ok with the current selected tags
-            if st.session_state["selected_tags"] and not any(tag in new_tags for tag in st.session_state["selected_tags"]):
-                st.session_state["ads_data"] = [x for x in st.session_state["ads_data"] if x["ad_archive_id"] != ad['ad_archive_id']]
-                st.success(f"Ad {ad['ad_archive_id']} removed from view due to tag mismatch.")
-
-            # Refresh the page to show updated tags
-            st.rerun()
-        else:
-            st.error("Failed to update tags")
-    except Exception as e:
-        st.error(f"Error updating tags: {str(e)}")
-
-
-def add_new_tag_to_ad(ad: dict, new_tag: str, current_tags: list):
-    """Add a new tag to the global tags list and to the specific ad"""
-    try:
-        # Add the new tag to the current ad's tags
-        updated_tags = current_tags + [new_tag] if new_tag not in current_tags else current_tags
-        updated_tags = list(set(updated_tags))  # Ensure tags are unique
-
-        # Update the ad with the new tags
-        success = mongo.update_ad_tags(ad['ad_archive_id'], updated_tags)
-
-        if success:
-            st.success(f"New tag '{new_tag}' added and applied to ad {ad['ad_archive_id']}")
-
-            ad['tags'] = updated_tags  # Update the ad in session state
-
-            # remove the ad if it's tags are not ok with the current selected tags
-            if st.session_state["selected_tags"] and not any(tag in updated_tags for tag in st.session_state["selected_tags"]):
-                st.session_state["ads_data"] = [x for x in st.session_state["ads_data"] if x["ad_archive_id"] != ad['ad_archive_id'] ]
-                st.success(f"Ad {ad['ad_archive_id']} removed from view due to tag mismatch.")
-
-            if "existing_tags" in st.session_state and new_tag not in st.session_state["existing_tags"]:
-                st.session_state["existing_tags"].append(new_tag)
-                st.session_state["existing_tags"] = list(set(st.session_state["existing_tags"]))
-
-            st.rerun()
-        else:
-            st.error("Failed to add new tag")
-    except Exception as e:
-        st.error(f"Error adding new tag: {str(e)}")
-
-
-def eliminate_ad(ad: dict) -> bool:
-
-    res = mongo.client["gigi_ads_saved"].delete_one({"ad_archive_id": ad['ad_archive_id']})
-
-    if res.deleted_count > 0:
-        st.success(f"Ad {ad['ad_archive_id']} has been eliminated successfully.")
-        st.session_state["ads_data"] = [x for x in st.session_state["ads_data"] if x["ad_archive_id"] != ad['ad_archive_id']]
-        st.session_state["existing_tags"] = mongo.get_tags()  # Refresh existing tags
-        st.session_state["selected_tags"] = [tag for tag in st.session_state["selected_tags"] if tag in st.session_state["existing_tags"]]
-        st.session_state["last_id"] = st.session_state["ads_data"][-1]["_id"] if st.session_state["ads_data"] else None
-        st.rerun()  # Refresh the page to reflect changes
-        return True
-
-    st.error(f"Failed to eliminate ad {ad['ad_archive_id']}. It may not exist.")
-    return False
-
-
-
-def display_ai_analysis_popup(analysis_content: str, analysis_type: str, ad_archive_id: str):
-    """Display AI analysis content in a pop-up modal"""
-
-    @st.dialog(f"AI {analysis_type} Analysis - Ad {ad_archive_id}")
-    def show_analysis():
-        # PDF download button at the top
-        from markdown_pdf import MarkdownPdf, Section
-        import tempfile
-        import os
-        
-        analysis_pdf = MarkdownPdf(toc_level=2, optimize=True)
-        analysis_pdf.add_section(Section(analysis_content))
-        
-        # Get PDF content as bytes using temporary file
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-            analysis_pdf.save(tmp_file.name)
-            with open(tmp_file.name, 'rb') as f:
-                pdf_content = f.read()
-            os.unlink(tmp_file.name)
-        
-        st.download_button(
-            label=f"📄 Download as PDF",
-            data=pdf_content,
-            file_name=f"ai_{analysis_type.lower()}_analysis_{ad_archive_id}.pdf",
-            mime="application/pdf",
-            use_container_width=True
-        )
-        
-        st.divider()
-        
-        # Display the analysis content in a scrollable container
-        with st.container(height=500):
-            st.markdown(analysis_content)
-
-    show_analysis()
-    return None
-
-
-def show_ads(ads: list, num_cols: int = 3):
-
-    st.write("### Saved Ads Overview")
-
-    cols = st.columns(num_cols)
-
-    for i, ad in enumerate(ads):
-        link_to_ad = f"https://www.facebook.com/ads/library/?id={ad['ad_archive_id']}"
-        col = cols[i % num_cols]
-
-        with col:
-            # Display ad information with possibility to copy ad_archive_id
-            col.code(ad['ad_archive_id'])
-
-            # ad with video
-            if ad.get("video_url"):
-                col.write(f"[Video URL]({ad['video_url']})")
-                if ad.get("poster_url"):
-                    col.markdown(f"[![Ad Video Preview]({ad['poster_url']})]({link_to_ad})")
-                else:
-                    col.write("No poster image available for this video ad.")
-            # ad with image
-            elif ad.get("img_url"):
-                col.markdown(f"[![Ad Image]({ad['img_url']})]({link_to_ad})")
-            # no image or video
-            else:
-                col.write(f"[No image or video available for this ad. View in Ads Library]({link_to_ad})")
-
-            # Display tags
-            col.write(f"Tags: {', '.join(ad.get('tags', ['N/A']))}")
-
-            # add a button to eliminate the ad
-            if st.button("Eliminate Ad", key=f"eliminate_{ad['ad_archive_id']}"):
-                eliminate_ad(ad)
-
-            # Expandable tag management section
-            with col.expander("Manage Tags", expanded=False): 
-
-                # Get current tags and all available tags
-                current_tags = ad.get('tags', [])
-                all_tags = st.session_state.get("existing_tags", [])
-
-                # Multiselect for tag editing
-                new_tags = st.multiselect(
-                    "Select tags:",
-                    options=all_tags,
-                    default=current_tags,
-                    key=f"tags_{ad['ad_archive_id']}"
-                )
-
-                # Update tags button
-                if st.button("Update Tags", key=f"update_tags_{ad['ad_archive_id']}"):
-                    update_ad_tags(ad['ad_archive_id'], new_tags)
-
-                # Add new tag input
-                st.write("**Add New Tag:**")
-                new_tag = st.text_input(
-                    "New tag name:",
-                    key=f"new_tag_{ad['ad_archive_id']}",
-                    placeholder="Enter new tag name"
-                )
-
-                if st.button("Add New Tag", key=f"add_tag_{ad['ad_archive_id']}"):
-                    if new_tag.strip():
-                        add_new_tag_to_ad(ad, new_tag.strip(), current_tags)
-                    else:
-                        st.error("Please enter a valid tag name")
-    
-            # Expandable details section
-            with col.expander("Show Details", expanded=False):
-                page_id = ad.get("query_params", {}).get("view_all_page_id", "N/A")
-
-                st.write(f"**Page ID:** {page_id}")
-                if str(page_id) in st.session_state["competitors"]:
-                    st.write(f"**Competitor:** {st.session_state['competitors'][str(page_id)]}")
-
-                if 'snapshot' in ad and 'body' in ad['snapshot'] and 'text' in ad['snapshot']['body']:
-                    ad_body = ad['snapshot']['body']['text']
-                elif ad.get("full_html_text", ""):
-                    ad_body = ad['full_html_text']
-                else:
-                    ad_body = "No ad body available."
-
-                st.write(f"**Ad body:**")
-                st.write(ad_body)
-
-                st.write(f"**Created at:** {ad['created_at']}")
-                st.write(f"**Updated at:** {ad['updated_at']}")
-
-
-            ## add other expanders in the column for AI analysis, only if available
-            if ad.get('ai_image_analysis', '') and len(ad['ai_image_analysis']) > 0:
-                if col.button("AI Image Analysis", key=f"view_ai_image_{ad['ad_archive_id']}_popup"):
-                    display_ai_analysis_popup(
-                        ad['ai_image_analysis'], 
-                        "Image", 
-                        ad['ad_archive_id']
-                    )
-
-            if ad.get('ai_video_analysis', '') and len(ad['ai_video_analysis']) > 0:
-                if col.button("AI Video Analysis", key=f"view_ai_video_{ad['ad_archive_id']}_popup"):
-                    display_ai_analysis_popup(
-                        ad['ai_video_analysis'], 
-                        "Video", 
-                        ad['ad_archive_id']
-                    )
-
-            col.write("---------")  # Separator for each ad
+import streamlit as st
+import os
+
+from src import mongo, analysis_pdf, media_cache, ads_grid, export
+
+
+def update_local_tag_counts(old_tags: list, new_tags: list) -> None:
+    """Apply a tag change of one ad to the tag counts shown in the sidebar, without querying the catalog"""
+    tag_counts = st.session_state.setdefault("tag_counts", {})
+    for tag in set(new_tags) - set(old_tags):
+        tag_counts[tag] = tag_counts.get(tag, 0) + 1
+    for tag in set(old_tags) - set(new_tags):
+        tag_counts[tag] = tag_counts.get(tag, 0) - 1
+        if tag_counts[tag] <= 0:
+            del tag_counts[tag]
+    st.session_state["existing_tags"] = list(tag_counts.keys())
+    return None
+
+
+def format_tag(tag: str) -> str:
+    """Format a tag with its number of ads, e.g. 'ugc (132)'"""
+    count = st.session_state.get("tag_counts", {}).get(tag)
+    return f"{tag} ({count})" if count is not None else tag
+
+
+def update_ad_tags(ad: dict, new_tags: list):
+    """Update tags for a specific ad in the database"""
+    try:
+        success = mongo.update_ad_tags(ad['ad_archive_id'], new_tags)
+        if success:
+            st.success(f"Tags updated successfully for ad {ad['ad_archive_id']}")
+
+            # Update the ad and the tag counts in session state
+            update_local_tag_counts(ad.get('tags', []), new_tags)
+            ad['tags'] = new_tags
+
+            # remove the ad if it's tags are not ok with the current selected tags
+            if st.session_state["selected_tags"] and not any(tag in new_tags for tag in st.session_state["selected_tags"]):
+                ads_grid.remove_ads({ad['ad_archive_id']})
+                st.success(f"Ad {ad['ad_archive_id']} removed from view due to tag mismatch.")
+
+            # Refresh the page to show updated tags
+            st.rerun()
+        else:
+            st.error("Failed to update tags")
+    except Exception as e:
+        st.error(f"Error updating tags: {str(e)}")
+
+
+def add_new_tag_to_ad(ad: dict, new_tag: str, current_tags: list):
+    """Add a new tag to the global tags list and to the specific ad"""
+    try:
+        # Add the new tag to the current ad's tags
+        updated_tags = current_tags + [new_tag] if new_tag not in current_tags else current_tags
+        updated_tags = list(set(updated_tags))  # Ensure tags are unique
+
+        # Update the ad with the new tags
+        success = mongo.update_ad_tags(ad['ad_archive_id'], updated_tags)
+
+        if success:
+            st.success(f"New tag '{new_tag}' added and applied to ad {ad['ad_archive_id']}")
+
+            update_local_tag_counts(ad.get('tags', []), updated_tags)
+            ad['tags'] = updated_tags  # Update the ad in session state
+
+            # remove the ad if it's tags are not ok with the current selected tags
+            if st.session_state["selected_tags"] and not any(tag in updated_tags for tag in st.session_state["selected_tags"]):
+                ads_grid.remove_ads({ad['ad_archive_id']})
+                st.success(f"Ad {ad['ad_archive_id']} removed from view due to tag mismatch.")
+
+            st.rerun()
+        else:
+            st.error("Failed to add new tag")
+    except Exception as e:
+        st.error(f"Error adding new tag: {str(e)}")
+
+
+def eliminate_ad(ad: dict) -> bool:
+
+    if mongo.delete_ad(ad['ad_archive_id']):
+        st.success(f"Ad {ad['ad_archive_id']} has been eliminated successfully.")
+        ads_grid.remove_ads({ad['ad_archive_id']})
+        update_local_tag_counts(ad.get('tags', []), [])  # Refresh existing tags
+        st.session_state["selected_tags"] = [tag for tag in st.session_state["selected_tags"] if tag in st.session_state["existing_tags"]]
+        st.rerun()  # Refresh the page to reflect changes
+        return True
+
+    st.error(f"Failed to eliminate ad {ad['ad_archive_id']}. It may not exist.")
+    return False
+
+
+
+def selected_ad_ids() -> list:
+    """ad_archive_id of the loaded ads whose selection checkbox is ticked"""
+    return [
+        ad['ad_archive_id'] for ad in st.session_state.get("ads_data", [])
+        if st.session_state.get(f"select_{ad['ad_archive_id']}", False)
+    ]
+
+
+def set_ads_selection(selected: bool) -> None:
+    """Tick or untick the selection checkbox of every loaded ad (used as on_click callback)"""
+    for ad in st.session_state.get("ads_data", []):
+        st.session_state[f"select_{ad['ad_archive_id']}"] = selected
+    return None
+
+
+def _bulk_tags_input() -> list:
+    """Tags chosen in the bulk tagging sidebar: the selected existing tags plus the new comma separated ones"""
+    new_tags = [tag.strip() for tag in st.session_state.get("bulk_new_tags", "").split(",") if tag.strip()]
+    return list(dict.fromkeys(st.session_state.get("bulk_tags", []) + new_tags))
+
+
+def apply_bulk_tags() -> None:
+    """on_click callback: add/remove/replace the chosen tags on all the selected ads with one bulk write"""
+    ad_ids = selected_ad_ids()
+    tags = _bulk_tags_input()
+    action = st.session_state.get("bulk_tag_action", "Add")
+
+    if action == "Replace":
+        summary = mongo.bulk_update_ad_tags(ad_ids, replace=tags)
+    elif action == "Remove":
+        summary = mongo.bulk_update_ad_tags(ad_ids, remove=tags)
+    else:
+        summary = mongo.bulk_update_ad_tags(ad_ids, add=tags)
+
+    if "error" in summary:
+        st.session_state["bulk_tag_summary"] = ("error", f"Error updating tags: {summary['error']}")
+        return None
+
+    # update the loaded ads and the tag counts locally
+    for ad in st.session_state["ads_data"]:
+        if ad['ad_archive_id'] in summary["tags"]:
+            update_local_tag_counts(ad.get('tags', []), summary["tags"][ad['ad_archive_id']])
+            ad['tags'] = summary["tags"][ad['ad_archive_id']]
+
+    # remove the ads whose tags are not ok anymore with the current selected tags
+    removed = 0
+    if st.session_state["selected_tags"]:
+        removed = ads_grid.remove_ads({
+            ad_id for ad_id, tags in summary["tags"].items()
+            if not any(tag in tags for tag in st.session_state["selected_tags"])
+        })
+
+    set_ads_selection(False)
+    st.session_state["bulk_tag_summary"] = ("success", (
+        f"{action} {tags}: {summary['modified']} of {summary['matched']} selected ads modified"
+        + (f", {removed} removed from view due to tag mismatch." if removed else ".")
+    ))
+    return None
+
+
+def add_tags_to_filtered_ads() -> None:
+    """on_click callback: add the chosen tags server-side to every ad matching the current filter"""
+    tags = _bulk_tags_input()
+    try:
+        added = mongo.add_tags_to_filter(
+            tags,
+            tags=st.session_state["selected_tags"],
+            type_ad=st.session_state.get("ad_type_filter", "all"),
+            search=st.session_state.get("search_query", "")
+        )
+    except Exception as e:
+        st.session_state["bulk_tag_summary"] = ("error", f"Error adding tags: {str(e)}")
+        return None
+
+    # every loaded page matches the filter, not only the displayed ones
+    for ad in (ad for page in st.session_state["ads_pages"].values() for ad in page):
+        ad['tags'] = ad.get('tags', []) + [tag for tag in tags if tag not in ad.get('tags', [])]
+    tag_counts = st.session_state.setdefault("tag_counts", {})
+    for tag, count in added.items():
+        tag_counts[tag] = tag_counts.get(tag, 0) + count
+    st.session_state["existing_tags"] = list(tag_counts.keys())
+
+    st.session_state["bulk_tag_summary"] = ("success", "Tags added to all the ads matching the filter: " + ", ".join(
+        f"{tag} (+{count})" for tag, count in added.items()
+    ))
+    return None
+
+
+def show_bulk_tagging_sidebar() -> None:
+    """Sidebar section to tag many ads at once, the cards get a selection checkbox while it's on"""
+    st.sidebar.header("🏷️ Bulk Tagging")
+
+    if summary := st.session_state.pop("bulk_tag_summary", None):
+        (st.sidebar.success if summary[0] == "success" else st.sidebar.error)(summary[1])
+
+    if not st.sidebar.toggle("Selection mode", value=False, key="selection_mode"):
+        return None
+
+    num_selected = len(selected_ad_ids())
+
+    col1, col2 = st.sidebar.columns(2)
+    col1.button("Select all on page", on_click=set_ads_selection, args=(True,), key="bulk_select_all")
+    col2.button("Clear selection", on_click=set_ads_selection, args=(False,), key="bulk_clear_selection")
+
+    st.sidebar.radio("Action:", ["Add", "Remove", "Replace"], horizontal=True, key="bulk_tag_action")
+    st.sidebar.multiselect(
+        "Tags:",
+        options=st.session_state.get("existing_tags", []),
+        format_func=format_tag,
+        key="bulk_tags"
+    )
+    st.sidebar.text_input("New tags (comma separated):", key="bulk_new_tags", placeholder="Enter new tag names")
+
+    st.sidebar.button(
+        f"Apply to {num_selected} selected ads",
+        on_click=apply_bulk_tags,
+        disabled=num_selected == 0,
+        key="bulk_apply_selected"
+    )
+    st.sidebar.button(
+        "Add tags to ALL ads matching the filter",
+        on_click=add_tags_to_filtered_ads,
+        help="Server-side update of every ad matching the current tag/type/search filter, not only the loaded ones",
+        key="bulk_apply_filter"
+    )
+    return None
+
+
+def start_ads_export() -> None:
+    """on_click callback of Export: every ad of the current filter, written by a background thread"""
+    job = st.session_state.get("export_job")
+    if job and job["status"] == "running":
+        job["cancel"].set()
+    st.session_state["export_job"] = export.start_export(
+        st.session_state.get("export_format", "csv"),
+        tags=st.session_state.get("selected_tags", []),
+        type_ad=st.session_state.get("ad_type_filter", "all"),
+        search=st.session_state.get("search_query", "")
+    )
+    return None
+
+
+def show_export_sidebar() -> None:
+    """Sidebar section to export all the ads matching the current filters (not only the loaded ones)"""
+    st.sidebar.header("📤 Export Ads")
+    st.sidebar.radio("Format:", list(export.WRITERS), format_func=str.upper, horizontal=True, key="export_format")
+
+    job = st.session_state.get("export_job")
+    running = job is not None and job["status"] == "running"
+    st.sidebar.button(
+        "Export ads matching the filters",
+        on_click=start_ads_export,
+        disabled=running,
+        help="Query params, ad copy and competitor name of every ad of the current tag/type/search filter",
+        key="export_ads"
+    )
+    if job:
+        with st.sidebar:
+            # polls the background export every second while it runs
+            st.fragment(run_every=1 if running else None)(_export_job_status)(running)
+    return None
+
+
+def _export_job_status(was_running: bool) -> None:
+    job = st.session_state["export_job"]
+    if was_running and job["status"] != "running":
+        st.rerun()  # stop polling
+
+    if job["status"] == "running":
+        st.info(f"Exporting... {job['rows']:,} ads so far")
+        st.button("Cancel export", on_click=job["cancel"].set, key="export_cancel")
+    elif job["status"] == "done" and os.path.exists(export.export_path(job)):
+        # the file is only read when the button is clicked, the exports are never served as static files
+        st.download_button(
+            f"⬇️ Download {job['download_name']}",
+            data=lambda: export.read_export(job),
+            file_name=job["download_name"],
+            mime=export.MIME_TYPES[job["format"]],
+            on_click="ignore",
+            key="export_download"
+        )
+        st.caption(f"{job['rows']:,} ads, {job['bytes'] / 1e6:.1f} MB")
+    elif job["status"] == "done":
+        st.info("The export expired, export again.")
+    elif job["status"] == "too_large":
+        st.warning(
+            f"More than {export.EXPORT_MAX_DOWNLOAD_BYTES / 1e6:.0f} MB, too large to download from the app: "
+            "narrow the filters or run `python manage.py export-ads`."
+        )
+    elif job["status"] == "cancelled":
+        st.info("Export cancelled.")
+    else:
+        st.error(f"Error exporting the ads: {job['error']}")
+    return None
+
+
+def display_ai_analysis_popup(analysis_content: str, analysis_type: str, ad_archive_id: str):
+    """Display AI analysis content in a pop-up modal"""
+
+    @st.dialog(f"AI {analysis_type} Analysis - Ad {ad_archive_id}")
+    def show_analysis():
+        # PDF download button at the top: rendered only when downloaded, once per analysis content for all the users
+        st.download_button(
+            label="📄 Download as PDF",
+            data=lambda: analysis_pdf.get_analysis_pdf(analysis_content),
+            file_name=f"ai_{analysis_type.lower()}_analysis_{ad_archive_id}.pdf",
+            mime="application/pdf",
+            use_container_width=True
+        )
+        
+        st.divider()
+        
+        # Display the analysis content in a scrollable container
+        with st.container(height=500):
+            st.markdown(analysis_content)
+
+    show_analysis()
+    return None
+
+
+def show_ad_details(ad: dict):
+    """Display the detail fields of an ad, fetched on demand by ad_archive_id"""
+    details = mongo.get_ad_details(ad['ad_archive_id'])
+    if not details:
+        st.write("No details available for this ad.")
+        return None
+
+    page_id = details.get("query_params", {}).get("view_all_page_id", "N/A")
+
+    st.write(f"**Page ID:** {page_id}")
+    if str(page_id) in st.session_state["competitors"]:
+        st.write(f"**Competitor:** {st.session_state['competitors'][str(page_id)]}")
+
+    if details.get('snapshot', {}).get('body', {}).get('text'):
+        ad_body = details['snapshot']['body']['text']
+    elif details.get("full_html_text", ""):
+        ad_body = details['full_html_text']
+    else:
+        ad_body = "No ad body available."
+
+    st.write("**Ad body:**")
+    st.write(ad_body)
+
+    st.write(f"**Created at:** {details.get('created_at', 'N/A')}")
+    st.write(f"**Updated at:** {details.get('updated_at', 'N/A')}")
+    return None
+
+
+def format_active_time(hours: float) -> str:
+    """52.0 -> '2 days', 11.0 -> '11 hours'"""
+    if hours >= 48:
+        return f"{int(hours // 24)} days"
+    return f"{int(hours)} hours" if hours >= 1 else "less than an hour"
+
+
+def show_ads(ads: list, num_cols: int = 3):
+
+    st.write("### Saved Ads Overview")
+
+    cols = st.columns(num_cols)
+
+    # local thumbnails of the creatives already cached, the others are downloaded in background
+    thumbnails = media_cache.thumbnail_urls(ads)
+
+    for i, ad in enumerate(ads):
+        link_to_ad = f"https://www.facebook.com/ads/library/?id={ad['ad_archive_id']}"
+        col = cols[i % num_cols]
+
+        with col:
+            # Display ad information with possibility to copy ad_archive_id
+            if st.session_state.get("selection_mode", False):
+                col.checkbox("Select", key=f"select_{ad['ad_archive_id']}")
+            col.code(ad['ad_archive_id'])
+
+            # ad with video
+            if ad.get("video_url"):
+                col.write(f"[Video URL]({ad['video_url']})")
+                if ad.get("poster_url"):
+                    col.markdown(f"[![Ad Video Preview]({media_cache.display_url(ad, thumbnails)})]({link_to_ad})")
+                else:
+                    col.write("No poster image available for this video ad.")
+            # ad with image
+            elif ad.get("img_url"):
+                col.markdown(f"[![Ad Image]({media_cache.display_url(ad, thumbnails)})]({link_to_ad})")
+            # no image or video
+            else:
+                col.write(f"[No image or video available for this ad. View in Ads Library]({link_to_ad})")
+
+            # Display tags
+            col.write(f"Tags: {', '.join(ad.get('tags', ['N/A']))}")
+            if ad.get("active_hours") is not None:
+                col.caption(f"Running for {format_active_time(ad['active_hours'])}")
+            if ad.get("variants"):
+                col.caption(f"+{ad['variants']} variant{'s' if ad['variants'] > 1 else ''} of this copy")
+
+            # add a button to eliminate the ad
+            if st.button("Eliminate Ad", key=f"eliminate_{ad['ad_archive_id']}"):
+                eliminate_ad(ad)
+
+            # Tag management section, its widgets are created only when opened
+            if col.toggle("Manage Tags", value=False, key=f"manage_tags_{ad['ad_archive_id']}"):
+
+                # Get current tags and all available tags
+                current_tags = ad.get('tags', [])
+                all_tags = st.session_state.get("existing_tags", [])
+
+                # Multiselect for tag editing: the ad's own tags are options even when missing from the catalog,
+                # otherwise "Update Tags" would silently remove them
+                new_tags = st.multiselect(
+                    "Select tags:",
+                    options=all_tags + [tag for tag in current_tags if tag not in all_tags],
+                    default=current_tags,
+                    format_func=format_tag,
+                    key=f"tags_{ad['ad_archive_id']}"
+                )
+
+                # Update tags button
+                if st.button("Update Tags", key=f"update_tags_{ad['ad_archive_id']}"):
+                    update_ad_tags(ad, new_tags)
+
+                # Add new tag input
+                st.write("**Add New Tag:**")
+                new_tag = st.text_input(
+                    "New tag name:",
+                    key=f"new_tag_{ad['ad_archive_id']}",
+                    placeholder="Enter new tag name"
+                )
+
+                if st.button("Add New Tag", key=f"add_tag_{ad['ad_archive_id']}"):
+                    if new_tag.strip():
+                        add_new_tag_to_ad(ad, new_tag.strip(), current_tags)
+                    else:
+                        st.error("Please enter a valid tag name")
+    
+            # Details section, the detail fields are loaded only when opened
+            if col.toggle("Show Details", value=False, key=f"show_details_{ad['ad_archive_id']}"):
+                with col.container(border=True):
+                    show_ad_details(ad)
+
+            ## add other buttons in the column for AI analysis, only if available
+            if ad.get('has_ai_image_analysis'):
+                if col.button("AI Image Analysis", key=f"view_ai_image_{ad['ad_archive_id']}_popup"):
+                    display_ai_analysis_popup(
+                        mongo.get_ad_details(ad['ad_archive_id']).get('ai_image_analysis', ''),
+                        "Image", 
+                        ad['ad_archive_id']
+                    )
+
+            if ad.get('has_ai_video_analysis'):
+                if col.button("AI Video Analysis", key=f"view_ai_video_{ad['ad_archive_id']}_popup"):
+                    display_ai_analysis_popup(
+                        mongo.get_ad_details(ad['ad_archive_id']).get('ai_video_analysis', ''),
+                        "Video", 
+                        ad['ad_archive_id']
+                    )
+
+            col.write("---------")  # Separator for each ad
@@ -0,0 +1,21 @@
+"""
+The modules of src/ read st.secrets at import time: the tests point streamlit at placeholder secrets
+(an unreachable MongoDB, the client connects lazily) so that they never touch the database of the app.
+"""
+import os
+import sys
+import tempfile
+
+from streamlit import config
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_secrets_path = os.path.join(tempfile.mkdtemp(prefix="meta_ads_tests_"), "secrets.toml")
+with open(_secrets_path, "w") as f:
+    f.write(
+        'password_endpoint = "test"\n'
+        'chatbot_webhook_url = "http://127.0.0.1:9/webhook"\n'
+        'MONGO_DB_URL = "mongodb://127.0.0.1:9/?serverSelectionTimeoutMS=100"\n'
+        'MONGO_DB_NAME = "tests"\n'
+    )
+config.set_option("secrets.files", [_secrets_path])
@@ -0,0 +1,115 @@
+"""
+src/media_cache.py against the local stand-in of fbcdn (benchmarks/stub_cdn.py).
+The media documents are recorded in memory instead of gigi_ads_media.
+"""
+import os
+
+import pytest
+from PIL import Image
+
+from benchmarks.stub_cdn import start_stub_cdn, cdn_url, STATS
+from src import media_cache, mongo
+from src.utils import TTLCache
+
+
+@pytest.fixture(scope="module")
+def cdn():
+    server = start_stub_cdn()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def media(monkeypatch, tmp_path):
+    """{ad_archive_id: media document} written by the cache, thumbnails in a temporary directory"""
+    documents = {}
+    monkeypatch.setattr(mongo, "set_ad_media", lambda ad_archive_id, doc: documents.__setitem__(ad_archive_id, doc))
+    monkeypatch.setattr(media_cache, "THUMBS_DIR", str(tmp_path))
+    monkeypatch.setattr(media_cache, "_known_media", TTLCache(max_size=64, ttl=600))
+    monkeypatch.setattr(media_cache, "_throttle", media_cache._Throttle(0))
+    return documents
+
+
+def test_fetch_thumbnail(cdn, media, tmp_path):
+    file_name = media_cache.fetch_thumbnail("ad_1", cdn_url(cdn, "creative_1"))
+
+    assert file_name and os.path.exists(tmp_path / file_name)
+    assert media["ad_1"]["file"] == file_name and media["ad_1"]["error"] is None
+    assert media["ad_1"]["width"] == media_cache.MEDIA_THUMB_WIDTH
+    assert media["ad_1"]["height"] == round(1350 * media_cache.MEDIA_THUMB_WIDTH / 1080)
+    with Image.open(tmp_path / file_name) as image:
+        assert image.format == "JPEG" and image.size == (media["ad_1"]["width"], media["ad_1"]["height"])
+    assert media_cache._known_media.get("ad_1") == file_name
+    assert media_cache.thumbnail_urls([{"ad_archive_id": "ad_1"}]) == {"ad_1": f"{media_cache.THUMBS_URL}/{file_name}"}
+
+
+def test_expired_url(cdn, media, tmp_path):
+    expired = STATS["expired"]
+
+    assert media_cache.fetch_thumbnail("ad_2", cdn_url(cdn, "creative_2", expires_in=-60)) is None
+    assert STATS["expired"] == expired + 1
+    assert media["ad_2"]["error"].startswith("403")
+    assert "file" not in media["ad_2"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_identical_creatives_share_the_file(cdn, media, tmp_path):
+    first = media_cache.fetch_thumbnail("ad_3", cdn_url(cdn, "creative_3"))
+    second = media_cache.fetch_thumbnail("ad_4", cdn_url(cdn, "creative_3", expires_in=7200))
+
+    assert first == second
+    assert os.listdir(tmp_path) == [first]
+    assert media["ad_3"]["source_url"] != media["ad_4"]["source_url"]
+
+
+def test_max_download_bytes(cdn, media, monkeypatch, tmp_path):
+    monkeypatch.setattr(media_cache, "MEDIA_MAX_DOWNLOAD_BYTES", 1000)
+
+    with pytest.raises(ValueError, match="larger than 1000 bytes"):
+        media_cache._download(cdn_url(cdn, "creative_5"))
+    assert media_cache.fetch_thumbnail("ad_5", cdn_url(cdn, "creative_5")) is None
+    assert "larger than 1000 bytes" in media["ad_5"]["error"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_decompression_bomb(cdn, media, monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+
+    assert media_cache.fetch_thumbnail("ad_6", cdn_url(cdn, "creative_6")) is None
+    assert media["ad_6"]["error"]
+
+
+def test_failed_download_waits_before_retrying(cdn, media, monkeypatch):
+    ad = {"ad_archive_id": "ad_7", "img_url": cdn_url(cdn, "creative_7", expires_in=-60)}
+    assert media_cache.fetch_thumbnail(ad["ad_archive_id"], ad["img_url"]) is None
+    assert media_cache._known_media.get("ad_7") == ""
+
+    # while the failure is cached, rendering the grid neither reads the media collection nor downloads again
+    def unexpected(*args, **kwargs):
+        raise AssertionError("the failed creative was fetched again before MEDIA_RETRY_AFTER")
+    monkeypatch.setattr(mongo, "get_ads_media", unexpected)
+    monkeypatch.setattr(media_cache, "schedule_fetch", unexpected)
+    assert media_cache.thumbnail_urls([ad]) == {}
+    assert media_cache.display_url(ad, {}) == ad["img_url"]
+
+    # once it expires, the creative is scheduled again
+    media_cache._known_media.clear()
+    scheduled = []
+    monkeypatch.setattr(mongo, "get_ads_media", lambda ad_archive_ids: {})
+    monkeypatch.setattr(media_cache, "schedule_fetch", lambda ad_archive_id, url: scheduled.append(ad_archive_id))
+    assert media_cache.thumbnail_urls([ad]) == {}
+    assert scheduled == ["ad_7"]
+
+
+def test_failed_media_write_is_an_error(cdn, media, monkeypatch, tmp_path):
+    def set_ad_media(ad_archive_id, doc):
+        raise ConnectionError("mongo is down")
+    monkeypatch.setattr(mongo, "set_ad_media", set_ad_media)
+    monkeypatch.setattr(mongo, "get_ads_without_media", lambda limit: [
+        {"ad_archive_id": "ad_8", "img_url": cdn_url(cdn, "creative_8")},
+        {"ad_archive_id": "ad_9", "img_url": cdn_url(cdn, "creative_9")},
+    ])
+
+    assert media_cache.warm_media_cache() == {"ads": 2, "cached": 0, "errors": 2}
+    assert media_cache._known_media.get("ad_8") == ""
+    assert len(os.listdir(tmp_path)) == 2
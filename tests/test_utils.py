@@ -0,0 +1,33 @@
+"""
+src/utils.py: the read-through TTLCache shared by the streamlit sessions.
+"""
+from src.utils import TTLCache
+
+
+def test_get_or_set():
+    cache = TTLCache(max_size=2, ttl=60)
+    calls = []
+
+    assert cache.get_or_set("a", lambda: calls.append("a") or 1) == 1
+    assert cache.get_or_set("a", lambda: calls.append("a") or 2) == 1
+    assert cache.get_or_set("none", lambda: None) is None
+    assert calls == ["a"]
+    assert cache.stats()["size"] == 1
+
+
+def test_invalidation_during_compute_is_not_overwritten():
+    cache = TTLCache(max_size=8, ttl=60)
+
+    # the page is read before an edit and stored after the edit invalidated the cache
+    def fetch_before_edit():
+        cache.invalidate(lambda key, value: True)
+        return "stale page"
+
+    assert cache.get_or_set("page", fetch_before_edit) == "stale page"
+    assert cache.get("page") is None
+    assert cache.get_or_set("page", lambda: "fresh page") == "fresh page"
+    assert cache.get("page") == "fresh page"
+
+    for invalidate in (lambda: cache.delete("other"), cache.clear):
+        cache.get_or_set("late", lambda: invalidate() or "stale")
+        assert cache.get("late") is None